@@ -6,36 +6,34 @@
 # This includes no assurances about being fit for any specific purpose.
 
 import time
-import ssl
 import config, demo
 
-from paho.mqtt.client import Client, CallbackAPIVersion
 from urllib.parse import urlparse
+from supervisor import MQTTSupervisor
 
-mqtt = Client(CallbackAPIVersion.VERSION2)
-device = demo.Device(mqtt)
+REPORT_INTERVAL = 60 #幾秒印一次連線統計
 
 #請參考paho-mqtt的說明書
 #https://eclipse.dev/paho/files/paho.mqtt.python/html/client.html
 
-def on_connect(mqtt, obj, flags, reason_code, properties):
+def on_connect(supervisor, reason_code, session_present):
     if reason_code == 0:
         print("Connected [secure]")
-        mqtt.subscribe("downlink/#", qos=0)
         device.connected()
     elif reason_code == "Bad user name or password":
         print("Invalid BLYNK_AUTH_TOKEN")
-        mqtt.disconnect()
+        supervisor.stop() #token錯誤,重試也沒有用
     else:
-        raise Exception(f"MQTT connection error: {reason_code}")
+        #其他錯誤不要丟出例外(會讓網路執行緒停掉),交給supervisor退避後重連
+        print(f"MQTT connection error: {reason_code}")
 
-def on_message(mqtt, obj, msg):
+def on_message(client, obj, msg):
     payload = msg.payload.decode("utf-8")
     topic = msg.topic
     if topic == "downlink/redirect":
         url = urlparse(payload)
         print("Redirecting...")
-        mqtt.connect_async(url.hostname, url.port, 45)
+        mqtt.redirect(url.hostname, url.port)
     elif topic == "downlink/reboot":
         print("Reboot command received!")
     elif topic == "downlink/ping":
@@ -46,29 +44,29 @@ def on_message(mqtt, obj, msg):
         print(f"Got {topic}, value: {payload}")
         device.process_message(topic, payload)
 
+#supervisor負責重新連線(退避+抖動)、保留訂閱、斷線時的publish佇列
+#TLS 1.2、使用者名稱"device"和token在這裡設定
+#on_connect:成功連線至MQTT broker時呼叫;on_message:broker收到訂閱的topic時呼叫
+mqtt = MQTTSupervisor(f"blynk-{config.BLYNK_AUTH_TOKEN[:8]}", config.BLYNK_MQTT_BROKER, 8883,
+                      username="device", password=config.BLYNK_AUTH_TOKEN, tls=True,
+                      keepalive=45, name="blynk", on_connect=on_connect, on_message=on_message)
+device = demo.Device(mqtt)
+
 def main():
-		#設定安全連線TLS 1.2版本
-    mqtt.tls_set(tls_version=ssl.PROTOCOL_TLSv1_2)
-    
-    #必需提供一個callback的function,當成功連線至MQTT broker
-    mqtt.on_connect = on_connect
-    
-    #必需提供一個callback的function,當blocker接收收到訂閱的topic
-    mqtt.on_message = on_message
-    
-    #設定使用者名稱和密碼�,Blynk要求使用者名稱都要用"device"
-    mqtt.username_pw_set("device", config.BLYNK_AUTH_TOKEN)
-    
-    #使用非同步連接至MQTT Bloker,此方法連接到MQTT broker, 沒有阻止後續程式的執行
-    mqtt.connect_async(config.BLYNK_MQTT_BROKER, 8883, 45)
+    #訂閱會被記住,重新連線時broker沒有保留的話會自動重新訂閱
+    mqtt.subscribe("downlink/#", qos=0)
     
-    #使用loop_start(),是在背景執行網路事件,這允許當訂閱的訊息從blocker傳過來時,程式依舊可以繼續執行。
-    mqtt.loop_start()
+    #在背景執行緒連線和處理網路事件,斷線時自動退避重連
+    mqtt.start()
 
 		#主程式執行
+    last_report = time.monotonic()
     while True:
         device.update()
         time.sleep(1)
+        if time.monotonic() - last_report >= REPORT_INTERVAL:
+            last_report = time.monotonic()
+            print("MQTT:", mqtt.report())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+'''
+電腦端的Blynk橋接程式
+Pico只要publish到本地的broker(SA-20/#),由這個程式轉送到Blynk.Cloud,Pico不用自己維持TLS連線
+
+1.訂閱本地broker的SA-20/#(文字topic和SA-20/BIN二進位封包都可以)
+2.topic對應到Blynk的datastream,同一個datastream只保留最新的值
+3.每個device token一條TLS連線,依照速率限制用batch_ds一次送出多個datastream
+4.Blynk的downlink/ds/<名稱>轉送回本地broker的SA-20/CMD/<名稱>
+5.--mock不連Blynk,只計算會送出的訊息,可以離線測試吞吐量
+
+使用方式:
+    python bridge.py --broker 192.168.0.252
+    python bridge.py --broker 127.0.0.1 --port 1883 --mock --report 5
+'''
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import config
+from supervisor import MQTTSupervisor
+
+#payload.py在pico/lesson18(和Pico的程式共用)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pico', 'lesson18'))
+import payload
+
+LOCAL_BROKER = '192.168.0.252'
+LOCAL_USER = 'pi'
+LOCAL_PASSWORD = 'raspberry'
+CMD_TOPIC = 'SA-20/CMD/'   #downlink轉回本地broker的topic開頭
+
+#本地topic -> Blynk datastream
+DATASTREAMS = {
+    'SA-20/TEMPERATURE': 'terperature',
+    'SA-20/TEMPERATURE/MEAN': 'terperature',
+    'SA-20/LINE_LEVEL': 'line_status',
+    'SA-20/LED_LEVEL': 'led_level',
+}
+
+#二進位封包的device_id -> device token,找不到的(還有文字topic)用'default'
+DEVICE_TOKENS = {
+    'default': config.BLYNK_AUTH_TOKEN,
+}
+
+RATE = 1.0            #每個token每秒最多送幾則訊息
+BURST = 5             #token bucket的容量
+FLUSH_INTERVAL = 0.1  #多久檢查一次要不要送出
+USE_BATCH = True      #用batch_ds一次更新多個datastream(一則訊息)
+
+
+class BlynkLink:
+    '''
+    一個device token的連線,datastream的值先留著,依照速率送出
+    '''
+    def __init__(self, name, token, on_downlink, rate=RATE, burst=BURST, batch=USE_BATCH):
+        self.name = name
+        self.token = token
+        self.on_downlink = on_downlink
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        self.batch = batch
+        self.pending = {}   #datastream -> 最新的值
+        self.lock = threading.Lock()
+        self.connected = False
+        self.stats = {'updates': 0, 'coalesced': 0, 'messages': 0, 'values': 0,
+                      'throttled': 0, 'downlink': 0}
+        self.client = None
+
+    def start(self):
+        self.client = MQTTSupervisor(f'bridge-{self.token[:8]}', config.BLYNK_MQTT_BROKER, 8883,
+                                     username='device', password=self.token, tls=True, keepalive=45,
+                                     on_connect=self._on_connect, on_disconnect=self._on_disconnect,
+                                     on_message=self._on_message, name=f'blynk-{self.name}')
+        self.client.subscribe('downlink/#', qos=0)
+        self.client.start()
+
+    def stop(self):
+        if self.client is not None:
+            self.client.stop()
+
+    def _on_connect(self, supervisor, reason_code, session_present):
+        if reason_code == 0:
+            print(f'[{self.name}] Blynk連線成功')
+            self.connected = True
+        elif reason_code == 'Bad user name or password':
+            print(f'[{self.name}] device token錯誤')
+            supervisor.stop()
+        else:
+            print(f'[{self.name}] Blynk連線失敗:{reason_code}')
+
+    def _on_disconnect(self, supervisor, reason_code):
+        self.connected = False
+
+    def _on_message(self, client, userdata, msg):
+        topic = msg.topic
+        if topic.startswith('downlink/ds/'):
+            self.stats['downlink'] += 1
+            self.on_downlink(self, topic[len('downlink/ds/'):], msg.payload)
+        elif topic == 'downlink/redirect':
+            url = urlparse(msg.payload.decode('utf-8'))
+            print(f'[{self.name}] Redirecting...')
+            self.client.redirect(url.hostname, url.port)
+        elif topic == 'downlink/diag':
+            print(f'[{self.name}] Server says:', msg.payload.decode('utf-8'))
+
+    def update(self, datastream, value):
+        with self.lock:
+            if datastream in self.pending:
+                self.stats['coalesced'] += 1
+            self.pending[datastream] = value
+            self.stats['updates'] += 1
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def flush(self):
+        '''
+        在速率限制內送出留著的值
+        '''
+        if not self.connected:
+            return
+        self._refill(time.monotonic())
+        with self.lock:
+            if not self.pending:
+                return
+            if self.tokens < 1:
+                self.stats['throttled'] += 1
+                return
+            if self.batch:
+                values = self.pending
+                self.pending = {}
+            else:
+                datastream = next(iter(self.pending))
+                values = {datastream: self.pending.pop(datastream)}
+        self.tokens -= 1
+        self.stats['messages'] += 1
+        self.stats['values'] += len(values)
+        if self.batch:
+            self._publish('batch_ds', json.dumps(values))
+        else:
+            for datastream, value in values.items():
+                self._publish('ds/' + datastream, value)
+
+    def _publish(self, topic, value):
+        self.client.publish(topic, value)
+
+
+class MockLink(BlynkLink):
+    '''
+    不連線Blynk,只記錄會送出的訊息
+    '''
+    def start(self):
+        self.connected = True
+        self.sent = []
+
+    def stop(self):
+        pass
+
+    def _publish(self, topic, value):
+        self.sent.append((time.monotonic(), topic, value))
+        if len(self.sent) > 1000:
+            del self.sent[:500]
+
+
+class Bridge:
+    def __init__(self, host=LOCAL_BROKER, port=1883, user=LOCAL_USER, password=LOCAL_PASSWORD,
+                 tokens=None, mock=False, rate=RATE, burst=BURST, batch=USE_BATCH):
+        self.host = host
+        self.port = port
+        self.local = MQTTSupervisor('sa20-blynk-bridge', host, port, username=user or None,
+                                    password=password, on_connect=self._on_connect,
+                                    on_message=self._on_message, name='local')
+        self.local.subscribe('SA-20/#')
+        link_class = MockLink if mock else BlynkLink
+        self.links = {}
+        for name, token in (tokens or DEVICE_TOKENS).items():
+            self.links[name] = link_class(name, token, self._on_downlink, rate, burst, batch)
+        self.received = 0
+        self.unmapped = 0
+        self.errors = 0
+
+    def link_for(self, device_id=None):
+        link = self.links.get(device_id)
+        return link if link is not None else self.links.get('default')
+
+    def _on_connect(self, supervisor, reason_code, session_present):
+        if reason_code == 0:
+            print('本地broker連線成功')
+        else:
+            print('本地broker連線失敗', reason_code)
+
+    def _on_message(self, client, userdata, msg):
+        self.received += 1
+        topic = msg.topic
+        if topic.startswith(CMD_TOPIC):
+            return
+        if topic == payload.BIN_TOPIC:
+            try:
+                device_id, seq, timestamp_ms, channels = payload.decode(msg.payload)
+            except ValueError:
+                self.errors += 1
+                return
+            link = self.link_for(device_id)
+            for channel_id, value in channels:
+                self._forward(link, payload.topic_for(channel_id), value)
+            return
+        try:
+            value = float(msg.payload)
+        except ValueError:
+            self.unmapped += 1 #例如SA-20/HEAP的JSON
+            return
+        self._forward(self.link_for(), topic, value)
+
+    def _forward(self, link, topic, value):
+        datastream = DATASTREAMS.get(topic)
+        if datastream is None or link is None:
+            self.unmapped += 1
+            return
+        if not math.isfinite(value): #感測器讀值錯誤(NaN、inf),不轉送
+            self.errors += 1
+            return
+        link.update(datastream, int(value) if value == int(value) else round(value, 2))
+
+    def _on_downlink(self, link, datastream, value):
+        '''
+        Blynk App改變datastream時,轉回本地broker給Pico
+        '''
+        self.local.publish(CMD_TOPIC + datastream, value)
+
+    def start(self):
+        for link in self.links.values():
+            link.start()
+        self.local.start()
+
+    def stop(self):
+        self.local.stop()
+        for link in self.links.values():
+            link.stop()
+
+    def flush(self):
+        for link in self.links.values():
+            link.flush()
+
+    def report(self, elapsed):
+        print(f'收到:{self.received} ({self.received / elapsed:.1f}/秒), 無對應:{self.unmapped}, 錯誤:{self.errors}')
+        for name, link in self.links.items():
+            s = link.stats
+            print(f'  [{name}] 更新:{s["updates"]} 合併:{s["coalesced"]} 送出:{s["messages"]}則/{s["values"]}個值 '
+                  f'({s["messages"] / elapsed:.2f}則/秒) 限速:{s["throttled"]} downlink:{s["downlink"]}')
+            if isinstance(link.client, MQTTSupervisor):
+                print(f'  [{name}] 連線:', link.client.report())
+        print('  [local] 連線:', self.local.report())
+
+    def run(self, report_interval=60):
+        self.start()
+        start = last_report = time.monotonic()
+        try:
+            while True:
+                time.sleep(FLUSH_INTERVAL)
+                self.flush()
+                now = time.monotonic()
+                if report_interval and now - last_report >= report_interval:
+                    last_report = now
+                    self.report(now - start)
+        except KeyboardInterrupt:
+            self.report(time.monotonic() - start)
+        finally:
+            self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把本地broker的SA-20/#轉送到Blynk')
+    parser.add_argument('--broker', default=LOCAL_BROKER)
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--user', default=LOCAL_USER)
+    parser.add_argument('--password', default=LOCAL_PASSWORD)
+    parser.add_argument('--mock', action='store_true', help='不連Blynk,只統計會送出的訊息')
+    parser.add_argument('--rate', type=float, default=RATE, help='每個token每秒最多幾則訊息')
+    parser.add_argument('--burst', type=int, default=BURST)
+    parser.add_argument('--no-batch', action='store_true', help='每個datastream各送一則(ds/<名稱>)')
+    parser.add_argument('--report', type=float, default=60, help='幾秒印一次統計')
+    args = parser.parse_args()
+    bridge = Bridge(args.broker, args.port, args.user, args.password, mock=args.mock,
+                    rate=args.rate, burst=args.burst, batch=not args.no_batch)
+    bridge.run(args.report)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,9 @@
 # The software is provided "as is", without any warranties or guarantees (explicit or implied).
 # This includes no assurances about being fit for any specific purpose.
 
+import json
 import random
+import time
 
 LOGO = r"""
       ___  __          __
@@ -14,15 +16,86 @@ LOGO = r"""
           /___/
 """
 
+# Smallest change worth publishing, per datastream topic, sized to the sensor
+# resolution so that noise alone does not trigger a publish (e.g. 0.5 for %RH).
+# Topics not listed here are published on any change.
+EPSILON = {
+    "ds/Current Temperature": 0.2,  # °C
+}
+REFRESH_INTERVAL = 60   # Seconds between full refreshes of all datastreams
+USE_BATCH = True        # Send changed datastreams as one batch_ds message
+
+
 class Device:
     power_on = False
     target_temp = 23    # Target temperature, can be set from 10 to 30
     current_temp = 15   # Initial current temperature
 
-    def __init__(self, mqtt):
+    def __init__(self, mqtt, epsilon=None, refresh_interval=REFRESH_INTERVAL, batch=USE_BATCH):
         self.mqtt = mqtt
+        self.epsilon = dict(EPSILON if epsilon is None else epsilon)
+        self.refresh_interval = refresh_interval
+        self.batch = batch
+        self.last_published = {}    # topic -> last value sent to Blynk
+        self.last_refresh = time.monotonic()
+        self.refresh_due = False    # Set by connected() on the MQTT thread, handled in update()
+        self.changes = {}           # datastream -> value, collected during update()
+        self.properties = {}        # other topics (ds/<name>/prop/...), sent after the batch
+        self.stats = {"published": 0, "skipped": 0}
+
+    def _changed(self, topic, value):
+        last = self.last_published.get(topic)
+        if last is None:
+            return True
+        if isinstance(value, float) or isinstance(last, float):
+            return abs(value - last) >= self.epsilon.get(topic, 0)
+        return value != last
+
+    def publish_if_changed(self, topic, value):
+        '''
+        Publish only when the value differs from the last one sent.
+        Everything is collected and sent by flush(): datastream values
+        (ds/<name>) first, then properties, so a widget never shows a new
+        property (e.g. color) next to the old value.
+        '''
+        if not self._changed(topic, value):
+            self.stats["skipped"] += 1
+            return
+        self.last_published[topic] = value
+        if topic.startswith("ds/") and "/prop/" not in topic:
+            self.changes[topic[3:]] = value
+        else:
+            self.properties[topic] = value
+
+    def flush(self):
+        if self.changes:
+            self._flush_changes()
+        for topic, value in self.properties.items():
+            self.mqtt.publish(topic, value)
+            self.stats["published"] += 1
+        self.properties = {}
+
+    def _flush_changes(self):
+        if self.batch and len(self.changes) > 1:
+            self.mqtt.publish("batch_ds", json.dumps(self.changes))
+            self.stats["published"] += 1
+        else:
+            for name, value in self.changes.items():
+                self.mqtt.publish("ds/" + name, value)
+                self.stats["published"] += 1
+        self.changes = {}
+
+    def refresh(self):
+        # Forget what was sent, the next update() publishes everything again.
+        # last_published is only touched from the update() thread.
+        self.refresh_due = False
+        self.last_published.clear()
+        self.last_refresh = time.monotonic()
 
     def connected(self):
+        # Runs on the MQTT thread: only ask update() to refresh
+        self.refresh_due = True
+
         # Get latest settings from Blynk.Cloud
         self.mqtt.publish("get/ds", "Power,Set Temperature")
 
@@ -68,7 +141,7 @@ class Device:
         next_temp = max(10, min(next_temp, 35))
         next_temp += (0.5 - random.uniform(0, 1)) * 0.3
         self.current_temp = next_temp
-        self.mqtt.publish("ds/Current Temperature", self.current_temp)
+        self.publish_if_changed("ds/Current Temperature", round(self.current_temp, 2))
 
     def _update_widget_state(self):
         if not self.power_on:
@@ -81,9 +154,12 @@ class Device:
             state = 4 # Cooling
 
         state_colors = [None, "E4F6F7", "E6F7E4", "F7EAE4", "E4EDF7"]
-        self.mqtt.publish("ds/Status", state)
-        self.mqtt.publish("ds/Status/prop/color", state_colors[state])
+        self.publish_if_changed("ds/Status", state)
+        self.publish_if_changed("ds/Status/prop/color", state_colors[state])
 
     def update(self):
+        if self.refresh_due or time.monotonic() - self.last_refresh >= self.refresh_interval:
+            self.refresh()
         self._update_temperature()
-        self._update_widget_state()
\ No newline at end of file
+        self._update_widget_state()
+        self.flush()
\ No newline at end of file
@@ -0,0 +1,232 @@
+'''
+paho-mqtt連線管理(blynk_paho.py、bridge.py、pythonwindow的MQTT工具共用)
+
+1.斷線後用指數退避+隨機抖動重新連線,很多程式同時斷線時不會一起重連
+  連線後維持不到stable_after秒就斷線也算失敗(broker接受後馬上踢掉時不會每秒重連),
+  維持超過stable_after秒才把失敗次數歸零
+2.clean_session=False,broker保留訂閱;broker沒有保留時(session_present=False)自動重新訂閱
+3.斷線時publish的訊息放進有上限的佇列,連線後依序送出,滿了丟掉最舊的
+4.記錄連線次數、失敗次數和斷線的總時間
+
+使用方式:
+    sup = MQTTSupervisor('my-client', 'broker.MQTTGO.io', on_message=on_message)
+    sup.subscribe('kenny1119/#')
+    sup.start()
+    sup.publish('kenny1119/data', '1')
+'''
+
+import random
+import ssl
+import threading
+import time
+from collections import deque
+
+from paho.mqtt.client import Client, CallbackAPIVersion, MQTT_ERR_SUCCESS
+
+MIN_DELAY = 1.0     #第一次重新連線前最多等幾秒
+MAX_DELAY = 60.0    #退避的上限(秒)
+QUEUE_SIZE = 1000   #斷線時最多留幾則publish
+STABLE_AFTER = 30.0 #連線維持多久才算穩定(失敗次數歸零)
+LOOP_TIMEOUT = 0.5
+
+
+class MQTTSupervisor:
+    def __init__(self, client_id, host, port=1883, username=None, password=None, tls=False,
+                 keepalive=60, clean_session=False, min_delay=MIN_DELAY, max_delay=MAX_DELAY,
+                 queue_size=QUEUE_SIZE, on_connect=None, on_disconnect=None, on_message=None,
+                 name=None, stable_after=STABLE_AFTER):
+        '''
+        :param on_connect:on_connect(supervisor, reason_code, session_present),連線成功或被拒絕時呼叫
+        :param on_disconnect:on_disconnect(supervisor, reason_code)
+        :param on_message:和paho的on_message一樣(client, userdata, msg)
+        '''
+        self.name = name or client_id or host
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.stable_after = stable_after
+        self.user_on_connect = on_connect
+        self.user_on_disconnect = on_disconnect
+        #clean_session=False時broker用client_id找回session,不能是空的
+        if not clean_session and not client_id:
+            client_id = f'sup-{random.randint(0, 0xFFFFFF):06x}'
+        self.client = Client(CallbackAPIVersion.VERSION2, client_id=client_id,
+                             clean_session=clean_session)
+        if username is not None:
+            self.client.username_pw_set(username, password)
+        if tls:
+            self.client.tls_set(tls_version=ssl.PROTOCOL_TLSv1_2)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        if on_message is not None:
+            self.client.on_message = on_message
+        self.subscriptions = {}          #topic -> qos,重新連線時使用
+        self.queue = deque(maxlen=queue_size)
+        self.lock = threading.Lock()
+        self.connected = threading.Event()
+        self._stop = threading.Event()
+        self._wake = threading.Event()   #redirect時不用等退避
+        self._thread = None
+        self.failures = 0                #連續失敗次數
+        self.connected_at = None         #這次連線成功的時間,還沒穩定前斷線算失敗
+        self.down_since = time.monotonic()
+        self.metrics = {'connects': 0, 'disconnects': 0, 'failures': 0, 'queued': 0,
+                        'dropped': 0, 'flushed': 0, 'disconnected_s': 0.0,
+                        'last_delay_s': 0.0, 'started': time.monotonic()}
+
+    #----------------------------------------------------------------------------
+    #paho的callback(在supervisor的執行緒執行)
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code == 0:
+            now = time.monotonic()
+            with self.lock:
+                self.metrics['connects'] += 1
+                self.metrics['disconnected_s'] += now - self.down_since
+                self.down_since = None
+            self.connected_at = now
+            if not flags.session_present:
+                for topic, qos in self.subscriptions.items():
+                    client.subscribe(topic, qos)
+            self.connected.set()
+            self._flush()
+        if self.user_on_connect is not None:
+            self.user_on_connect(self, reason_code, flags.session_present)
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        self._mark_down()
+        if self.user_on_disconnect is not None:
+            self.user_on_disconnect(self, reason_code)
+
+    def _mark_down(self):
+        with self.lock:
+            if self.down_since is None:
+                self.down_since = time.monotonic()
+                self.metrics['disconnects'] += 1
+        self.connected.clear()
+
+    #----------------------------------------------------------------------------
+    def backoff(self):
+        '''
+        下一次重新連線前要等幾秒:ceiling/2 ~ ceiling,ceiling = min_delay*2^失敗次數
+        '''
+        ceiling = min(self.max_delay, self.min_delay * (2 ** min(self.failures, 16)))
+        return random.uniform(ceiling / 2, ceiling)
+
+    def _run(self):
+        client = self.client
+        while not self._stop.is_set():
+            if not self.connected.is_set():
+                try:
+                    client.connect(self.host, self.port, self.keepalive)
+                except (OSError, ValueError) as e:
+                    self._retry_later(f'連線失敗:{e}')
+                    continue
+                #等CONNACK
+                deadline = time.monotonic() + 10
+                while not self.connected.is_set() and time.monotonic() < deadline:
+                    if client.loop(LOOP_TIMEOUT) != MQTT_ERR_SUCCESS or self._stop.is_set():
+                        break
+                if not self.connected.is_set():
+                    client.disconnect()
+                    self._retry_later('broker沒有接受連線')
+                    continue
+            if client.loop(LOOP_TIMEOUT) != MQTT_ERR_SUCCESS or not self.connected.is_set():
+                self._mark_down()
+                if not self._stop.is_set():
+                    #連線沒多久就斷線也算失敗,退避時間才會變長;穩定過的斷線只抖動一下再重連
+                    stable = self._stable()
+                    if stable:
+                        self.failures = 0
+                    self._retry_later('斷線', failure=not stable)
+                self.connected_at = None
+            elif self.failures and self._stable():
+                self.failures = 0
+        client.disconnect()
+
+    def _stable(self):
+        return (self.connected_at is not None
+                and time.monotonic() - self.connected_at >= self.stable_after)
+
+    def _retry_later(self, reason, failure=True):
+        if failure:
+            self.failures += 1
+            self.metrics['failures'] += 1
+        delay = self.backoff()
+        self.metrics['last_delay_s'] = delay
+        print(f'[{self.name}] {reason},{delay:.1f}秒後重試')
+        self._wake.wait(delay)
+        self._wake.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f'mqtt-{self.name}', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=2):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout) #在callback裡呼叫stop時不用等
+        self._thread = None
+
+    def redirect(self, host, port=None):
+        '''
+        換到別的broker(例如Blynk的downlink/redirect),走一般的重新連線流程
+        '''
+        self.host = host
+        if port:
+            self.port = port
+        self.client.disconnect()
+        self._mark_down()
+        self._wake.set()
+
+    #----------------------------------------------------------------------------
+    def subscribe(self, topic, qos=0):
+        self.subscriptions[topic] = qos
+        if self.connected.is_set():
+            self.client.subscribe(topic, qos)
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        '''
+        連線中直接送出,斷線時放進佇列;傳回True代表已經交給paho
+        '''
+        if self.connected.is_set():
+            info = self.client.publish(topic, payload, qos, retain)
+            if info.rc == MQTT_ERR_SUCCESS:
+                return True
+        with self.lock:
+            if len(self.queue) == self.queue.maxlen:
+                self.metrics['dropped'] += 1
+            self.queue.append((topic, payload, qos, retain))
+            self.metrics['queued'] += 1
+        return False
+
+    def _flush(self):
+        while self.connected.is_set():
+            with self.lock:
+                if not self.queue:
+                    return
+                topic, payload, qos, retain = self.queue.popleft()
+            if self.client.publish(topic, payload, qos, retain).rc != MQTT_ERR_SUCCESS:
+                with self.lock:
+                    self.queue.appendleft((topic, payload, qos, retain))
+                return
+            self.metrics['flushed'] += 1
+
+    def report(self):
+        '''
+        傳回統計的dict,disconnected_s包含目前這次斷線
+        '''
+        now = time.monotonic()
+        with self.lock:
+            report = dict(self.metrics)
+            if self.down_since is not None:
+                report['disconnected_s'] += now - self.down_since
+            report['pending'] = len(self.queue)
+        elapsed = now - report.pop('started')
+        report['connected'] = self.connected.is_set()
+        report['uptime_ratio'] = 1 - report['disconnected_s'] / elapsed if elapsed > 0 else 0.0
+        return report
@@ -0,0 +1,30 @@
+'''
+在電腦(CPython)上模擬Pico W,讓pico/lesson*/的韌體不用硬體就能執行
+
+提供的模組:machine、network、rp2、umqtt.simple、urequests、micropython
+韌體的import time/gc/_thread/socket會拿到mptime/mpgc/mpthread/mpsocket(MicroPython的版本)
+
+使用方式(在pico資料夾內執行):
+    python -m emulator --firmware lesson18 --count 200 --seconds 60 --local-broker \
+        --module tools=lesson18/tools_computerrun.py --module config=lesson18/computer/config.py
+'''
+
+import os
+import sys
+
+MODULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules')
+
+
+def install():
+    '''
+    把模擬模組加入sys.path,並先載入(之後切換time/gc時才不會互相影響)
+    '''
+    if MODULES_DIR not in sys.path:
+        sys.path.insert(0, MODULES_DIR)
+    import machine, network, rp2, micropython, urequests  # noqa: F401
+    import umqtt.simple  # noqa: F401
+
+
+from .board import Board, Reset  # noqa: E402
+from .loop import EventLoop, get_loop, set_loop  # noqa: E402
+from .fleet import Fleet, VirtualPico  # noqa: E402
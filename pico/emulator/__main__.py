@@ -0,0 +1,68 @@
+#__main__.py
+'''
+python -m emulator --firmware lesson18 --count 200 --seconds 60 --local-broker \
+    --module tools=lesson18/tools_computerrun.py --module config=lesson18/computer/config.py
+'''
+
+import argparse
+import contextlib
+import cProfile
+import os
+import pstats
+import sys
+import time
+
+from .broker import LocalBroker
+from .fleet import Fleet, run_fleet
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在電腦上執行多台虛擬Pico W')
+    parser.add_argument('--firmware', required=True, help='韌體資料夾(例如lesson18)')
+    parser.add_argument('--main', default='main.py', help='開機執行的檔案')
+    parser.add_argument('--module', action='append', default=[], metavar='NAME=PATH',
+                        help='指定模組對應的檔案,例如tools=lesson18/tools_computerrun.py')
+    parser.add_argument('--count', type=int, default=1, help='虛擬Pico數量')
+    parser.add_argument('--seconds', type=float, default=60, help='執行多久(秒)')
+    parser.add_argument('--broker', default='127.0.0.1:1883', help='MQTT broker(host:port)')
+    parser.add_argument('--local-broker', action='store_true', help='啟動內建的測試broker')
+    parser.add_argument('--realtime', action='store_true', help='使用真實時間(預設是虛擬時間)')
+    parser.add_argument('--wifi-delay', type=int, default=1500, help='WiFi連線時間(ms)')
+    parser.add_argument('--wifi-fail-rate', type=float, default=0.0, help='WiFi連線失敗機率')
+    parser.add_argument('--fs-root', help='虛擬Pico的flash資料夾(預設是暫存資料夾)')
+    parser.add_argument('--quiet', action='store_true', help='不顯示韌體的print')
+    parser.add_argument('--profile', action='store_true', help='用cProfile分析韌體的執行')
+    args = parser.parse_args()
+
+    module_map = dict(item.split('=', 1) for item in args.module)
+    host, port = args.broker.rsplit(':', 1)
+    broker = None
+    if args.local_broker:
+        broker = LocalBroker(host, int(port)).start()
+        print(f'內建broker:{host}:{broker.port}')
+        port = broker.port
+
+    fleet = Fleet(args.firmware, count=args.count, main=args.main, module_map=module_map,
+                  broker=(host, int(port)), virtual=not args.realtime,
+                  board_options={'wifi_delay_ms': args.wifi_delay,
+                                 'wifi_fail_rate': args.wifi_fail_rate},
+                  fs_root=args.fs_root)
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        with contextlib.redirect_stdout(devnull if args.quiet else sys.stdout):
+            if args.profile:
+                profiler = cProfile.Profile()
+                elapsed = profiler.runcall(run_fleet, fleet, args.seconds)
+            else:
+                elapsed = run_fleet(fleet, args.seconds)
+    fleet.report(elapsed)
+    if args.profile:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(30)
+
+    if broker is not None:
+        time.sleep(0.5)  #等broker處理完還在buffer裡的封包
+        print(f'broker:{broker.stats}')
+        broker.stop()
+
+
+if __name__ == '__main__':
+    main()
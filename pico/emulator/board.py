@@ -0,0 +1,135 @@
+#board.py
+'''
+一台虛擬Pico的狀態:unique_id、ADC訊號、WiFi參數、統計資料
+machine/network/umqtt模擬模組都透過get_current()找到目前執行中的板子
+(每個thread各自記錄,韌體用_thread在core 1執行的程式也找得到自己的板子)
+'''
+
+import math
+import random
+import threading
+
+from .loop import get_loop
+
+#ADC(Pin(26))=channel 0 ... ADC(Pin(29))=channel 3, ADC(4)=內建溫度
+ADC_PINS = {26: 0, 27: 1, 28: 2, 29: 3}
+TEMPERATURE_CHANNEL = 4
+RTC_BOOT_EPOCH = 1609459200  #2021-01-01 00:00:00
+
+
+class Reset(BaseException):
+    '''
+    machine.reset()或WDT逾時,由fleet重新開機
+    '''
+
+
+def temperature_signal(base=25.0, amplitude=2.0, period=600.0, noise=0.3, rng=random):
+    '''
+    內建溫度sensor:轉換公式是 27 - (V - 0.706)/0.001721
+    '''
+    def signal(t):
+        temperature = base + amplitude * math.sin(2 * math.pi * t / period) + rng.gauss(0, noise)
+        voltage = 0.706 - (temperature - 27) * 0.001721
+        return voltage / 3.3 * 65535
+    return signal
+
+
+def knob_signal(period=20.0, rng=random):
+    '''
+    可變電阻:慢慢轉動的旋鈕
+    '''
+    phase = rng.uniform(0, period)
+    def signal(t):
+        return 32767.5 + 32767.5 * math.sin(2 * math.pi * (t + phase) / period)
+    return signal
+
+
+def light_signal(threshold=8500, period=120.0, noise=400, rng=random):
+    '''
+    光敏電阻:在門檻(8500)上下變化的亮暗
+    '''
+    phase = rng.uniform(0, period)
+    def signal(t):
+        level = threshold + 6000 * math.sin(2 * math.pi * (t + phase) / period)
+        return level + rng.gauss(0, noise)
+    return signal
+
+
+class Board:
+    def __init__(self, index=0, seed=None, broker=('127.0.0.1', 1883),
+                 wifi_delay_ms=1500, wifi_fail_rate=0.0, rejoin_delay_ms=None, aps=None):
+        self.index = index
+        self.rng = random.Random(seed if seed is not None else index)
+        self.uid = bytes([0xE6, 0x61, 0x41, 0x04]) + index.to_bytes(4, 'big')
+        self.broker = broker                  #所有MQTT連線都導向這個broker,None代表使用原本的位址
+        self.wifi_delay_ms = wifi_delay_ms    #完整掃描+連線需要的時間
+        self.rejoin_delay_ms = rejoin_delay_ms if rejoin_delay_ms is not None else wifi_delay_ms // 5
+        self.wifi_fail_rate = wifi_fail_rate
+        #可以連線的AP: ssid -> (password,bssid,channel,rssi)
+        self.aps = aps if aps is not None else {
+            'A590301': ('A590301AA', bytes([0x02, 0x11, 0x22, 0x33, 0x44, 0x55]), 6, -55),
+        }
+        self.ip = '192.168.0.{}'.format(100 + index % 150)
+        self.signals = {
+            TEMPERATURE_CHANNEL: temperature_signal(rng=self.rng),
+            0: knob_signal(rng=self.rng),
+            2: light_signal(rng=self.rng),
+        }
+        self.pwm = {}         #pin -> duty_u16
+        self.pins = {}        #pin -> value
+        self.timers = []
+        self.threads = []     #_thread開的執行緒
+        self.generation = 0   #每次重新開機加1,舊的執行緒看到不一樣就結束
+        self.fs_dir = None    #模擬flash的資料夾,由fleet設定
+        self.rtc_offset = RTC_BOOT_EPOCH - get_loop().epoch()  #還沒對時的RTC從2021-01-01開始
+        self.reboot = None    #由fleet設定,重新開機時呼叫
+        self.gc_enabled = True  #韌體的gc.enable()/gc.disable(),見mpgc
+        self.stats = {'publish': 0, 'publish_bytes': 0, 'mqtt_connect': 0,
+                      'wifi_connect': 0, 'errors': 0, 'resets': 0, 'gc_collect': 0}
+
+    def read_adc(self, channel):
+        signal = self.signals.get(channel)
+        if signal is None:
+            return 0
+        value = int(signal(get_loop().ticks_ms() / 1000))
+        return max(0, min(65535, value))
+
+    def rtc_epoch(self):
+        return get_loop().epoch() + self.rtc_offset
+
+    def on_reset(self):
+        self.stats['resets'] += 1
+        self.gc_enabled = True
+        self.generation += 1
+        self.threads.clear()
+        self.deinit_timers()
+        if self.reboot is not None:
+            self.reboot()
+
+    def on_error(self, e):
+        print('pico#{} 錯誤:{!r}'.format(self.index, e))
+
+    def deinit_timers(self):
+        for timer in list(self.timers):
+            timer.deinit()
+        self.timers.clear()
+
+
+_local = threading.local()  #目前執行中的板子
+
+
+def current():
+    return getattr(_local, 'board', None)
+
+
+def get_current():
+    board = current()
+    if board is None:
+        raise RuntimeError('沒有執行中的虛擬Pico')
+    return board
+
+
+def set_current(board):
+    previous = current()
+    _local.board = board
+    return previous
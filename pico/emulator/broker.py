@@ -0,0 +1,187 @@
+#broker.py
+'''
+本機測試用的簡易MQTT broker(MQTT 3.1.1,QoS 0轉送,支援+和#萬用字元)
+沒有安裝mosquitto時,虛擬Pico和電腦端程式可以連到這裡
+'''
+
+import asyncio
+import concurrent.futures
+import struct
+import threading
+
+
+def topic_matches(pattern, topic):
+    p = pattern.split('/')
+    t = topic.split('/')
+    for i, level in enumerate(p):
+        if level == '#':
+            return True
+        if i >= len(t):
+            return False
+        if level != '+' and level != t[i]:
+            return False
+    return len(p) == len(t)
+
+
+def _remaining(length):
+    out = bytearray()
+    while True:
+        b = length & 0x7F
+        length >>= 7
+        out.append(b | 0x80 if length else b)
+        if not length:
+            return bytes(out)
+
+
+class _Session:
+    def __init__(self, writer):
+        self.writer = writer
+        self.subscriptions = {}  #pattern -> qos
+
+
+class LocalBroker:
+    def __init__(self, host='127.0.0.1', port=1883):
+        self.host = host
+        self.port = port
+        self.sessions = set()
+        self.retained = {}
+        self.stats = {'connect': 0, 'publish_in': 0, 'publish_out': 0}
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    async def _read_packet(self, reader):
+        header = await reader.readexactly(1)
+        length = 0
+        shift = 0
+        while True:
+            b = (await reader.readexactly(1))[0]
+            length |= (b & 0x7F) << shift
+            if not b & 0x80:
+                break
+            shift += 7
+        body = await reader.readexactly(length) if length else b''
+        return header[0], body
+
+    def _deliver(self, topic, payload, retain=False):
+        t = topic.encode('utf-8')
+        packet = bytes([0x30 | retain]) + _remaining(2 + len(t) + len(payload)) + struct.pack('!H', len(t)) + t + payload
+        for session in list(self.sessions):
+            if any(topic_matches(pattern, topic) for pattern in session.subscriptions):
+                session.writer.write(packet)
+                self.stats['publish_out'] += 1
+
+    async def _handle(self, reader, writer):
+        session = _Session(writer)
+        try:
+            op, body = await self._read_packet(reader)
+            if op & 0xF0 != 0x10:
+                return
+            writer.write(b'\x20\x02\x00\x00')
+            self.stats['connect'] += 1
+            self.sessions.add(session)
+            while True:
+                op, body = await self._read_packet(reader)
+                kind = op & 0xF0
+                if kind == 0x30:  #PUBLISH
+                    qos = (op >> 1) & 3
+                    topic_len = struct.unpack_from('!H', body, 0)[0]
+                    topic = body[2:2 + topic_len].decode('utf-8')
+                    offset = 2 + topic_len
+                    if qos:
+                        pid = body[offset:offset + 2]
+                        offset += 2
+                        writer.write(b'\x40\x02' + pid)
+                    payload = body[offset:]
+                    self.stats['publish_in'] += 1
+                    if op & 1:
+                        if payload:
+                            self.retained[topic] = payload
+                        else:
+                            self.retained.pop(topic, None)
+                    self._deliver(topic, payload)
+                elif kind == 0x80:  #SUBSCRIBE
+                    pid = body[:2]
+                    offset = 2
+                    granted = bytearray()
+                    patterns = []
+                    while offset < len(body):
+                        length = struct.unpack_from('!H', body, offset)[0]
+                        pattern = body[offset + 2:offset + 2 + length].decode('utf-8')
+                        qos = body[offset + 2 + length]
+                        offset += 3 + length
+                        session.subscriptions[pattern] = qos
+                        patterns.append(pattern)
+                        granted.append(0)
+                    writer.write(b'\x90' + _remaining(2 + len(granted)) + pid + bytes(granted))
+                    for topic, payload in self.retained.items():
+                        if any(topic_matches(p, topic) for p in patterns):
+                            t = topic.encode('utf-8')
+                            writer.write(b'\x31' + _remaining(2 + len(t) + len(payload)) +
+                                         struct.pack('!H', len(t)) + t + payload)
+                elif kind == 0xA0:  #UNSUBSCRIBE
+                    pid = body[:2]
+                    offset = 2
+                    while offset < len(body):
+                        length = struct.unpack_from('!H', body, offset)[0]
+                        session.subscriptions.pop(body[offset + 2:offset + 2 + length].decode('utf-8'), None)
+                        offset += 2 + length
+                    writer.write(b'\xb0\x02' + pid)
+                elif kind == 0xC0:  #PINGREQ
+                    writer.write(b'\xd0\x00')
+                elif kind == 0xE0:  #DISCONNECT
+                    return
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    def start(self):
+        '''
+        在背景thread啟動broker,傳回後就可以連線
+        '''
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, backlog=1024))
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    async def _shutdown(self):
+        self._server.close()
+        for session in list(self.sessions):
+            session.writer.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+        if self._loop is not None:
+            future = asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+            try:
+                future.result(timeout=5)
+            except concurrent.futures.TimeoutError:
+                pass  #broker還在處理大量封包,daemon thread會隨著程式結束
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=2)
+
+
+if __name__ == '__main__':
+    import time
+    broker = LocalBroker(host='0.0.0.0').start()
+    print(f'broker啟動:port={broker.port}')
+    while True:
+        time.sleep(10)
+        print(broker.stats)
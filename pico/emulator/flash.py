@@ -0,0 +1,24 @@
+#flash.py
+'''
+模擬每台Pico自己的flash檔案系統
+韌體用相對路徑open()時,會開到這台板子的資料夾(例如wifi.json)
+'''
+
+import builtins
+import os
+
+from . import board as _board
+
+_real_open = builtins.open
+
+
+def _open(file, mode='r', *args, **kwargs):
+    board = _board.current()
+    if board is not None and board.fs_dir and isinstance(file, str) and not os.path.isabs(file):
+        os.makedirs(board.fs_dir, exist_ok=True)
+        file = os.path.join(board.fs_dir, file)
+    return _real_open(file, mode, *args, **kwargs)
+
+
+def install():
+    builtins.open = _open
@@ -0,0 +1,151 @@
+#fleet.py
+'''
+在同一個process內啟動很多台虛擬Pico
+每台Pico各自載入一份韌體(main.py、tools.py...),模組不會互相共用
+'''
+
+import importlib.util
+import os
+import sys
+import tempfile
+import time as _time
+
+from . import board as _board
+from . import flash, mpgc, mpsocket, mpthread, mptime
+from .board import Board
+from .loop import EventLoop, get_loop, set_loop
+
+#韌體import這些模組時,拿到的是MicroPython版本
+SHIMS = {'time': mptime, 'gc': mpgc, '_thread': mpthread, 'socket': mpsocket}
+
+
+class VirtualPico:
+    def __init__(self, board, firmware_dir, main='main.py', module_map=None):
+        '''
+        :param board:Board的實體
+        :param firmware_dir:韌體所在的資料夾
+        :param module_map:{模組名稱:檔案路徑},例如{'tools':'lesson18/tools_computerrun.py'}
+        '''
+        self.board = board
+        self.firmware_dir = os.path.abspath(firmware_dir)
+        self.main = main
+        self.module_map = module_map or {}
+        self.modules = {}    #這台Pico載入的韌體模組
+        self.globals = None  #main.py的全域變數
+        self.boots = 0
+        board.reboot = self.schedule_boot
+
+    def _is_firmware(self, module):
+        path = getattr(module, '__file__', None)
+        if not path:
+            return False
+        path = os.path.abspath(path)
+        return path.startswith(self.firmware_dir + os.sep) or path in self._mapped_paths
+
+    def schedule_boot(self, delay_ms=10):
+        '''
+        重新開機(由事件迴圈稍後執行,避免在Timer callback內重新開機)
+        '''
+        get_loop().schedule(self, delay_ms)
+
+    def _fire(self, deadline):
+        self.boot()
+
+    def boot(self):
+        '''
+        開機:執行main.py(__name__ == '__main__')
+        '''
+        self.board.deinit_timers()
+        self.boots += 1
+        self._mapped_paths = {os.path.abspath(p) for p in self.module_map.values()}
+        saved = {name: sys.modules.get(name) for name in SHIMS}
+        sys.modules.update(SHIMS)
+        sys.path.insert(0, self.firmware_dir)
+        previous = _board.set_current(self.board)
+        try:
+            for name, path in self.module_map.items():
+                spec = importlib.util.spec_from_file_location(name, path)
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[name] = module
+                spec.loader.exec_module(module)
+            path = os.path.join(self.firmware_dir, self.main)
+            with open(path, encoding='utf-8') as f:
+                code = compile(f.read(), path, 'exec')
+            self.globals = {'__name__': '__main__', '__file__': path}
+            exec(code, self.globals)
+        except _board.Reset:
+            self.board.on_reset()
+        except Exception as e:
+            self.board.stats['errors'] += 1
+            self.board.on_error(e)
+        finally:
+            for name, module in list(sys.modules.items()):
+                if module is not None and name not in SHIMS and self._is_firmware(module):
+                    self.modules[name] = sys.modules.pop(name)
+            sys.path.remove(self.firmware_dir)
+            for name, module in saved.items():
+                sys.modules[name] = module
+            _board.set_current(previous)
+
+
+class Fleet:
+    def __init__(self, firmware_dir, count=1, main='main.py', module_map=None,
+                 broker=('127.0.0.1', 1883), virtual=True, board_options=None, fs_root=None):
+        '''
+        :param fs_root:每台Pico的flash資料夾放在這裡(預設是暫存資料夾)
+        '''
+        from . import install
+        install()
+        flash.install()
+        self.loop = set_loop(EventLoop(virtual=virtual))
+        self.fs_root = fs_root or tempfile.mkdtemp(prefix='picofs_')
+        board_options = board_options or {}
+        self.picos = []
+        self.booted_ms = 0     #全部開機完成時的ticks_ms,--seconds從這裡開始算
+        self.boot_stats = {}   #開機完成時的統計,report()只算之後的部分
+        for i in range(count):
+            board = Board(index=i, broker=broker, **board_options)
+            board.fs_dir = os.path.join(self.fs_root, f'pico{i}')
+            self.picos.append(VirtualPico(board, firmware_dir, main=main, module_map=module_map))
+
+    def boot(self):
+        '''
+        依序開機(每台的main.py會等WiFi連線,共用的虛擬時間會一直往前),
+        開機期間先開好的Pico照常執行Timer,所以統計從全部開機完成後才開始算
+        '''
+        for pico in self.picos:
+            pico.boot()
+        self.booted_ms = self.loop.ticks_ms()
+        self.boot_stats = self.stats()
+
+    def run(self, seconds):
+        self.loop.run(seconds)
+
+    def stats(self):
+        total = {}
+        for pico in self.picos:
+            for key, value in pico.board.stats.items():
+                total[key] = total.get(key, 0) + value
+        return total
+
+    def report(self, elapsed):
+        total = {key: value - self.boot_stats.get(key, 0) for key, value in self.stats().items()}
+        simulated = (self.loop.ticks_ms() - self.booted_ms) / 1000
+        print(f'虛擬Pico:{len(self.picos)}台, 開機:{self.booted_ms / 1000:.1f}秒(模擬時間), '
+              f'之後模擬時間:{simulated:.1f}秒, 實際時間:{elapsed:.2f}秒')
+        for key, value in total.items():
+            print(f'  {key}:{value}')
+        if simulated > 0:
+            print(f'  publish/秒(模擬時間):{total["publish"] / simulated:.1f}')
+        if elapsed > 0:
+            print(f'  publish/秒(實際時間):{total["publish"] / elapsed:.1f}')
+
+
+def run_fleet(fleet, seconds):
+    '''
+    開機之後再執行seconds秒(模擬時間),傳回開機之後實際花費的時間
+    '''
+    fleet.boot()
+    start = _time.perf_counter()
+    fleet.run(seconds)
+    return _time.perf_counter() - start
@@ -0,0 +1,103 @@
+#loop.py
+'''
+模擬器的事件迴圈,負責驅動machine.Timer
+virtual=True時使用虛擬時間(不會真的等待,可以快速跑很多台Pico)
+virtual=False時使用真實時間
+'''
+
+import heapq
+import itertools
+import time as _time
+
+
+class EventLoop:
+    def __init__(self, virtual=True, epoch=None):
+        self.virtual = virtual
+        self._queue = []                  #(deadline_ms, 順序, timer)
+        self._counter = itertools.count()
+        self._start = _time.monotonic()
+        self._virtual_ms = 0
+        self._epoch = _time.time() if epoch is None else epoch  #ticks_ms()=0時的epoch秒數
+        self._dispatching = False
+
+    def ticks_ms(self):
+        if self.virtual:
+            return self._virtual_ms
+        return int((_time.monotonic() - self._start) * 1000)
+
+    def epoch(self):
+        '''
+        目前的epoch秒數(float)
+        '''
+        return self._epoch + self.ticks_ms() / 1000
+
+    def schedule(self, timer, delay_ms):
+        heapq.heappush(self._queue, (self.ticks_ms() + delay_ms, next(self._counter), timer))
+
+    def cancel(self, timer):
+        self._queue = [item for item in self._queue if item[2] is not timer]
+        heapq.heapify(self._queue)
+
+    def _fire_due(self, now_ms):
+        if self._dispatching:
+            return
+        self._dispatching = True
+        try:
+            while self._queue and self._queue[0][0] <= now_ms:
+                deadline, _, timer = heapq.heappop(self._queue)
+                if self.virtual:
+                    self._virtual_ms = max(self._virtual_ms, deadline)
+                timer._fire(deadline)
+        finally:
+            self._dispatching = False
+
+    def sleep(self, seconds):
+        '''
+        韌體呼叫time.sleep()時執行,等待期間Timer照常觸發
+        '''
+        self.sleep_ms(int(seconds * 1000))
+
+    def sleep_ms(self, ms):
+        if ms <= 0:
+            return
+        end = self.ticks_ms() + ms
+        if self.virtual:
+            if not self._dispatching:
+                self._fire_due(end)
+            self._virtual_ms = max(self._virtual_ms, end)
+            return
+        self._wait_until(end)
+
+    def _wait_until(self, end_ms):
+        while True:
+            now = self.ticks_ms()
+            self._fire_due(now)
+            if now >= end_ms:
+                return
+            next_deadline = self._queue[0][0] if self._queue else end_ms
+            _time.sleep(max(0, min(next_deadline, end_ms) - now) / 1000)
+
+    def run(self, seconds=None):
+        '''
+        :param seconds:執行多久(None代表一直執行)
+        '''
+        if seconds is None:
+            while True:
+                self.sleep(3600)
+        self.sleep(seconds)
+
+
+_loop = None
+
+
+def get_loop():
+    global _loop
+    if _loop is None:
+        _loop = EventLoop()
+    return _loop
+
+
+def set_loop(loop):
+    global _loop
+    _loop = loop
+    return loop
@@ -0,0 +1,214 @@
+#machine.py
+'''
+模擬MicroPython的machine模組(rp2 port)
+'''
+
+import calendar as _calendar
+import time as _time
+
+from emulator import board as _board
+from emulator.loop import get_loop
+
+
+def unique_id():
+    return _board.get_current().uid
+
+
+def reset():
+    raise _board.Reset('machine.reset()')
+
+
+def soft_reset():
+    raise _board.Reset('machine.soft_reset()')
+
+
+def freq(hz=None):
+    return 125000000
+
+
+def idle():
+    pass
+
+
+def lightsleep(ms=None):
+    if ms is not None:
+        get_loop().sleep_ms(ms)
+
+
+deepsleep = lightsleep
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 4
+    IRQ_FALLING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.board = _board.get_current()
+        if value is not None:
+            self.value(value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if value is not None:
+            self.value(value)
+
+    def value(self, v=None):
+        if v is None:
+            return self.board.pins.get(self.id, 0)
+        self.board.pins[self.id] = 1 if v else 0
+
+    __call__ = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def high(self):
+        self.value(1)
+
+    def low(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(0 if self.value() else 1)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        pass
+
+    def __repr__(self):
+        return 'Pin({})'.format(self.id)
+
+
+class ADC:
+    CORE_TEMP = _board.TEMPERATURE_CHANNEL
+
+    def __init__(self, pin):
+        self.board = _board.get_current()
+        if isinstance(pin, Pin):
+            pin = pin.id
+        self.channel = _board.ADC_PINS.get(pin, pin)
+
+    def read_u16(self):
+        return self.board.read_adc(self.channel)
+
+
+class PWM:
+    def __init__(self, pin, freq=None, duty_u16=None):
+        self.board = _board.get_current()
+        self.pin = pin.id if isinstance(pin, Pin) else pin
+        self._freq = 1000
+        if freq is not None:
+            self.freq(freq)
+        self.board.pwm.setdefault(self.pin, 0)
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        if not 8 <= value <= 62500000:
+            raise ValueError('freq too small')
+        self._freq = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self.board.pwm.get(self.pin, 0)
+        self.board.pwm[self.pin] = max(0, min(65535, int(value)))
+
+    def deinit(self):
+        self.board.pwm.pop(self.pin, None)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, *, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self.board = _board.get_current()
+        self._active = False
+        if callback is not None:
+            self.init(mode=mode, period=period, freq=freq, callback=callback)
+
+    def init(self, *, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self.deinit()
+        if freq > 0:
+            period = 1000 / freq
+        if period < 0:
+            raise ValueError('period must be specified')
+        self.mode = mode
+        self.period = max(1, int(period))
+        self.callback = callback
+        self._active = True
+        if self not in self.board.timers:
+            self.board.timers.append(self)
+        get_loop().schedule(self, self.period)
+
+    def deinit(self):
+        if self._active:
+            self._active = False
+            get_loop().cancel(self)
+        if self in self.board.timers:
+            self.board.timers.remove(self)
+
+    def _fire(self, deadline):
+        if not self._active:
+            return
+        if self.mode == Timer.PERIODIC:
+            get_loop().schedule(self, self.period)
+        else:
+            self.deinit()
+        previous = _board.set_current(self.board)
+        try:
+            self.callback(self)
+        except _board.Reset:
+            self.board.on_reset()
+        except Exception as e:
+            self.board.stats['errors'] += 1
+            self.board.on_error(e)
+        finally:
+            _board.set_current(previous)
+
+
+class WDT:
+    def __init__(self, id=0, timeout=5000):
+        self.board = _board.get_current()
+        self.timeout = timeout
+        self._timer = Timer(mode=Timer.ONE_SHOT, period=timeout, callback=self._expire)
+
+    def feed(self):
+        self._timer.init(mode=Timer.ONE_SHOT, period=self.timeout, callback=self._expire)
+
+    def _expire(self, t):
+        raise _board.Reset('WDT timeout')
+
+
+class RTC:
+    def __init__(self):
+        self.board = _board.get_current()
+
+    def datetime(self, value=None):
+        '''
+        (year, month, day, weekday, hours, minutes, seconds, subseconds)
+        '''
+        if value is not None:
+            year, month, day, weekday, hours, minutes, seconds = value[:7]
+            epoch = _calendar.timegm((year, month, day, hours, minutes, seconds, 0, 0, 0))
+            self.board.rtc_offset = epoch - get_loop().epoch()
+            return
+        t = _time.gmtime(self.board.rtc_epoch())
+        return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_wday, t.tm_hour, t.tm_min, t.tm_sec, 0)
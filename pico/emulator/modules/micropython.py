@@ -0,0 +1,37 @@
+#micropython.py
+'''
+模擬MicroPython的micropython模組
+'''
+
+import gc as _gc
+
+
+def const(value):
+    return value
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def schedule(func, arg):
+    func(arg)
+
+
+def opt_level(level=None):
+    return 0
+
+
+def mem_info(verbose=None):
+    import emulator.mpgc as mpgc
+    print('stack: 0 out of 7936')
+    print('GC: total: {}, used: {}, free: {}'.format(mpgc.HEAP_SIZE, mpgc.mem_alloc(), mpgc.mem_free()))
+
+
+def heap_lock():
+    _gc.disable()
+
+
+def heap_unlock():
+    _gc.enable()
+    return 0
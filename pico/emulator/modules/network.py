@@ -0,0 +1,131 @@
+#network.py
+'''
+模擬Pico W的network模組
+WLAN.connect()之後status()會隨時間變化:
+    STAT_CONNECTING(1) -> STAT_GOT_IP(3)
+    或失敗:STAT_CONNECT_FAIL(-1)、STAT_NO_AP_FOUND(-2)、STAT_WRONG_PASSWORD(-3)
+'''
+
+from emulator import board as _board
+from emulator.loop import get_loop
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_NO_IP = 2
+STAT_GOT_IP = 3
+STAT_CONNECT_FAIL = -1
+STAT_NO_AP_FOUND = -2
+STAT_WRONG_PASSWORD = -3
+
+
+def hostname(name=None):
+    if name is None:
+        return 'PicoW'
+
+
+def country(code=None):
+    if code is None:
+        return 'XX'
+
+
+class WLAN:
+    PM_NONE = 0xa11140
+    PM_PERFORMANCE = 0xa11142
+    PM_POWERSAVE = 0x111022
+
+    def __init__(self, interface_id=STA_IF):
+        self.board = _board.get_current()
+        self.interface_id = interface_id
+        self._active = False
+        self._status = STAT_IDLE
+        self._ready_at = None      #連線完成的時間(ticks_ms)
+        self._result = STAT_IDLE   #到_ready_at時的結果
+        self._ssid = None
+        self._channel = 0
+        self._pm = self.PM_POWERSAVE
+        self._ifconfig = ('0.0.0.0', '0.0.0.0', '0.0.0.0', '0.0.0.0')
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if not self._active:
+            self.disconnect()
+
+    def connect(self, ssid=None, key=None, *, bssid=None, channel=None):
+        '''
+        有指定bssid/channel時省略掃描,連線時間較短
+        '''
+        if not self._active:
+            raise OSError('WLAN not active')
+        board = self.board
+        delay = board.wifi_delay_ms
+        ap = board.aps.get(ssid)
+        if ap is None:
+            result = STAT_NO_AP_FOUND
+        elif ap[0] != key:
+            result = STAT_WRONG_PASSWORD
+        elif board.rng.random() < board.wifi_fail_rate:
+            result = STAT_CONNECT_FAIL
+        else:
+            result = STAT_GOT_IP
+            if bssid is not None and bytes(bssid) == ap[1]:
+                delay = board.rejoin_delay_ms
+        self._ssid = ssid
+        self._channel = ap[2] if ap else 0
+        self._status = STAT_CONNECTING
+        self._result = result
+        self._ready_at = get_loop().ticks_ms() + int(delay * board.rng.uniform(0.8, 1.2))
+
+    def disconnect(self):
+        self._status = STAT_IDLE
+        self._ready_at = None
+        self._ifconfig = ('0.0.0.0', '0.0.0.0', '0.0.0.0', '0.0.0.0')
+
+    def status(self, param=None):
+        if param == 'rssi':
+            ap = self.board.aps.get(self._ssid)
+            return ap[3] if ap else 0
+        if self._status == STAT_CONNECTING and get_loop().ticks_ms() >= self._ready_at:
+            self._status = self._result
+            if self._status == STAT_GOT_IP:
+                self.board.stats['wifi_connect'] += 1
+                self._ifconfig = (self.board.ip, '255.255.255.0', '192.168.0.1', '8.8.8.8')
+        return self._status
+
+    def isconnected(self):
+        return self.status() == STAT_GOT_IP
+
+    def ifconfig(self, config=None):
+        if config is None:
+            return self._ifconfig
+        if config == 'dhcp':
+            self._ifconfig = ('0.0.0.0', '0.0.0.0', '0.0.0.0', '0.0.0.0') #連線成功時再取得
+            return
+        self._ifconfig = tuple(config)
+
+    def config(self, *args, **kwargs):
+        if kwargs:
+            if 'pm' in kwargs:
+                self._pm = kwargs['pm']
+            return
+        param = args[0]
+        if param == 'mac':
+            return bytes([0x28, 0xCD, 0xC1]) + self.board.uid[-3:]
+        if param == 'ssid':
+            return self._ssid
+        if param == 'channel':
+            return self._channel
+        if param == 'pm':
+            return self._pm
+        raise ValueError('unknown config param')
+
+    def scan(self):
+        '''
+        傳出[(ssid, bssid, channel, RSSI, security, hidden),...]
+        '''
+        get_loop().sleep_ms(self.board.wifi_delay_ms // 2)
+        return [(ssid.encode(), ap[1], ap[2], ap[3], 3, 0) for ssid, ap in self.board.aps.items()]
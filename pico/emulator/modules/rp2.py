@@ -0,0 +1,17 @@
+#rp2.py
+'''
+模擬MicroPython的rp2模組
+'''
+
+_country = 'XX'
+
+
+def country(code=None):
+    global _country
+    if code is None:
+        return _country
+    _country = code
+
+
+def bootsel_button():
+    return 0
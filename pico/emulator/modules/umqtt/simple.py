@@ -0,0 +1,209 @@
+#simple.py
+'''
+模擬umqtt.simple(MQTT 3.1.1,QoS 0/1),使用CPython的socket連線到broker
+虛擬Pico的連線一律導向board.broker(預設是本機的broker)
+'''
+
+import socket
+import struct
+
+from emulator import board as _board
+
+
+class MQTTException(Exception):
+    pass
+
+
+def _to_bytes(s):
+    if isinstance(s, str):
+        return s.encode('utf-8')
+    return bytes(s)
+
+
+class MQTTClient:
+    def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0,
+                 ssl=None, ssl_params={}):
+        if port == 0:
+            port = 8883 if ssl else 1883
+        self.board = _board.get_current()
+        self.client_id = _to_bytes(client_id)
+        self.sock = None
+        self.server = server
+        self.port = port
+        self.ssl = ssl
+        self.pid = 0
+        self.cb = None
+        self.user = user
+        self.pswd = password
+        self.keepalive = keepalive
+        self.lw_topic = None
+        self.lw_msg = None
+        self.lw_qos = 0
+        self.lw_retain = False
+
+    def _send_str(self, s):
+        s = _to_bytes(s)
+        self.sock.sendall(struct.pack('!H', len(s)) + s)
+
+    def _recv_exact(self, n):
+        data = b''
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise OSError(-1)
+            data += chunk
+        return data
+
+    def _recv_len(self):
+        n = 0
+        sh = 0
+        while True:
+            b = self._recv_exact(1)[0]
+            n |= (b & 0x7F) << sh
+            if not b & 0x80:
+                return n
+            sh += 7
+
+    @staticmethod
+    def _remaining(length):
+        out = bytearray()
+        while True:
+            b = length & 0x7F
+            length >>= 7
+            out.append(b | 0x80 if length else b)
+            if not length:
+                return bytes(out)
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        assert 0 <= qos <= 2
+        assert topic
+        self.lw_topic = topic
+        self.lw_msg = msg
+        self.lw_qos = qos
+        self.lw_retain = retain
+
+    def connect(self, clean_session=True, timeout=None):
+        address = self.board.broker or (self.server, 1883 if self.ssl else self.port)
+        self.sock = socket.create_connection(address, timeout=timeout or 10)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(None)
+        body = bytearray(b'\x00\x04MQTT\x04\x02\x00\x00')
+        body[7] = clean_session << 1
+        struct.pack_into('!H', body, 8, self.keepalive)
+        payload = struct.pack('!H', len(self.client_id)) + self.client_id
+        if self.lw_topic:
+            body[7] |= 0x4 | (self.lw_qos & 0x1) << 3 | (self.lw_qos & 0x2) << 3
+            body[7] |= self.lw_retain << 5
+            topic = _to_bytes(self.lw_topic)
+            msg = _to_bytes(self.lw_msg)
+            payload += struct.pack('!H', len(topic)) + topic + struct.pack('!H', len(msg)) + msg
+        if self.user:
+            body[7] |= 0xC0 if self.pswd is not None else 0x80
+            user = _to_bytes(self.user)
+            payload += struct.pack('!H', len(user)) + user
+            if self.pswd is not None:
+                pswd = _to_bytes(self.pswd)
+                payload += struct.pack('!H', len(pswd)) + pswd
+        packet = bytes(body) + payload
+        self.sock.sendall(b'\x10' + self._remaining(len(packet)) + packet)
+        resp = self._recv_exact(4)
+        assert resp[0] == 0x20 and resp[1] == 0x02
+        if resp[3] != 0:
+            raise MQTTException(resp[3])
+        self.board.stats['mqtt_connect'] += 1
+        return resp[2] & 1
+
+    def disconnect(self):
+        try:
+            self.sock.sendall(b'\xe0\x00')
+        finally:
+            self.sock.close()
+
+    def ping(self):
+        self.sock.sendall(b'\xc0\x00')
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        topic = _to_bytes(topic)
+        msg = _to_bytes(msg)
+        sz = 2 + len(topic) + len(msg)
+        if qos > 0:
+            sz += 2
+        header = bytes([0x30 | qos << 1 | retain]) + self._remaining(sz)
+        packet = header + struct.pack('!H', len(topic)) + topic
+        if qos > 0:
+            self.pid += 1
+            pid = self.pid
+            packet += struct.pack('!H', pid)
+        self.sock.sendall(packet + msg)
+        self.board.stats['publish'] += 1
+        self.board.stats['publish_bytes'] += len(msg)
+        if qos == 1:
+            while True:
+                op = self.wait_msg()
+                if op == 0x40:
+                    sz = self._recv_exact(1)
+                    assert sz == b'\x02'
+                    rcv_pid = struct.unpack('!H', self._recv_exact(2))[0]
+                    if pid == rcv_pid:
+                        return
+        elif qos == 2:
+            assert 0
+
+    def subscribe(self, topic, qos=0):
+        assert self.cb is not None, 'Subscribe callback is not set'
+        topic = _to_bytes(topic)
+        self.pid += 1
+        packet = struct.pack('!H', self.pid) + struct.pack('!H', len(topic)) + topic + bytes([qos])
+        self.sock.sendall(b'\x82' + self._remaining(len(packet)) + packet)
+        while True:
+            op = self.wait_msg()
+            if op == 0x90:
+                resp = self._recv_exact(4)
+                assert resp[1] == packet[0] and resp[2] == packet[1]
+                if resp[3] == 0x80:
+                    raise MQTTException(resp[3])
+                return
+
+    def wait_msg(self):
+        '''
+        等待一個封包,收到PUBLISH時呼叫callback
+        '''
+        try:
+            res = self.sock.recv(1)
+        except BlockingIOError:
+            return None
+        finally:
+            self.sock.setblocking(True)
+        if res == b'':
+            raise OSError(-1)
+        if res == b'\xd0':  #PINGRESP
+            sz = self._recv_exact(1)[0]
+            assert sz == 0
+            return None
+        op = res[0]
+        if op & 0xF0 != 0x30:
+            return op
+        sz = self._recv_len()
+        topic_len = struct.unpack('!H', self._recv_exact(2))[0]
+        topic = self._recv_exact(topic_len)
+        sz -= topic_len + 2
+        if op & 6:
+            pid = struct.unpack('!H', self._recv_exact(2))[0]
+            sz -= 2
+        msg = self._recv_exact(sz)
+        self.cb(topic, msg)
+        if op & 6 == 2:
+            self.sock.sendall(b'\x40\x02' + struct.pack('!H', pid))
+        elif op & 6 == 4:
+            assert 0
+        return op
+
+    def check_msg(self):
+        '''
+        不等待,有訊息才處理
+        '''
+        self.sock.setblocking(False)
+        return self.wait_msg()
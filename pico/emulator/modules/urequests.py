@@ -0,0 +1,51 @@
+#urequests.py
+'''
+模擬MicroPython的urequests(使用urllib)
+'''
+
+import json as _json
+import urllib.request as _request
+
+
+class Response:
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return _json.loads(self.content)
+
+    def close(self):
+        pass
+
+
+def request(method, url, data=None, json=None, headers={}, timeout=None):
+    headers = dict(headers)
+    if json is not None:
+        data = _json.dumps(json)
+        headers.setdefault('Content-Type', 'application/json')
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    req = _request.Request(url, data=data, headers=headers, method=method)
+    with _request.urlopen(req, timeout=timeout) as resp:
+        return Response(resp.status, resp.read())
+
+
+def get(url, **kw):
+    return request('GET', url, **kw)
+
+
+def post(url, **kw):
+    return request('POST', url, **kw)
+
+
+def put(url, **kw):
+    return request('PUT', url, **kw)
+
+
+def delete(url, **kw):
+    return request('DELETE', url, **kw)
@@ -0,0 +1,49 @@
+#mpgc.py
+'''
+韌體裡的import gc會拿到這個模組(MicroPython的gc)
+heap大小模擬Pico W的可用heap,使用量在tracemalloc開啟時才有意義
+collect/enable/disable只記錄在目前的板子上(不會動到CPython的gc,其他板子也不受影響)
+'''
+
+import tracemalloc
+
+from . import board as _board
+
+HEAP_SIZE = 192 * 1024
+
+
+def collect():
+    board = _board.current()
+    if board is not None:
+        board.stats['gc_collect'] += 1
+
+
+def enable():
+    board = _board.current()
+    if board is not None:
+        board.gc_enabled = True
+
+
+def disable():
+    board = _board.current()
+    if board is not None:
+        board.gc_enabled = False
+
+
+def isenabled():
+    board = _board.current()
+    return True if board is None else board.gc_enabled
+
+
+def threshold(amount=None):
+    return -1
+
+
+def mem_alloc():
+    if not tracemalloc.is_tracing():
+        return 0
+    return tracemalloc.get_traced_memory()[0]
+
+
+def mem_free():
+    return max(0, HEAP_SIZE - mem_alloc())
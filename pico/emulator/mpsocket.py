@@ -0,0 +1,55 @@
+#mpsocket.py
+'''
+韌體裡的import socket會拿到這個模組
+一般的連線和CPython的socket一樣;送到port 123的SNTP要求不會真的連到網路,
+直接用事件迴圈的時間回應(虛擬時間下對時結果才會一致,很多台也不會打擾NTP server)
+'''
+
+import socket as _socket
+import struct
+from socket import *  # noqa: F401,F403
+
+from .loop import get_loop
+
+NTP_PORT = 123
+NTP_DELTA = 2208988800
+
+
+def _ntp_timestamp(epoch):
+    seconds = int(epoch)
+    return seconds + NTP_DELTA, int((epoch - seconds) * 4294967296)
+
+
+def _ntp_reply(request):
+    reply = bytearray(48)
+    reply[0] = 0x1C  #LI=0, VN=3, mode=4(server)
+    reply[1] = 1     #stratum 1
+    now = _ntp_timestamp(get_loop().epoch())
+    reply[24:32] = bytes(request[40:48])  #originate = client的transmit
+    struct.pack_into('!II', reply, 32, *now)
+    struct.pack_into('!II', reply, 40, *now)
+    return bytes(reply)
+
+
+def getaddrinfo(host, port, *args, **kwargs):
+    if port == NTP_PORT:
+        return [(AF_INET, SOCK_DGRAM, 0, '', ('127.0.0.1', NTP_PORT))]  # noqa: F405
+    return _socket.getaddrinfo(host, port, *args, **kwargs)
+
+
+class socket(_socket.socket):
+    _ntp_reply = None
+
+    def sendto(self, data, *args):
+        addr = args[-1]
+        if self.type == SOCK_DGRAM and addr[1] == NTP_PORT:  # noqa: F405
+            self._ntp_reply = _ntp_reply(data)
+            return len(data)
+        return super().sendto(data, *args)
+
+    def recv(self, bufsize, *args):
+        reply = self._ntp_reply
+        if reply is not None:
+            self._ntp_reply = None
+            return reply[:bufsize]
+        return super().recv(bufsize, *args)
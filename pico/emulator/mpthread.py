@@ -0,0 +1,79 @@
+#mpthread.py
+'''
+韌體裡的import _thread會拿到這個模組(rp2的_thread,第二個執行緒在core 1執行)
+新的執行緒會記住啟動它的板子;虛擬時間下core 1不受事件迴圈控制,建議用--realtime
+'''
+
+import _thread as _real_thread
+import threading
+
+from . import board as _board
+
+_local = threading.local()
+
+
+class LockType:
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def acquire(self, waitflag=1, timeout=-1):
+        return self._lock.acquire(bool(waitflag), timeout)
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self._lock.release()
+
+
+def allocate_lock():
+    return LockType()
+
+
+def get_ident():
+    return _real_thread.get_ident()
+
+
+def stack_size(size=None):
+    return 0
+
+
+def exit():
+    raise SystemExit
+
+
+def check_alive():
+    '''
+    執行緒所屬的板子已經重新開機(machine.reset)就結束這個執行緒
+    '''
+    board = _board.current()
+    if board is not None and getattr(_local, 'generation', board.generation) != board.generation:
+        raise SystemExit
+
+
+def start_new_thread(function, args, kwargs=None):
+    board = _board.get_current()
+    generation = board.generation
+
+    def run():
+        _board.set_current(board)
+        _local.generation = generation
+        try:
+            function(*args, **(kwargs or {}))
+        except SystemExit:
+            pass
+        except Exception as e:
+            board.stats['errors'] += 1
+            board.on_error(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    board.threads.append(thread)
+    thread.start()
+    return thread.ident
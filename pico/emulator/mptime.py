@@ -0,0 +1,100 @@
+#mptime.py
+'''
+韌體裡的import time會拿到這個模組(MicroPython的time)
+sleep會交給事件迴圈,等待期間Timer照常觸發
+'''
+
+import calendar as _calendar
+import threading
+import time as _time
+
+from . import board as _board
+from . import mpthread
+from .loop import get_loop
+
+
+def _epoch():
+    '''
+    time.time()讀的是目前板子的RTC
+    '''
+    board = _board.current()
+    if board is None:
+        return get_loop().epoch()
+    return board.rtc_epoch()
+
+
+def ticks_ms():
+    return get_loop().ticks_ms() & 0x3FFFFFFF
+
+
+def ticks_us():
+    return (get_loop().ticks_ms() * 1000) & 0x3FFFFFFF
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & 0x3FFFFFFF
+
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) & 0x3FFFFFFF
+    if diff >= 0x20000000:
+        diff -= 0x40000000
+    return diff
+
+
+def _core1_sleep(seconds):
+    '''
+    _thread開的執行緒(core 1)不驅動Timer,用真實時間等待
+    板子重新開機後,舊的執行緒在這裡結束
+    '''
+    mpthread.check_alive()
+    _time.sleep(seconds)
+
+
+def _on_core1():
+    return threading.current_thread() is not threading.main_thread()
+
+
+def sleep(seconds):
+    if _on_core1():
+        return _core1_sleep(seconds)
+    get_loop().sleep(seconds)
+
+
+def sleep_ms(ms):
+    if _on_core1():
+        return _core1_sleep(ms / 1000)
+    get_loop().sleep_ms(ms)
+
+
+def sleep_us(us):
+    if _on_core1():
+        return _core1_sleep(us / 1000000)
+    get_loop().sleep_ms(us // 1000)
+
+
+def time():
+    return int(_epoch())
+
+
+def time_ns():
+    return int(_epoch() * 1000000000)
+
+
+def gmtime(secs=None):
+    '''
+    MicroPython格式:(year, month, mday, hour, minute, second, weekday, yearday)
+    '''
+    t = _time.gmtime(time() if secs is None else secs)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+
+localtime = gmtime
+
+
+def mktime(t):
+    return int(_calendar.timegm(tuple(t[:6]) + (0, 0, 0)))
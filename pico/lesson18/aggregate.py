@@ -0,0 +1,104 @@
+#aggregate.py
+'''
+在Pico上做統計,不用每次取樣都publish
+1.WindowStats:每個channel只記min/max/sum/count(固定記憶體),每個時間窗送一次摘要
+2.Threshold:超過門檻(例如光線8500)馬上通知,不用等時間窗結束
+'''
+
+import time
+from array import array
+
+import payload
+
+WINDOW_MS = 60000 #時間窗長度
+
+
+class WindowStats:
+    def __init__(self, channels, scales=None, window_ms=WINDOW_MS):
+        '''
+        :param channels:channel id的list,例如[payload.CH_TEMPERATURE, payload.CH_LIGHT_RAW]
+        :param scales:每個channel的值要除以多少(溫度是*100的整數,所以是100)
+        '''
+        n = len(channels)
+        self.channels = channels
+        self.scales = scales or [1] * n
+        self.window_ms = window_ms
+        self.min = array('i', [0] * n)
+        self.max = array('i', [0] * n)
+        self.sum = [0] * n #取樣很多時會超過32bit,用int
+        self.count = array('i', [0] * n)
+        self.start = time.ticks_ms()
+        self.windows = 0
+        #摘要的channel,每個channel有min/max/mean/count,重複使用只改value
+        self.summary = []
+        for channel in channels:
+            for stat in payload.STATS:
+                self.summary.append([payload.stat_channel(stat, channel), 0])
+        if len(self.summary) > payload.MAX_CHANNELS:
+            raise ValueError('channel太多,摘要放不進一個封包')
+
+    def add(self, index, value):
+        count = self.count[index]
+        if count == 0 or value < self.min[index]:
+            self.min[index] = value
+        if count == 0 or value > self.max[index]:
+            self.max[index] = value
+        self.sum[index] += value
+        self.count[index] = count + 1
+
+    def due(self, ticks):
+        return time.ticks_diff(ticks, self.start) >= self.window_ms
+
+    def mean(self, index):
+        count = self.count[index]
+        return self.sum[index] / count / self.scales[index] if count else 0
+
+    def close(self, ticks):
+        '''
+        結束目前的時間窗,把結果寫進self.summary,傳回時間窗開始的ticks
+        下一個時間窗從上一個的結尾開始,不會因為publish延遲而漂移
+        '''
+        start = self.start
+        summary = self.summary
+        k = 0
+        for i in range(len(self.channels)):
+            scale = self.scales[i]
+            count = self.count[i]
+            summary[k][1] = self.min[i] / scale if count else 0
+            summary[k + 1][1] = self.max[i] / scale if count else 0
+            summary[k + 2][1] = self.mean(i)
+            summary[k + 3][1] = count
+            k += 4
+            self.sum[i] = 0
+            self.count[i] = 0
+        self.start = time.ticks_add(start, self.window_ms)
+        if time.ticks_diff(ticks, self.start) >= self.window_ms: #停了很久(例如斷線)就重新對齊
+            self.start = ticks
+        self.windows += 1
+        return start
+
+
+class Threshold:
+    '''
+    值超過threshold+hysteresis變成1,低於threshold-hysteresis變成0
+    '''
+    def __init__(self, threshold, hysteresis=0):
+        self.high = threshold + hysteresis
+        self.low = threshold - hysteresis
+        self.state = -1
+
+    def update(self, value):
+        '''
+        狀態改變時傳回新的狀態(0或1),沒變傳回-1
+        '''
+        state = self.state
+        if value >= self.high:
+            state = 1
+        elif value < self.low:
+            state = 0
+        elif state < 0:
+            state = 1 if value >= (self.high + self.low) // 2 else 0
+        if state != self.state:
+            self.state = state
+            return state
+        return -1
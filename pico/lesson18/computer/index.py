@@ -1,9 +1,16 @@
 import paho.mqtt.client as mqtt
 from datetime import datetime
-import os,csv
+import os,csv,sys,time,threading
 import sqlite3
 from sqlite3 import Error
 
+#payload.py放在上一層(和pico的程式共用)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import payload
+
+BATCH_SIZE = 200      #累積多少個二進位封包就一次解碼
+BATCH_INTERVAL = 1.0  #最多等幾秒就一次解碼
+
 def insert_to_sqlite(values):
     try:
         conn = sqlite3.connect('./data/pico.db')
@@ -21,22 +28,33 @@ def insert_to_sqlite(values):
     conn.close()
 
 
-def record(topic:str,value:int | float | int):
+def insert_many_to_sqlite(rows):
+    try:
+        conn = sqlite3.connect('./data/pico.db')
+    except Exception as e:
+        print(e)
+        return
+    sql = """
+    INSERT INTO 雞舍(時間,設備,值)
+    VALUES(?,?,?)
+    """
+    cursor = conn.cursor()
+    cursor.executemany(sql,rows)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def get_csv_path(date:str) -> str:
     '''
     #檢查是否有data資料夾,沒有就建立data資料夾
-    #取得今天日期,如果沒有今天日期.csv,就建立一個全新的今天日期.csv
-    #將參數r的資料,儲存進入csv檔案內
-    #parameters topic:str -> 這是訂閱的topic
-    #parameters value:int -> 這是訂閱的value
+    #如果沒有這個日期.csv,就建立一個全新的日期.csv
+    #parameters date:str -> 日期(%Y-%m-%d)
     '''
     root_dir = os.getcwd()
     data_dir = os.path.join(root_dir, 'data')
     if not os.path.isdir(data_dir):    
             os.mkdir('data')
-    
-    today = datetime.today()
-    current_str = today.strftime("%Y-%m-%d %H:%M:%S")
-    date = today.strftime("%Y-%m-%d")
     filename = date + ".csv"
     #get_file_abspath
     full_path = os.path.join(data_dir,filename)
@@ -45,6 +63,20 @@ def record(topic:str,value:int | float | int):
         print('沒有這個檔')
         with open(full_path,mode='w',encoding='utf-8',newline='') as file:
             file.write('時間,設備,值\n')
+    return full_path
+
+
+def record(topic:str,value:int | float | int):
+    '''
+    #取得今天日期,如果沒有今天日期.csv,就建立一個全新的今天日期.csv
+    #將參數r的資料,儲存進入csv檔案內
+    #parameters topic:str -> 這是訂閱的topic
+    #parameters value:int -> 這是訂閱的value
+    '''
+    today = datetime.today()
+    current_str = today.strftime("%Y-%m-%d %H:%M:%S")
+    date = today.strftime("%Y-%m-%d")
+    full_path = get_csv_path(date)
     
     with open(full_path, mode='a', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
@@ -52,6 +84,61 @@ def record(topic:str,value:int | float | int):
         insert_to_sqlite((current_str,topic,float(value)))
 
 
+def record_many(rows:list):
+    '''
+    #一次寫入多筆資料,每個日期的csv只開一次檔
+    #parameters rows:list -> [(時間字串,topic,value),...]
+    '''
+    by_date = {}
+    for row in rows:
+        by_date.setdefault(row[0][:10],[]).append(row)
+    for date, date_rows in by_date.items():
+        with open(get_csv_path(date), mode='a', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerows(date_rows)
+    insert_many_to_sqlite([(t,topic,float(value)) for t,topic,value in rows])
+
+
+def flush_binary():
+    '''
+    #將累積的二進位封包用numpy一次解碼,只記錄有變化的值
+    #只在main()的迴圈呼叫(paho的on_message執行緒只負責放進pending_payloads),
+    #last_values、csv和sqlite都只有主執行緒在用
+    '''
+    global pending_since
+    with pending_lock:
+        if not pending_payloads:
+            return
+        payloads = pending_payloads[:]
+        pending_payloads.clear()
+        pending_since = None
+
+    columns = payload.decode_batch(payloads)
+    received = datetime.today().strftime("%Y-%m-%d %H:%M:%S")
+    rows = []
+    for device_id,timestamp_ms,channel_id,value in zip(columns['device_id'].tolist(),
+                                                       columns['timestamp_ms'].tolist(),
+                                                       columns['channel_id'].tolist(),
+                                                       columns['value'].tolist()):
+        topic = payload.topic_for(channel_id)
+        if channel_id & 0x0F == payload.CH_TEMPERATURE or channel_id & 0xF0 == payload.STAT_MEAN:
+            value = round(value,2)
+        else:
+            value = int(value)
+        if not payload.is_stat(channel_id): #時間窗的摘要每筆都記錄
+            key = (device_id,channel_id)
+            if last_values.get(key) == value:
+                continue
+            last_values[key] = value
+        if timestamp_ms > 0:
+            current_str = datetime.fromtimestamp(timestamp_ms / 1000).strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            current_str = received #設備沒有時間,使用收到的時間
+        rows.append((current_str,topic,value))
+    if rows:
+        record_many(rows)
+
+
 def on_connect(client, userdata, flags, reason_code, properties):
     #連線bloker成功時,只會執行一次
     client.subscribe("SA-20/#")
@@ -61,7 +148,23 @@ def on_message(client, userdata, msg):
     global temperature_origin_value
     global line_origin_status
 
+    global pending_since
+    global binary_seen
     topic = msg.topic
+    if topic == payload.BIN_TOPIC:
+        binary_seen = True
+        with pending_lock:
+            pending_payloads.append(msg.payload)
+            if pending_since is None:
+                pending_since = time.monotonic()
+            full = len(pending_payloads) >= BATCH_SIZE
+        if full:
+            batch_ready.set() #叫醒main()的迴圈去解碼,這裡不寫檔
+        return
+    if binary_seen:
+        #設備是MODE_BOTH時同一筆資料也會從二進位封包記錄,文字topic不再重複記錄
+        return
+
     value = msg.payload.decode()
     if topic == 'SA-20/LED_LEVEL':
         led_value = int(value)
@@ -90,11 +193,26 @@ def main():
     client.on_connect = on_connect
     client.on_message = on_message 
     client.connect("192.168.0.252", 1883, 60)
-    client.loop_forever()
+    client.loop_start()
+    try:
+        while True:
+            full = batch_ready.wait(0.2)
+            batch_ready.clear()
+            if full or (pending_since is not None and time.monotonic() - pending_since >= BATCH_INTERVAL):
+                flush_binary()
+    except KeyboardInterrupt:
+        client.loop_stop()
+        flush_binary()
 
 
 if __name__ == "__main__":
     led_origin_value = 0
     temperature_origin_value = 0.0
     line_origin_status = None 
+    pending_payloads = [] #等待解碼的二進位封包
+    pending_lock = threading.Lock()
+    batch_ready = threading.Event() #累積到BATCH_SIZE時由on_message設定
+    pending_since = None
+    last_values = {} #(device_id,channel_id) -> 上一次記錄的值
+    binary_seen = False #收過二進位封包之後只記錄二進位封包
     main()
\ No newline at end of file
@@ -0,0 +1,101 @@
+#dimmer.py
+'''
+可變電阻控制LED亮度
+1.每秒取樣幾百次,EMA濾掉ADC雜訊
+2.限制每次改變的量(slew rate),轉很快時亮度也是平順的變化
+3.gamma曲線先算成查表(LUT),執行時只做整數內插,不用float
+4.PWM用1kHz,人眼和手機相機都看不到閃爍(原本50Hz會閃)
+5.亮度分成0~10級,級數改變才需要publish,加上遲滯避免在邊界來回跳
+'''
+
+from array import array
+
+PWM_FREQ = 1000     #Hz,不會閃爍
+SAMPLE_HZ = 200     #每秒取樣次數
+FILTER_SHIFT = 3    #EMA濾波,新值的權重是1/2**FILTER_SHIFT
+SLEW_MS = 300       #亮度從0到最亮最快要300ms
+GAMMA = 2.2
+LEVELS = 10         #publish的亮度級數0~10
+HYSTERESIS = 512    #級數邊界的遲滯(0~65535的刻度)
+
+
+def build_lut(gamma=GAMMA, size=256):
+    '''
+    亮度(0~size)對應的duty_u16,長度size+1,最後一格是65535
+    只在開機時用float計算一次
+    '''
+    return array('H', [int((i / size) ** gamma * 65535 + 0.5) for i in range(size + 1)])
+
+
+LUT = build_lut()
+
+
+class Dimmer:
+    def __init__(self, knob, pwm, hz=SAMPLE_HZ, slew_ms=SLEW_MS, lut=LUT):
+        '''
+        :param knob:可變電阻的ADC
+        :param pwm:LED的PWM,會設定成PWM_FREQ
+        :param hz:step()每秒會被呼叫幾次,用來換算slew rate
+        '''
+        self.knob = knob
+        self.pwm = pwm
+        self.lut = lut
+        #65536 >> shift = LUT的最後一格;MicroPython的int沒有bit_length(),自己算位數
+        bits = 0
+        n = len(lut) - 1
+        while n:
+            n >>= 1
+            bits += 1
+        self.shift = 17 - bits
+        pwm.freq(PWM_FREQ)
+        raw = knob.read_u16()
+        self.acc = raw << FILTER_SHIFT #濾波器的累加值
+        self.brightness = raw          #經過slew limiter的亮度0~65535(線性)
+        self.max_step = max(1, 65535 * 1000 // (slew_ms * hz))
+        self.level = self.quantize(raw)
+        self.duty = -1
+        self.apply()
+
+    def quantize(self, brightness):
+        return (brightness * LEVELS + 32767) // 65535 #round(brightness/65535*10)
+
+    def apply(self):
+        '''
+        亮度經過gamma LUT(線性內插)寫進PWM,duty沒變就不寫
+        '''
+        b = self.brightness
+        b += b >> 15 #0~65535 -> 0~65536,最亮時剛好是LUT的最後一格
+        i = b >> self.shift
+        frac = b - (i << self.shift)
+        lut = self.lut
+        low = lut[i]
+        duty = low if frac == 0 else low + ((lut[i + 1] - low) * frac >> self.shift)
+        if duty != self.duty:
+            self.duty = duty
+            self.pwm.duty_u16(duty)
+
+    def step(self):
+        '''
+        取樣一次並更新PWM
+        亮度級數改變時傳回新的級數,沒變傳回-1
+        '''
+        self.acc += self.knob.read_u16() - (self.acc >> FILTER_SHIFT)
+        target = self.acc >> FILTER_SHIFT
+        b = self.brightness
+        if target > b:
+            b = target if target - b <= self.max_step else b + self.max_step
+        elif target < b:
+            b = target if b - target <= self.max_step else b - self.max_step
+        else:
+            return -1
+        self.brightness = b
+        self.apply()
+        #離開目前級數的範圍超過HYSTERESIS才換級
+        center = (self.level * 65535 + LEVELS // 2) // LEVELS
+        half = 65535 // (LEVELS * 2) + HYSTERESIS
+        if b > center + half or b < center - half:
+            level = self.quantize(b)
+            if level != self.level:
+                self.level = level
+                return level
+        return -1
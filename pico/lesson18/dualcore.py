@@ -0,0 +1,149 @@
+#dualcore.py
+'''
+RP2040有2個核心,用_thread把取樣和控制放到core 1
+core 1:ADC -> 濾波 -> PWM duty_u16(dimmer.Dimmer),固定頻率的迴圈,結果寫進RingBuffer
+core 0:Timer從RingBuffer取出資料做MQTT publish和WiFi監控
+網路卡住時只影響core 0,core 1的取樣和LED調光照常進行
+'''
+
+import _thread
+import time
+from array import array
+
+import payload
+from dimmer import SAMPLE_HZ
+
+ENV_PERIOD_MS = 2000  #溫度和光線多久放進buffer一次
+LINE_EVERY = 10       #每幾圈檢查一次光線門檻(200Hz/10 = 20Hz)
+
+
+class RingBuffer:
+    '''
+    預先配置的環狀buffer,每筆是(ticks_ms, channel_id, value整數)
+    滿了會覆蓋最舊的資料並累計dropped
+    put和drain_into都在lock裡只做複製,持有lock的時間很短
+    '''
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.ticks = array('i', [0] * capacity)
+        self.channel = bytearray(capacity)
+        self.value = array('i', [0] * capacity)
+        self.head = 0   #下一筆寫入的位置
+        self.count = 0
+        self.dropped = 0
+        self.lock = _thread.allocate_lock()
+
+    def put(self, ticks, channel, value):
+        self.lock.acquire()
+        i = self.head
+        self.ticks[i] = ticks
+        self.channel[i] = channel
+        self.value[i] = value
+        i += 1
+        self.head = 0 if i == self.capacity else i
+        if self.count == self.capacity:
+            self.dropped += 1
+        else:
+            self.count += 1
+        self.lock.release()
+
+    def drain_into(self, ticks, channel, value):
+        '''
+        把資料依時間順序複製到呼叫者的陣列(長度要和capacity一樣),傳回筆數
+        複製完就放開lock,publish在lock外面做
+        '''
+        self.lock.acquire()
+        n = self.count
+        i = self.head - n
+        if i < 0:
+            i += self.capacity
+        for k in range(n):
+            ticks[k] = self.ticks[i]
+            channel[k] = self.channel[i]
+            value[k] = self.value[i]
+            i += 1
+            if i == self.capacity:
+                i = 0
+        self.count = 0
+        self.lock.release()
+        return n
+
+
+class Sampler:
+    '''
+    core 1執行的取樣和控制迴圈
+    LED亮度(0~10)和光線狀態(line_state)改變時馬上放進buffer,溫度和光線每ENV_PERIOD_MS放一次
+    '''
+    def __init__(self, ring, dimmer, light, read_temperature, line, hz=SAMPLE_HZ):
+        '''
+        :param dimmer:dimmer.Dimmer,hz要和這裡一樣
+        :param light:光敏電阻的ADC
+        :param read_temperature:傳回溫度*100的函式
+        :param line:aggregate.Threshold,光線的門檻
+        '''
+        self.ring = ring
+        self.dimmer = dimmer
+        self.light = light
+        self.read_temperature = read_temperature
+        self.line = line
+        self.period_us = 1000000 // hz
+        self.running = False
+        self.loops = 0
+        self.overruns = 0   #一圈超過period_us的次數
+        self.busy_max_us = 0
+
+    def step(self, now_ms):
+        level = self.dimmer.step()
+        if level >= 0:
+            self.ring.put(now_ms, payload.CH_LED_LEVEL, level)
+
+    def check_line(self, now_ms):
+        state = self.line.update(self.light.read_u16())
+        if state >= 0:
+            self.ring.put(now_ms, payload.CH_LINE_LEVEL, state)
+
+    def sample_env(self, now_ms):
+        ring = self.ring
+        ring.put(now_ms, payload.CH_TEMPERATURE, self.read_temperature())
+        ring.put(now_ms, payload.CH_LIGHT_RAW, self.light.read_u16())
+
+    def run(self):
+        self.running = True
+        next_env = time.ticks_ms()
+        self.ring.put(next_env, payload.CH_LED_LEVEL, self.dimmer.level) #開機時的亮度
+        deadline = time.ticks_us()
+        while self.running:
+            start = time.ticks_us()
+            now_ms = time.ticks_ms()
+            self.step(now_ms)
+            if self.loops % LINE_EVERY == 0:
+                self.check_line(now_ms)
+            if time.ticks_diff(now_ms, next_env) >= 0:
+                next_env = time.ticks_add(next_env, ENV_PERIOD_MS)
+                self.sample_env(now_ms)
+            self.loops += 1
+            end = time.ticks_us()
+            busy = time.ticks_diff(end, start)
+            if busy > self.busy_max_us:
+                self.busy_max_us = busy
+            deadline = time.ticks_add(deadline, self.period_us)
+            wait = time.ticks_diff(deadline, end)
+            if wait > 0:
+                time.sleep_us(wait)
+            else:
+                self.overruns += 1
+                deadline = end #落後就重新對齊,不要連續追趕
+
+    def start(self):
+        _thread.start_new_thread(self.run, ())
+
+    def stop(self):
+        self.running = False
+
+    def report(self):
+        return {
+            'loops': self.loops,
+            'overruns': self.overruns,
+            'busy_max_us': self.busy_max_us,
+            'dropped': self.ring.dropped,
+        }
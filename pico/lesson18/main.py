@@ -7,10 +7,129 @@ led->gpio15
 內建溫度sensor -> adc最後1pin,共5pin
 '''
 
-from machine import Timer,ADC,Pin,PWM,RTC
+import machine
+from machine import Timer,ADC,Pin,PWM
 import binascii
 from umqtt.simple import MQTTClient
 import tools,config
+import payload
+import txbuf
+import json
+import dualcore
+import dimmer
+import timesync
+import aggregate
+import publisher
+import time
+from array import array
+
+#payload.MODE_TEXT:舊版文字topic, payload.MODE_BINARY:二進位封包, payload.MODE_BOTH:兩種都送
+#MODE_BINARY時本地broker只收二進位封包(Blynk還是收文字topic),電腦端每筆只記錄一次
+PAYLOAD_MODE = payload.MODE_BINARY
+
+#RUNTIME_DUALCORE:取樣和LED控制在core 1,MQTT和WiFi在core 0
+#RUNTIME_TIMER:舊版,全部用Timer在同一個核心執行
+RUNTIME_TIMER = 'timer'
+RUNTIME_DUALCORE = 'dualcore'
+RUNTIME = RUNTIME_DUALCORE
+WINDOW_MS = aggregate.WINDOW_MS #溫度和光線每個時間窗送一次統計,0代表每次取樣都送(舊版)
+LINE_THRESHOLD = 8500 #光敏電阻低於這個值line_state=0
+LINE_HYSTERESIS = 200 #門檻附近的雜訊不會一直切換
+DRAIN_MS = 100        #core 0多久從RingBuffer取一次資料
+SUPERVISE_MS = 250    #core 0多久檢查一次WiFi連線(重新連線每次只做一步,所以要常檢查)
+PUMP_MS = 200         #多久送一次留著的資料(Blynk)和檢查MQTT重新連線
+BLYNK_VIA_BRIDGE = False #True:由電腦的BlynkMQTTSamples/bridge.py轉送到Blynk,Pico不用維持TLS連線
+BLYNK_RATE = 2        #Blynk每秒最多publish幾次
+BLYNK_BURST = 3
+
+#txbuf.DEBUG會print每次讀到的值(會配置記憶體),正式執行用txbuf.WARNING
+txbuf.set_level(txbuf.WARNING)
+
+#topic只建立一次
+TOPIC_TEMPERATURE = b'SA-20/TEMPERATURE'
+TOPIC_LINE_LEVEL = b'SA-20/LINE_LEVEL'
+TOPIC_LED_LEVEL = b'SA-20/LED_LEVEL'
+TOPIC_HEAP = b'SA-20/HEAP'
+BLYNK_TEMPERATURE = b'ds/terperature'
+BLYNK_LINE_STATUS = b'ds/line_status'
+BLYNK_LED_LEVEL = b'ds/led_level'
+BLYNK_TOPICS = {TOPIC_TEMPERATURE: BLYNK_TEMPERATURE,
+                TOPIC_LINE_LEVEL: BLYNK_LINE_STATUS,
+                TOPIC_LED_LEVEL: BLYNK_LED_LEVEL}
+
+#每筆資料只publish一次,由fanout送到本地broker和Blynk
+fanout = publisher.Fanout()
+
+numbuf = txbuf.NumberBuffer()
+#二進位封包的channel,重複使用只改value
+env_channels = [[payload.CH_TEMPERATURE, 0], [payload.CH_LINE_LEVEL, 0], [payload.CH_LIGHT_RAW, 0]]
+led_channels = [[payload.CH_LED_LEVEL, 0]]
+line_channels = [[payload.CH_LINE_LEVEL, 0]]
+
+
+def read_temperature():
+    '''
+    傳回溫度*100(整數)
+    27 - (V - 0.706)/0.001721 改用整數計算,避免產生float
+    '''
+    raw = adc.read_u16()
+    uv = raw * 50 + raw * 3548 // 10000 #微伏特(3.3V/65535 = 50.3548uV),分開乘才不會超過small int
+    return 2700 - (uv - 706000) * 100 // 1721
+
+
+def publish_env(ticks, temperature, adc_value):
+    '''
+    溫度(*100的整數)和光線的一次取樣
+    WINDOW_MS>0時只加進時間窗統計,時間到才送摘要;否則每次都送(舊版)
+    '''
+    if stats is not None:
+        stats.add(0, temperature)
+        stats.add(1, adc_value)
+        if stats.due(ticks):
+            publish_window(ticks)
+        return
+    line_state = line.state
+    fanout.publish(TOPIC_TEMPERATURE, numbuf.write_fixed(temperature, 2))
+    #fanout.publish(TOPIC_LINE_LEVEL, numbuf.write_int(adc_value))
+    fanout.publish(TOPIC_LINE_LEVEL, numbuf.write_int(line_state))
+    if PAYLOAD_MODE != payload.MODE_TEXT:
+        env_channels[0][1] = temperature / 100
+        env_channels[1][1] = line_state
+        env_channels[2][1] = adc_value
+        fanout.publish(BIN_TOPIC, encoder.encode_at(env_channels, clock, ticks))
+
+
+def publish_window(ticks):
+    '''
+    時間窗結束,送出每個channel的min/max/mean/count(時間是時間窗的開始)
+    文字topic和Blynk只送平均溫度,舊的訂閱者還是看得到趨勢
+    '''
+    start = stats.close(ticks)
+    if PAYLOAD_MODE != payload.MODE_TEXT:
+        fanout.publish(BIN_TOPIC, encoder.encode_at(stats.summary, clock, start))
+    if stats.summary[3][1] == 0: #這個時間窗沒有溫度
+        return
+    mean = int(stats.summary[2][1] * 100 + 0.5)
+    fanout.publish(TOPIC_TEMPERATURE, numbuf.write_fixed(mean, 2))
+
+
+def publish_line(ticks, line_state):
+    '''
+    光線超過或低於門檻時馬上送出,不等時間窗
+    '''
+    if stats is None: #舊版每次取樣都會送line_state
+        return
+    fanout.publish(TOPIC_LINE_LEVEL, numbuf.write_int(line_state))
+    if PAYLOAD_MODE != payload.MODE_TEXT:
+        line_channels[0][1] = line_state
+        fanout.publish(BIN_TOPIC, encoder.encode_at(line_channels, clock, ticks))
+
+
+def publish_led(ticks, light_level):
+    fanout.publish(TOPIC_LED_LEVEL, numbuf.write_int(light_level))
+    if PAYLOAD_MODE != payload.MODE_TEXT:
+        led_channels[0][1] = light_level
+        fanout.publish(BIN_TOPIC, encoder.encode_at(led_channels, clock, ticks))
 
 
 def do_thing(t):
@@ -19,50 +138,119 @@ def do_thing(t):
     負責偵測溫度和光線
     每2秒執行1次
     '''
-    conversion_factor = 3.3 / (65535)
-    reading = adc.read_u16() * conversion_factor
-    temperature = round(27 - (reading - 0.706)/0.001721,2)  
-    print(f'溫度:{temperature}')
-    mqtt.publish('SA-20/TEMPERATURE', f'{temperature}')
-    blynk_mqtt.publish('ds/terperature',f'{temperature}')
+    clock.maybe_sync()
+    now = time.ticks_ms()
+    temperature = read_temperature() #溫度*100
     adc_value = adc_light.read_u16()
-    print(f'光線:{adc_value}')
-    line_state = 0 if adc_value < 8500 else 1
-    print(f'光線:{line_state}')
-    #mqtt.publish('SA-20/LINE_LEVEL', f'{adc_value}')
-    mqtt.publish('SA-20/LINE_LEVEL', f'{line_state}')
-    blynk_mqtt.publish('ds/line_status',f'{line_state}')
+    line_state = line.update(adc_value)
+    if txbuf.LOG_LEVEL <= txbuf.DEBUG:
+        print('溫度:', temperature / 100)
+        print('光線:', adc_value)
+        print('光線:', line.state)
+    if line_state >= 0:
+        publish_line(now, line_state)
+    publish_env(now, temperature, adc_value)
+    heap.idle()
     
 def do_thing1(t):
     '''
     :param t:Timer的實體
     負責可變電阻和改變led的亮度
+    每秒執行dimmer.SAMPLE_HZ次,亮度級數改變才publish
     '''    
     
-    duty = adc1.read_u16()
-    pwm.duty_u16(duty)
-    light_level = round(duty/65535*10)
-    print(f'可變電阻:{light_level}')
-    mqtt.publish('SA-20/LED_LEVEL', f'{light_level}')
-    blynk_mqtt.publish('ds/led_level',f'{light_level}')
-    
+    light_level = led.step()
+    if light_level < 0:
+        return
+    if txbuf.LOG_LEVEL <= txbuf.DEBUG:
+        print('可變電阻:', light_level)
+    publish_led(time.ticks_ms(), light_level)
+    heap.idle()
+
+
+def publish_sample(ticks, channel, value):
+    '''
+    core 0發送core 1放進RingBuffer的一筆資料
+    溫度(*100的整數)和光線一組,收到光線時一起處理
+    時間用取樣時的ticks換算,不受publish延遲影響
+    '''
+    global pending_temperature
+    if channel == payload.CH_TEMPERATURE:
+        pending_temperature = value
+    elif channel == payload.CH_LIGHT_RAW:
+        publish_env(ticks, pending_temperature, value)
+    elif channel == payload.CH_LINE_LEVEL:
+        publish_line(ticks, value)
+    elif channel == payload.CH_LED_LEVEL:
+        publish_led(ticks, value)
+
+
+def drain(t):
+    '''
+    :param t:Timer的實體
+    core 0每DRAIN_MS執行1次,把RingBuffer的資料publish出去
+    '''
+    n = ring.drain_into(drained_ticks, drained_channel, drained_value)
+    for i in range(n):
+        publish_sample(drained_ticks[i], drained_channel[i], drained_value[i])
+    heap.idle()
+
+
+def supervise(t):
+    '''
+    :param t:Timer的實體
+    core 0每SUPERVISE_MS檢查WiFi,斷線時重新連線,時間到就NTP對時
+    重新連線用manager.step(),每次只做一步不會sleep,drain和pump_fanout照常執行
+    MQTT的重新連線由fanout的每個目的地自己處理
+    '''
+    try:
+        if tools.manager.step():
+            clock.maybe_sync()
+    except Exception as e:
+        txbuf.log(txbuf.WARNING, '重新連線失敗', e)
+
+
+def pump_fanout(t):
+    '''
+    :param t:Timer的實體
+    每PUMP_MS送出被限速留著的資料,斷線的目的地到時間就重新連線
+    '''
+    fanout.pump()
+
+
+def heap_report(t):
+    '''
+    每60秒回報heap和GC暫停時間,長時間執行時確認記憶體穩定
+    '''
+    report = heap.report()
+    if sampler is not None:
+        report['core1'] = sampler.report()
+    report['time'] = clock.report()
+    report['mqtt'] = fanout.report()
+    txbuf.log(txbuf.INFO, 'heap:', report)
+    fanout.publish(TOPIC_HEAP, json.dumps(report))
     
     
 
 def main():
     global blynk_mqtt
+    if BLYNK_VIA_BRIDGE:
+        return
     print(config.BLYNK_MQTT_BROKER)
     print(config.BLYNK_TEMPLATE_ID)
     print(config.BLYNK_AUTH_TOKEN)
     blynk_mqtt = MQTTClient(config.BLYNK_TEMPLATE_ID, config.BLYNK_MQTT_BROKER,user='device',password=config.BLYNK_AUTH_TOKEN)
-    blynk_mqtt.connect() 
+    #不在這裡connect,由pump_fanout連線,連不上也不會卡住本地的publish
+    fanout.add(publisher.Destination('blynk', blynk_mqtt, BLYNK_TOPICS,
+                                     rate=BLYNK_RATE, burst=BLYNK_BURST))
 
 
 if __name__ == '__main__':
     adc = ADC(4) #內建溫度
     adc1 = ADC(Pin(26)) #可變電阻
     adc_light = ADC(Pin(28)) #光敏電阻
-    pwm = PWM(Pin(15),freq=50) #pwm led
+    pwm = PWM(Pin(15),freq=dimmer.PWM_FREQ) #pwm led
+    led = dimmer.Dimmer(adc1, pwm)
     
     #connect internet
     try:
@@ -76,9 +264,37 @@ if __name__ == '__main__':
         SERVER = "192.168.0.252"
         CLIENT_ID = binascii.hexlify(machine.unique_id())
         mqtt = MQTTClient(CLIENT_ID, SERVER,user='pi',password='raspberry')
-        mqtt.connect()       
-        t1 = Timer(period=2000, mode=Timer.PERIODIC, callback=do_thing)
-        t2 = Timer(period=500, mode=Timer.PERIODIC, callback=do_thing1)
+        BIN_TOPIC = payload.BIN_TOPIC.encode()
+        #只送二進位封包時,本地broker不收文字topic(Blynk還是需要)
+        local_topics = None
+        if PAYLOAD_MODE == payload.MODE_BINARY:
+            local_topics = {BIN_TOPIC: BIN_TOPIC, TOPIC_HEAP: TOPIC_HEAP}
+        fanout.add(publisher.Destination('local', mqtt, local_topics)).pump()
+        encoder = payload.Encoder(payload.device_id_from_uid(machine.unique_id()))
+        clock = timesync.TimeService()
+        clock.sync() #開機時對時,失敗的話timestamp是0,之後會重試
+        heap = txbuf.HeapMonitor()
+        line = aggregate.Threshold(LINE_THRESHOLD, LINE_HYSTERESIS)
+        stats = None
+        if WINDOW_MS:
+            stats = aggregate.WindowStats([payload.CH_TEMPERATURE, payload.CH_LIGHT_RAW],
+                                          [100, 1], WINDOW_MS)
+        sampler = None
+        if RUNTIME == RUNTIME_DUALCORE:
+            ring = dualcore.RingBuffer()
+            drained_ticks = array('i', [0] * ring.capacity)
+            drained_channel = bytearray(ring.capacity)
+            drained_value = array('i', [0] * ring.capacity)
+            pending_temperature = 0
+            sampler = dualcore.Sampler(ring, led, adc_light, read_temperature, line)
+            sampler.start()
+            t1 = Timer(period=DRAIN_MS, mode=Timer.PERIODIC, callback=drain)
+            t2 = Timer(period=SUPERVISE_MS, mode=Timer.PERIODIC, callback=supervise)
+        else:
+            t1 = Timer(period=2000, mode=Timer.PERIODIC, callback=do_thing)
+            t2 = Timer(freq=dimmer.SAMPLE_HZ, mode=Timer.PERIODIC, callback=do_thing1)
+        t3 = Timer(period=60000, mode=Timer.PERIODIC, callback=heap_report)
+        t4 = Timer(period=PUMP_MS, mode=Timer.PERIODIC, callback=pump_fanout)
     
     blynk_mqtt = None
     main()
\ No newline at end of file
@@ -0,0 +1,227 @@
+#payload.py
+'''
+Pico 與電腦端共用的二進位封包格式(MicroPython 與 CPython 都可以執行)
+
+封包格式(little endian,固定長度):
+    header : magic(B) version(B) device_id(I) seq(I) timestamp_ms(q) count(B)  共19 bytes
+    channel: channel_id(B) value(f)                                            每個5 bytes
+
+timestamp_ms = 0 代表設備沒有正確的時間,由電腦端使用收到的時間
+seq 由 Encoder 從1開始遞增,到 SEQ_MAX(0x3FFFFFFF)之後回到0
+    (MicroPython的small int範圍內,遞增時不會配置記憶體;欄位還是4 bytes)
+'''
+
+import struct
+
+MAGIC = 0xA5
+VERSION = 1
+
+HEADER_FMT = '<BBIIqB'
+CHANNEL_FMT = '<Bf'
+HEADER_SIZE = struct.calcsize(HEADER_FMT)   #19
+TIMESTAMP_OFFSET = struct.calcsize('<BBII') #header裡timestamp_ms的位置
+CHANNEL_SIZE = struct.calcsize(CHANNEL_FMT) #5
+MAX_CHANNELS = 16
+SEQ_MAX = 0x3FFFFFFF  #seq的上限,超過就回到0
+
+#二進位封包使用的topic
+BIN_TOPIC = 'SA-20/BIN'
+
+#channel id
+CH_TEMPERATURE = 1
+CH_LINE_LEVEL = 2
+CH_LED_LEVEL = 3
+CH_LIGHT_RAW = 4
+
+#channel id對應原本的文字topic(相容模式使用)
+TOPICS = {
+    CH_TEMPERATURE: 'SA-20/TEMPERATURE',
+    CH_LINE_LEVEL: 'SA-20/LINE_LEVEL',
+    CH_LED_LEVEL: 'SA-20/LED_LEVEL',
+    CH_LIGHT_RAW: 'SA-20/LIGHT_RAW',
+}
+
+#時間窗統計的channel id = 統計種類 | channel id,例如0x31是溫度的平均
+STAT_MIN = 0x10
+STAT_MAX = 0x20
+STAT_MEAN = 0x30
+STAT_COUNT = 0x40
+STATS = (STAT_MIN, STAT_MAX, STAT_MEAN, STAT_COUNT)
+STAT_NAMES = {STAT_MIN: 'MIN', STAT_MAX: 'MAX', STAT_MEAN: 'MEAN', STAT_COUNT: 'COUNT'}
+
+#封包模式
+MODE_TEXT = 'text'      #只送文字topic(舊版)
+MODE_BINARY = 'binary'  #只送二進位封包
+MODE_BOTH = 'both'      #兩種都送
+
+
+def stat_channel(stat, channel_id):
+    return stat | channel_id
+
+
+def is_stat(channel_id):
+    return channel_id & 0xF0 in STAT_NAMES
+
+
+def topic_for(channel_id):
+    '''
+    channel id對應的文字topic,統計值是原本的topic加上/MIN、/MAX、/MEAN、/COUNT
+    '''
+    if is_stat(channel_id):
+        return topic_for(channel_id & 0x0F) + '/' + STAT_NAMES[channel_id & 0xF0]
+    return TOPICS.get(channel_id, 'SA-20/CH{}'.format(channel_id))
+
+
+def packet_size(count):
+    return HEADER_SIZE + CHANNEL_SIZE * count
+
+
+def device_id_from_uid(uid):
+    '''
+    :param uid:machine.unique_id()的bytes
+    取最後4個bytes當作device id
+    '''
+    return int.from_bytes(uid[-4:], 'big')
+
+
+class Encoder:
+    '''
+    使用預先配置的bytearray編碼,不會在每次publish時產生新的bytes
+    '''
+    def __init__(self, device_id, max_channels=MAX_CHANNELS):
+        if max_channels > 255:
+            raise ValueError('channel數量不可超過255')
+        self.device_id = device_id
+        self.seq = 0
+        self.buf = bytearray(packet_size(max_channels))
+        mv = memoryview(self.buf)
+        self.views = [mv[:packet_size(n)] for n in range(max_channels + 1)] #先切好,encode時不用再配置
+        self.max_channels = max_channels
+
+    def encode(self, channels, timestamp_ms=0):
+        '''
+        :param channels:[(channel_id,value),...],可以重複使用同一個list只改value
+        :param timestamp_ms:epoch毫秒,0代表沒有時間
+        傳出memoryview(指向內部的buffer,下次encode前要用完)
+        '''
+        count = len(channels)
+        if count > self.max_channels:
+            raise ValueError('channel數量超過上限')
+        if self.seq == SEQ_MAX:
+            self.seq = 0
+        else:
+            self.seq += 1
+        struct.pack_into(HEADER_FMT, self.buf, 0, MAGIC, VERSION,
+                         self.device_id, self.seq, timestamp_ms, count)
+        offset = HEADER_SIZE
+        for channel_id, value in channels:
+            struct.pack_into(CHANNEL_FMT, self.buf, offset, channel_id, value)
+            offset += CHANNEL_SIZE
+        return self.views[count]
+
+    def encode_at(self, channels, clock, ticks):
+        '''
+        和encode()一樣,timestamp_ms由clock.stamp_into()直接寫進header,不產生epoch毫秒的大整數
+        :param clock:timesync.TimeService
+        :param ticks:取樣時的time.ticks_ms()
+        '''
+        view = self.encode(channels)
+        clock.stamp_into(self.buf, TIMESTAMP_OFFSET, ticks)
+        return view
+
+
+def encode(device_id, seq, channels, timestamp_ms=0):
+    '''
+    一次性的編碼,傳出bytes
+    '''
+    buf = bytearray(packet_size(len(channels)))
+    struct.pack_into(HEADER_FMT, buf, 0, MAGIC, VERSION,
+                     device_id, seq, timestamp_ms, len(channels))
+    offset = HEADER_SIZE
+    for channel_id, value in channels:
+        struct.pack_into(CHANNEL_FMT, buf, offset, channel_id, value)
+        offset += CHANNEL_SIZE
+    return bytes(buf)
+
+
+def decode(data):
+    '''
+    :param data:收到的payload
+    傳出(device_id,seq,timestamp_ms,[(channel_id,value),...])
+    格式錯誤時raise ValueError
+    '''
+    if len(data) < HEADER_SIZE:
+        raise ValueError('封包長度不足')
+    magic, version, device_id, seq, timestamp_ms, count = struct.unpack_from(HEADER_FMT, data, 0)
+    if magic != MAGIC:
+        raise ValueError('不是二進位封包')
+    if version != VERSION:
+        raise ValueError('不支援的封包版本:{}'.format(version))
+    if len(data) != packet_size(count):
+        raise ValueError('封包長度錯誤')
+    channels = []
+    offset = HEADER_SIZE
+    for _ in range(count):
+        channels.append(struct.unpack_from(CHANNEL_FMT, data, offset))
+        offset += CHANNEL_SIZE
+    return device_id, seq, timestamp_ms, channels
+
+
+def batch_dtype(count):
+    '''
+    numpy的structured dtype,對應有count個channel的封包
+    '''
+    import numpy as np
+    return np.dtype([
+        ('magic', 'u1'),
+        ('version', 'u1'),
+        ('device_id', '<u4'),
+        ('seq', '<u4'),
+        ('timestamp_ms', '<i8'),
+        ('count', 'u1'),
+        ('channels', [('id', 'u1'), ('value', '<f4')], (count,)),
+    ])
+
+
+def decode_batch(payloads):
+    '''
+    :param payloads:多個二進位封包(bytes)
+    相同channel數量的封包串在一起,用numpy.frombuffer一次解碼,最後排回收到的順序
+    傳出numpy陣列的dict,每筆channel一列:
+        device_id, seq, timestamp_ms, channel_id, value
+    格式錯誤的封包會被略過
+    '''
+    import numpy as np
+
+    groups = {} #channel數量 -> ([封包], [第幾個封包])
+    for index, data in enumerate(payloads):
+        size = len(data)
+        if size < HEADER_SIZE or data[0] != MAGIC or data[1] != VERSION:
+            continue
+        count = (size - HEADER_SIZE) // CHANNEL_SIZE
+        if packet_size(count) != size or data[HEADER_SIZE - 1] != count:
+            continue
+        group, indexes = groups.setdefault(count, ([], []))
+        group.append(bytes(data))
+        indexes.append(index)
+
+    columns = {'device_id': [], 'seq': [], 'timestamp_ms': [], 'channel_id': [], 'value': []}
+    order = []
+    for count, (group, indexes) in groups.items():
+        if count == 0:
+            continue
+        order.append(np.repeat(indexes, count))
+        records = np.frombuffer(b''.join(group), dtype=batch_dtype(count))
+        columns['device_id'].append(np.repeat(records['device_id'], count))
+        columns['seq'].append(np.repeat(records['seq'], count))
+        columns['timestamp_ms'].append(np.repeat(records['timestamp_ms'], count))
+        columns['channel_id'].append(records['channels']['id'].ravel())
+        columns['value'].append(records['channels']['value'].ravel())
+
+    dtypes = {'device_id': np.uint32, 'seq': np.uint32, 'timestamp_ms': np.int64,
+              'channel_id': np.uint8, 'value': np.float32}
+    if not order:
+        return {name: np.empty(0, dtype=dtypes[name]) for name in columns}
+    #stable排序:封包之間照收到的順序,同一個封包內的channel順序不變
+    rows = np.argsort(np.concatenate(order), kind='stable')
+    return {name: np.concatenate(parts)[rows] for name, parts in columns.items()}
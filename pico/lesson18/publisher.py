@@ -0,0 +1,170 @@
+#publisher.py
+'''
+一個publish送到多個MQTT目的地(本地的broker、Blynk...)
+1.每個目的地可以設定topic對應,例如SA-20/TEMPERATURE -> ds/terperature
+2.每個目的地有自己的token bucket,超過速率的資料先留著
+3.coalesce=True時同一個topic只保留最新的值(Blynk只需要最新的狀態)
+4.每個目的地自己重新連線(指數退避),Blynk斷線或被限速不會影響本地的publish
+
+Fanout.publish()在取樣的時候呼叫;Fanout.pump()由Timer定時呼叫,負責送出留著的資料和重新連線
+'''
+
+import time
+import random
+
+BACKOFF_BASE = 1000  #重新連線的退避起始時間(ms)
+BACKOFF_MAX = 60000
+CONNECT_TIMEOUT = 5  #秒
+VALUE_SIZE = 32      #coalesce時每個topic預先配置的buffer大小
+
+
+class Destination:
+    def __init__(self, name, client, topics=None, rate=0, burst=1, coalesce=False):
+        '''
+        :param client:umqtt.simple.MQTTClient(還沒connect也可以,pump時會連線)
+        :param topics:{本地topic:目的地topic},None代表全部照原topic送
+        :param rate:每秒最多publish幾次,0代表不限制
+        :param burst:token bucket的容量
+        :param coalesce:True時資料先留著,pump時每個topic只送最新的值
+        '''
+        self.name = name
+        self.client = client
+        self.topics = topics
+        self.rate = rate
+        self.capacity = burst * 1000
+        self.tokens = self.capacity #單位是1/1000個token
+        self.last_refill = time.ticks_ms()
+        self.coalesce = coalesce or rate > 0
+        #coalesce用的buffer:目的地topic -> [bytearray, 長度, 是否有新值]
+        self.pending = {}
+        self.order = [] #送出的順序(和topics的順序一樣)
+        self.cursor = 0
+        if self.coalesce and topics:
+            for topic in topics.values():
+                self._slot(topic)
+        self.connected = False
+        self.failures = 0
+        self.next_connect = time.ticks_ms()
+        self.stats = {'sent': 0, 'coalesced': 0, 'dropped': 0, 'throttled': 0,
+                      'connects': 0, 'errors': 0}
+
+    def _slot(self, topic):
+        slot = self.pending.get(topic)
+        if slot is None:
+            slot = [bytearray(VALUE_SIZE), 0, False]
+            self.pending[topic] = slot
+            self.order.append(topic)
+        return slot
+
+    def offer(self, topic, data):
+        '''
+        不用等網路的部分:對應topic,不限速的直接送出,其他的放進buffer
+        '''
+        if self.topics is not None:
+            topic = self.topics.get(topic)
+            if topic is None:
+                return
+        if not self.coalesce:
+            if not self.connected:
+                self.stats['dropped'] += 1
+                return
+            try:
+                self.client.publish(topic, data)
+                self.stats['sent'] += 1
+            except OSError:
+                self._lost()
+                self.stats['dropped'] += 1
+            return
+        slot = self._slot(topic)
+        n = len(data)
+        if n > len(slot[0]):
+            slot[0] = bytearray(n)
+        slot[0][:n] = data
+        if slot[2]:
+            self.stats['coalesced'] += 1
+        slot[1] = n
+        slot[2] = True
+
+    def _refill(self, now):
+        if not self.rate:
+            return
+        elapsed = time.ticks_diff(now, self.last_refill)
+        self.last_refill = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+    def _lost(self):
+        self.connected = False
+        self.stats['errors'] += 1
+        self.failures += 1
+        ceiling = min(BACKOFF_MAX, BACKOFF_BASE << min(self.failures, 16))
+        self.next_connect = time.ticks_add(time.ticks_ms(), random.randint(ceiling // 2, ceiling))
+
+    def _connect(self, now):
+        if time.ticks_diff(now, self.next_connect) < 0:
+            return False
+        try:
+            self.client.connect(timeout=CONNECT_TIMEOUT)
+        except Exception as e: #OSError或umqtt的MQTTException(帳號錯誤等)
+            print(self.name, '連線失敗', e)
+            self._lost()
+            return False
+        self.connected = True
+        self.failures = 0
+        self.stats['connects'] += 1
+        return True
+
+    def pump(self):
+        '''
+        重新連線,並在速率限制內送出留著的資料
+        '''
+        now = time.ticks_ms()
+        if not self.connected and not self._connect(now):
+            return
+        if not self.coalesce:
+            return
+        self._refill(now)
+        order = self.order
+        n = len(order)
+        for k in range(n):
+            i = (self.cursor + k) % n
+            topic = order[i]
+            slot = self.pending[topic]
+            if not slot[2]:
+                continue
+            if self.rate and self.tokens < 1000:
+                self.stats['throttled'] += 1
+                self.cursor = i #下次從這個topic開始,每個topic輪流送
+                return
+            try:
+                self.client.publish(topic, memoryview(slot[0])[:slot[1]])
+            except OSError:
+                self._lost()
+                return
+            slot[2] = False
+            self.tokens -= 1000
+            self.stats['sent'] += 1
+
+    def report(self):
+        report = dict(self.stats)
+        report['connected'] = self.connected
+        return report
+
+
+class Fanout:
+    def __init__(self):
+        self.destinations = []
+
+    def add(self, destination):
+        self.destinations.append(destination)
+        return destination
+
+    def publish(self, topic, data):
+        for destination in self.destinations:
+            destination.offer(topic, data)
+
+    def pump(self):
+        for destination in self.destinations:
+            destination.pump()
+
+    def report(self):
+        return {d.name: d.report() for d in self.destinations}
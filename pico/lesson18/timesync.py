@@ -0,0 +1,229 @@
+#timesync.py
+'''
+SNTP對時服務
+1.開機時和之後每SYNC_INTERVAL對時一次(失敗時RETRY_INTERVAL後重試)
+2.記錄對時那一刻的(ticks_ms, epoch毫秒),之後用ticks_ms換算epoch,不受RTC精度影響
+3.兩次對時之間比較預測和實際的時間,估計晶振的漂移(ppm),換算時補償
+4.對時成功後也設定RTC,time.time()和RTC().datetime()也會是正確的時間
+
+取樣時記錄ticks_ms,publish前用epoch_ms(ticks)換算,網路延遲不會影響時間
+epoch毫秒超過small int的範圍(每次換算都會配置記憶體),所以publish時用stamp_into():
+對時時就把基準時間寫成8個bytes,之後只把small int的ticks差值加上去,直接寫進封包
+
+maybe_sync()不會等NTP回應:時間到先送出要求,之後每次呼叫檢查一次有沒有收到
+'''
+
+import socket
+import struct
+import time
+import machine
+
+NTP_HOST = 'pool.ntp.org'
+NTP_PORT = 123
+NTP_DELTA = 2208988800   #1900-01-01到1970-01-01的秒數
+SYNC_INTERVAL = 3600000  #ms,每小時對時一次
+RETRY_INTERVAL = 60000   #ms,失敗後1分鐘重試
+REBASE_MS = 86400000     #ms,超過1天沒對時就把基準點移到現在(ticks_diff只能算約6天)
+TIMEOUT = 1              #秒
+MAX_RTT = 1000           #ms,來回超過這個值的結果不採用
+DRIFT_WEIGHT = 4         #漂移估計的平滑,新值的權重是1/DRIFT_WEIGHT
+
+#MicroPython有些port的time從2000年開始
+_EPOCH_OFFSET = 946684800 if time.gmtime(0)[0] == 2000 else 0
+
+
+class TimeService:
+    def __init__(self, host=NTP_HOST, interval=SYNC_INTERVAL):
+        self.host = host
+        self.interval = interval
+        self.request = bytearray(48)
+        self.request[0] = 0x1B #LI=0, VN=3, mode=3(client)
+        self.base_ticks = 0
+        self.base_ms = 0       #base_ticks時的epoch毫秒,0代表還沒對時
+        self.base_bytes = bytearray(8) #base_ms(int64,little endian),stamp_into()用
+        self.drift_ppm = 0     #本機時鐘比實際快多少ppm(正數代表太快)
+        self.next_sync = time.ticks_ms()
+        self.syncs = 0
+        self.failures = 0
+        self.last_rtt = 0
+        self.last_offset = 0   #對時前的預測和NTP差多少ms
+        self.addr = None       #NTP server的位址,解析一次之後重複使用
+        self.sock = None       #maybe_sync()送出要求後等待回應的socket
+        self.sent = 0          #送出要求的ticks_ms
+        self.polled = 0        #上一次檢查還沒收到的ticks_ms
+
+    def synced(self):
+        return self.base_ms != 0
+
+    def epoch_ms(self, ticks):
+        '''
+        :param ticks:取樣時的time.ticks_ms()
+        傳回epoch毫秒,還沒對時傳回0
+        '''
+        if not self.base_ms:
+            return 0
+        elapsed = time.ticks_diff(ticks, self.base_ticks)
+        return self.base_ms + elapsed - elapsed // 1000 * self.drift_ppm // 1000
+
+    def stamp_into(self, buf, offset, ticks):
+        '''
+        把ticks時的epoch毫秒(int64,little endian)寫進buf[offset:offset+8],還沒對時寫0
+        和epoch_ms()一樣的換算,但只用small int,不會配置記憶體
+        '''
+        if not self.base_ms:
+            for i in range(8):
+                buf[offset + i] = 0
+            return
+        elapsed = time.ticks_diff(ticks, self.base_ticks)
+        carry = elapsed - elapsed // 1000 * self.drift_ppm // 1000
+        base = self.base_bytes
+        for i in range(8): #一個byte一個byte加上差值(負數時借位)
+            carry += base[i]
+            buf[offset + i] = carry & 0xFF
+            carry >>= 8
+
+    def now_ms(self):
+        return self.epoch_ms(time.ticks_ms())
+
+    def _set_base(self, ticks, ms):
+        self.base_ticks = ticks
+        self.base_ms = ms
+        struct.pack_into('<q', self.base_bytes, 0, ms)
+
+    def _resolve(self):
+        if self.addr is None:
+            self.addr = socket.getaddrinfo(self.host, NTP_PORT)[0][-1]
+        return self.addr
+
+    def _parse(self, data, sent, received):
+        '''
+        傳回(server的epoch毫秒, 收到時的ticks_ms, 來回ms),格式不對傳回None
+        '''
+        if len(data) < 48 or data[1] == 0: #stratum 0是Kiss-o'-Death
+            return None
+        seconds, fraction = struct.unpack_from('!II', data, 40) #transmit timestamp
+        server_ms = (seconds - NTP_DELTA) * 1000 + (fraction * 1000 >> 32)
+        return server_ms, received, time.ticks_diff(received, sent)
+
+    def _query(self):
+        '''
+        等待NTP回應(最多TIMEOUT秒),開機時用
+        '''
+        try:
+            addr = self._resolve()
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        except OSError:
+            self.addr = None
+            return None
+        try:
+            s.settimeout(TIMEOUT)
+            sent = time.ticks_ms()
+            s.sendto(self.request, addr)
+            data = s.recv(48)
+            received = time.ticks_ms()
+        except OSError:
+            return None
+        finally:
+            s.close()
+        return self._parse(data, sent, received)
+
+    def _send(self, now):
+        '''
+        送出NTP要求,不等回應;失敗傳回False
+        '''
+        try:
+            addr = self._resolve()
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        except OSError:
+            self.addr = None
+            return False
+        try:
+            s.setblocking(False)
+            s.sendto(self.request, addr)
+        except OSError:
+            s.close()
+            return False
+        self.sock = s
+        self.sent = now
+        self.polled = now
+        return True
+
+    def _poll(self, now):
+        '''
+        檢查NTP回應,還沒收到傳回None
+        收到的時間取上一次檢查和這一次的中間,誤差最多半個呼叫間隔
+        '''
+        try:
+            data = self.sock.recv(48)
+        except OSError: #EAGAIN:還沒收到
+            if time.ticks_diff(now, self.sent) < TIMEOUT * 1000:
+                self.polled = now
+                return None
+            data = b''
+        self.sock.close()
+        self.sock = None
+        received = time.ticks_add(self.polled, time.ticks_diff(now, self.polled) // 2)
+        return self._parse(data, self.sent, received) or ()
+
+    def sync(self):
+        '''
+        對時一次(等待回應),成功傳回True
+        '''
+        return self._apply(self._query())
+
+    def _apply(self, result):
+        '''
+        用NTP的結果更新基準時間和漂移,result是None或()代表失敗
+        '''
+        now = time.ticks_ms()
+        if not result or result[2] > MAX_RTT:
+            self.failures += 1
+            self.next_sync = time.ticks_add(now, RETRY_INTERVAL)
+            return False
+        server_ms, received, rtt = result
+        actual = server_ms + rtt // 2 #server回應後還要半個來回才收到
+        if self.base_ms:
+            predicted = self.epoch_ms(received)
+            self.last_offset = actual - predicted
+            elapsed = time.ticks_diff(received, self.base_ticks)
+            if elapsed > 60000:
+                #預測比實際快,代表時鐘太快,drift_ppm要加大
+                ppm = (predicted - actual) * 1000 // (elapsed // 1000)
+                self.drift_ppm += ppm // DRIFT_WEIGHT #ppm是扣掉目前補償後剩下的誤差
+        self._set_base(received, actual)
+        self.last_rtt = rtt
+        self.syncs += 1
+        self.next_sync = time.ticks_add(now, self.interval)
+        self.set_rtc(actual // 1000)
+        return True
+
+    def set_rtc(self, seconds):
+        tm = time.gmtime(seconds - _EPOCH_OFFSET)
+        machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5], 0))
+
+    def maybe_sync(self):
+        '''
+        定時呼叫(例如WiFi監控的Timer),每次只做一步,對時成功傳回True
+        時間到送出要求,之後每次呼叫檢查一次回應,TIMEOUT秒沒收到算失敗
+        '''
+        now = time.ticks_ms()
+        if self.base_ms and time.ticks_diff(now, self.base_ticks) > REBASE_MS:
+            self._set_base(now, self.epoch_ms(now))
+        if self.sock is not None:
+            result = self._poll(now)
+            if result is None:
+                return False
+            return self._apply(result)
+        if time.ticks_diff(now, self.next_sync) >= 0 and not self._send(now):
+            return self._apply(None)
+        return False
+
+    def report(self):
+        return {
+            'synced': self.synced(),
+            'syncs': self.syncs,
+            'failures': self.failures,
+            'rtt_ms': self.last_rtt,
+            'offset_ms': self.last_offset,
+            'drift_ppm': self.drift_ppm,
+        }
@@ -4,6 +4,7 @@ import network
 import urequests as requests
 import time
 import rp2
+import wifi
 from machine import WDT
 
 rp2.country('TW') #設定我們的wifi的地區是台灣(可以不設)
@@ -17,25 +18,17 @@ ssid = 'Steve'
 password = 'li561119'
 '''
 
-wlan = network.WLAN(network.STA_IF)
-wlan.active(True)
-wlan.connect(ssid, password)
-wlan.config(pm = 0xa11140) #預設是省電模式,可以設為非省電模式
+#WiFi連線管理(記住BSSID,快速重連),請參考wifi.py
+manager = wifi.WifiManager(ssid, password)
+manager.begin()
+wlan = manager.wlan
 
 def connect():  
-    #等待連線或失敗
+    #等待連線或失敗(每50ms檢查一次,失敗會先退避再重試)
     #status=0,1,2正在連線
     #status=3連線成功
     #<1,>=3失敗的連線
-    max_wait = 10    
-
-    while max_wait > 0:
-        status = wlan.status()
-        if status < 0 or status >= 3:
-            break
-        max_wait -= 1
-        print("等待連線")
-        time.sleep(1)
+    manager.connect()
 
     #處理錯誤
     if wlan.status() != 3:
@@ -47,6 +40,7 @@ def connect():
         print('連線成功')
         status = wlan.ifconfig()
         print(f'ip={status[0]}') 
+        manager.report()
         
         
 def reconnect():
@@ -55,7 +49,4 @@ def reconnect():
         return
     else:
         print("嘗試重新連線")
-        wlan.disconnect()
-        wlan.connect(ssid, password)
-        connect() #再連線一次
-
+        connect() #先用記住的BSSID直接連線,失敗才掃描
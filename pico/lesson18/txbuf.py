@@ -0,0 +1,155 @@
+#txbuf.py
+'''
+不配置記憶體的publish工具
+1.數字直接寫進預先配置的bytearray,不用f-string
+2.topic在import時建立一次bytes,之後重複使用
+3.print由LOG_LEVEL控制,正式執行時不會產生字串
+4.自動GC關閉,在空閒時(Timer工作做完)才執行gc.collect(),並記錄暫停時間
+'''
+
+import gc
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LOG_LEVEL = WARNING #改成DEBUG才會print每次讀到的值
+
+
+def log(level, *args):
+    '''
+    熱路徑請先檢查 if txbuf.LOG_LEVEL <= txbuf.DEBUG: 再呼叫,連參數tuple都不會建立
+    '''
+    if level >= LOG_LEVEL:
+        print(*args)
+
+
+def set_level(level):
+    global LOG_LEVEL
+    LOG_LEVEL = level
+
+
+class NumberBuffer:
+    '''
+    把整數或定點數寫成ASCII,傳回預先切好的memoryview
+    '''
+    def __init__(self, size=16):
+        self.buf = bytearray(size)
+        mv = memoryview(self.buf)
+        self.views = [mv[:n] for n in range(size + 1)] #每種長度的view先建立好
+
+    def write_int(self, value):
+        if value < 0:
+            self.buf[0] = 45 #'-'
+            return self.write_int_at(-value, 1)
+        return self.write_int_at(value, 0)
+
+    def write_fixed(self, value, decimals):
+        '''
+        :param value:放大10**decimals倍的整數,例如2534 -> 25.34
+        '''
+        buf = self.buf
+        n = 0
+        if value < 0:
+            buf[0] = 45
+            n = 1
+            value = -value
+        scale = 1
+        for _ in range(decimals):
+            scale *= 10
+        whole = value // scale
+        frac = value - whole * scale
+        end = len(self.write_int_at(whole, n))
+        if decimals:
+            buf[end] = 46 #'.'
+            end += 1
+            i = end + decimals
+            j = i
+            while i > end:
+                i -= 1
+                buf[i] = 48 + frac % 10
+                frac //= 10
+            end = j
+        return self.views[end]
+
+    def write_int_at(self, value, start):
+        buf = self.buf
+        digits = 1
+        v = value
+        while v >= 10:
+            v //= 10
+            digits += 1
+        end = start + digits
+        i = end
+        while True:
+            i -= 1
+            buf[i] = 48 + value % 10
+            value //= 10
+            if i == start:
+                break
+        return self.views[end]
+
+
+class HeapMonitor:
+    '''
+    關閉自動GC,只在idle()時收集,並統計heap和GC暫停時間
+    '''
+    def __init__(self, collect_below=32 * 1024, every=20):
+        '''
+        :param collect_below:可用heap低於這個值就在idle時GC
+        :param every:最多每幾次idle就GC一次
+        '''
+        self.collect_below = collect_below
+        self.every = every
+        self.ticks = 0
+        self.collects = 0
+        self.pause_max = 0
+        self.pause_total = 0
+        self.pause_last = 0
+        gc.collect()
+        self.free_min = gc.mem_free()
+        self.free_last = self.free_min
+        self.uptime_ms = 0
+        self.last_report = time.ticks_ms()
+        gc.disable() #heap用完時MicroPython還是會自動GC,不會出錯
+
+    def idle(self):
+        '''
+        在Timer工作做完後呼叫
+        '''
+        self.ticks += 1
+        free = gc.mem_free()
+        if free < self.free_min:
+            self.free_min = free
+        if free >= self.collect_below and self.ticks < self.every:
+            return
+        self.ticks = 0
+        start = time.ticks_us()
+        gc.collect()
+        pause = time.ticks_diff(time.ticks_us(), start)
+        self.collects += 1
+        self.pause_last = pause
+        self.pause_total += pause
+        if pause > self.pause_max:
+            self.pause_max = pause
+        self.free_last = gc.mem_free()
+
+    def report(self):
+        '''
+        傳回dict,長時間執行時看free_min有沒有一直下降
+        '''
+        #ticks_ms大約6天會繞回,所以每次report累加(report間隔要小於6天)
+        now = time.ticks_ms()
+        self.uptime_ms += time.ticks_diff(now, self.last_report)
+        self.last_report = now
+        return {
+            'uptime_s': self.uptime_ms // 1000,
+            'free': self.free_last,
+            'free_min': self.free_min,
+            'alloc': gc.mem_alloc(),
+            'collects': self.collects,
+            'pause_last_us': self.pause_last,
+            'pause_max_us': self.pause_max,
+            'pause_avg_us': self.pause_total // self.collects if self.collects else 0,
+        }
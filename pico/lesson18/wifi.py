@@ -0,0 +1,248 @@
+#wifi.py
+'''
+WiFi連線管理
+1.記住上一次成功連線的BSSID、channel、IP設定(存在wifi.json),都是從掃描結果取得
+  (rp2的WLAN.config()沒有'bssid',所以第一次連線一定先掃描)
+2.先用記住的BSSID+channel直接連線(不用掃描,比較快)
+3.失敗再掃描,找訊號最強的AP連線(直接連線有套用記住的IP設定時,先改回DHCP)
+4.都失敗就用指數退避+隨機抖動,避免很多台Pico同時重連
+5.每次連線都記錄花了多少時間(ms)
+6.step()每次只做一步(開始連線、檢查狀態、掃描、等退避時間到),給Timer定期呼叫,
+  不會用sleep卡住其他Timer;connect()是一直呼叫step()直到成功或失敗max_attempts輪
+'''
+
+import network
+import time
+import json
+import random
+import machine
+
+CACHE_FILE = 'wifi.json'
+POLL_MS = 50          #每50ms檢查一次連線狀態
+REJOIN_TIMEOUT = 3000 #直接連線最多等3秒
+SCAN_TIMEOUT = 10000  #掃描後連線最多等10秒
+BACKOFF_BASE = 500    #退避的起始時間(ms)
+BACKOFF_MAX = 30000   #退避最多30秒
+HISTORY_SIZE = 10
+
+#step()的狀態
+IDLE = 0     #已連線,或還沒開始連線
+REJOIN = 1   #用記住的BSSID連線中,等結果
+SCAN = 2     #下一步要掃描
+JOIN = 3     #掃描後連線中,等結果
+BACKOFF = 4  #失敗了,等退避時間到
+
+
+def _hex(b):
+    return ''.join('{:02x}'.format(x) for x in b)
+
+
+def _unhex(s):
+    return bytes(int(s[i:i + 2], 16) for i in range(0, len(s), 2))
+
+
+class WifiManager:
+    def __init__(self, ssid, password, reuse_ip=False, cache_file=CACHE_FILE):
+        '''
+        :param reuse_ip:直接連線時沿用上次的IP設定(不等DHCP)
+        '''
+        self.ssid = ssid
+        self.password = password
+        self.reuse_ip = reuse_ip
+        self.cache_file = cache_file
+        self.wlan = network.WLAN(network.STA_IF)
+        self.cache = self._load()
+        self.failures = 0 #連續失敗次數,用來計算退避時間
+        self.static_ip = False #目前是否套用了記住的IP設定
+        self.started = None
+        self.state = IDLE
+        self.deadline = 0
+        self.target = None #正在連線的(bssid,channel)
+        self.metrics = {'connects': 0, 'rejoin': 0, 'scan': 0, 'failures': 0,
+                        'last_ms': 0, 'last_method': None, 'history': []}
+        #用unique_id當亂數種子,每台Pico的退避時間才會不一樣
+        random.seed(int.from_bytes(machine.unique_id()[-4:], 'big'))
+
+    def _load(self):
+        try:
+            with open(self.cache_file) as f:
+                cache = json.load(f)
+            if cache.get('ssid') == self.ssid:
+                return cache
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _save(self, bssid, channel):
+        cache = {'ssid': self.ssid, 'bssid': _hex(bssid) if bssid else None,
+                 'channel': channel, 'ifconfig': list(self.wlan.ifconfig())}
+        if cache == self.cache:
+            return
+        try:
+            with open(self.cache_file, 'w') as f:
+                json.dump(cache, f)
+            self.cache = cache
+        except OSError as e:
+            print('無法儲存wifi設定', e)
+
+    def begin(self):
+        '''
+        開始連線,不等待結果(import時呼叫,和原本的tools.py一樣)
+        有記住的BSSID才直接連線;沒有的話connect()時再掃描
+        '''
+        self.wlan.active(True)
+        self.wlan.config(pm = 0xa11140) #預設是省電模式,可以設為非省電模式
+        self.started = time.ticks_ms()
+        if self.cache and self.cache.get('bssid'):
+            self._rejoin()
+
+    def _set_state(self, state, timeout=0):
+        self.state = state
+        self.deadline = time.ticks_add(time.ticks_ms(), timeout)
+
+    def _expired(self):
+        return time.ticks_diff(time.ticks_ms(), self.deadline) >= 0
+
+    def _join(self, bssid, channel):
+        self.target = (bssid, channel)
+        if channel:
+            self.wlan.connect(self.ssid, self.password, bssid=bssid, channel=channel)
+        else:
+            self.wlan.connect(self.ssid, self.password, bssid=bssid)
+
+    def _rejoin(self):
+        '''
+        用記住的BSSID、channel(和IP設定)直接連線
+        '''
+        cache = self.cache
+        if self.reuse_ip and cache.get('ifconfig'):
+            self.wlan.ifconfig(tuple(cache['ifconfig']))
+            self.static_ip = True
+        self._join(_unhex(cache['bssid']), cache.get('channel'))
+        self._set_state(REJOIN, REJOIN_TIMEOUT)
+
+    def _use_dhcp(self):
+        if self.static_ip:
+            self.wlan.ifconfig('dhcp')
+            self.static_ip = False
+
+    def _scan(self):
+        '''
+        掃描後傳回訊號最強的(bssid,channel),找不到傳回None
+        '''
+        best = None
+        try:
+            results = self.wlan.scan()
+        except OSError:
+            return None
+        for ssid, bssid, channel, rssi, security, hidden in results:
+            if ssid.decode() == self.ssid and (best is None or rssi > best[2]):
+                best = (bssid, channel, rssi)
+        return best
+
+    def _record(self, method, start, ok):
+        elapsed = time.ticks_diff(time.ticks_ms(), start)
+        m = self.metrics
+        history = m['history']
+        history.append((method, elapsed, ok))
+        if len(history) > HISTORY_SIZE:
+            history.pop(0)
+        if ok:
+            m['connects'] += 1
+            m[method] += 1
+            m['last_ms'] = elapsed
+            m['last_method'] = method
+        return elapsed
+
+    def backoff_ms(self):
+        '''
+        指數退避+full jitter:0 ~ min(BACKOFF_MAX, BACKOFF_BASE*2^n)
+        '''
+        ceiling = min(BACKOFF_MAX, BACKOFF_BASE << min(self.failures, 16))
+        return random.randint(0, ceiling)
+
+    def _fail(self):
+        '''
+        一輪連線(直接連線 -> 掃描連線)都失敗,等退避時間之後再重來
+        '''
+        self.failures += 1
+        self.metrics['failures'] += 1
+        delay = self.backoff_ms()
+        print('連線失敗,{}ms後重試'.format(delay))
+        self._set_state(BACKOFF, delay)
+
+    def step(self):
+        '''
+        非阻塞的連線,每次呼叫只做一步,傳回是否已連線
+        status=0,1,2正在連線
+        status=3連線成功
+        <0失敗
+        '''
+        status = self.wlan.status()
+        state = self.state
+        if state == BACKOFF:
+            if not self._expired():
+                return False
+            state = IDLE
+        if state == IDLE:
+            if status == 3:
+                self.state = IDLE
+                return True
+            #1.用記住的BSSID直接連線,沒有的話下一步掃描
+            self.started = time.ticks_ms()
+            if self.cache and self.cache.get('bssid'):
+                self._rejoin()
+            else:
+                self.wlan.disconnect()
+                self._set_state(SCAN)
+            return False
+        if state == SCAN:
+            #2.掃描後連線(wlan.scan()本身要等1~2秒)
+            best = self._scan()
+            if best is None:
+                self._record('scan', self.started, False)
+                self._fail()
+                return False
+            bssid, channel, rssi = best
+            self._join(bssid, channel)
+            self._set_state(JOIN, SCAN_TIMEOUT)
+            return False
+        #REJOIN、JOIN:檢查連線結果
+        method = 'rejoin' if state == REJOIN else 'scan'
+        if status == 3:
+            self._record(method, self.started, True)
+            self._save(*self.target)
+            self.failures = 0
+            self.state = IDLE
+            return True
+        if status >= 0 and not self._expired():
+            return False
+        self._record(method, self.started, False)
+        self.wlan.disconnect()
+        self._use_dhcp()
+        if state == REJOIN:
+            self._set_state(SCAN)
+        else:
+            self._fail()
+        return False
+
+    def connect(self, max_attempts=3):
+        '''
+        每POLL_MS呼叫一次step(),連線成功傳回True,max_attempts輪都失敗傳回False
+        '''
+        failures = self.failures
+        while not self.step():
+            if self.failures - failures >= max_attempts:
+                return False
+            time.sleep_ms(POLL_MS)
+        return True
+
+    def reconnect(self, max_attempts=3):
+        if self.wlan.status() == 3: #還在連線,只是傳送的server無回應
+            return True
+        return self.connect(max_attempts)
+
+    def report(self):
+        m = self.metrics
+        print('WiFi連線:成功{}次(直接{},掃描{}),失敗{}次,上次{}花{}ms'.format(
+            m['connects'], m['rejoin'], m['scan'], m['failures'], m['last_method'], m['last_ms']))
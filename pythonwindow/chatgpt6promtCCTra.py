@@ -13,14 +13,10 @@ import matplotlib
 matplotlib.use('TkAgg')
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.colors as mcolors
 import matplotlib.pyplot as plt
 
-# 嘗試載入 colour 科學套件以計算 CRI
-try:
-    import colour
-except ImportError:
-    colour = None
+from spectral_core import read_spectrum, colour_rendering_ra, SpectrumStack
+from spectral_ui import BlitPlot, ComputeScheduler, SpectrumPreview, fill_spectrum
 
 # =======================
 # 全域配置
@@ -31,6 +27,7 @@ FONT_NAME = "Microsoft JhengHei"  # 微軟正黑體
 BG_COLOR = "#2E2E2E"
 FG_COLOR = "#FFFFFF"
 ACCENT_COLOR = "#4CAF50"
+GRID_STEP = 1.0  # 各光譜內插到共同波長格點的間隔（nm），取樣間隔、範圍不同的檔案也能加總
 
 # 預設帳號
 PRESET_USER = "WSL"
@@ -38,90 +35,6 @@ PRESET_PASS = "50968758"
 # 有效期至
 EXPIRE_DATE = datetime.datetime(2025, 3, 29)
 
-# =======================
-# 計算 CCT 與 CRI 的函式
-# =======================
-
-def calculate_CCT_from_spectrum(wavelengths, intensities):
-    """
-    利用光譜數據計算 CIE XYZ 值，再求 chromaticity (x,y)，
-    最後採用 McCamy 公式計算 CCT：
-      n = (x - 0.3320) / (y - 0.1858)
-      CCT = -449 n^3 + 3525 n^2 - 6823.3 n + 5520.33
-    """
-    # 定義 CIE 1931 2° 標準觀察者色匹配函數（400-700 nm，單位近似）
-    cmf_data = {
-       400: (0.0143, 0.000396, 0.0679),
-       410: (0.0232, 0.00064, 0.1102),
-       420: (0.0435, 0.00121, 0.2074),
-       430: (0.0776, 0.00218, 0.3713),
-       440: (0.1344, 0.00400, 0.6456),
-       450: (0.2148, 0.00730, 1.0391),
-       460: (0.2839, 0.01160, 1.3856),
-       470: (0.3285, 0.01684, 1.6230),
-       480: (0.3483, 0.02300, 1.7471),
-       490: (0.3481, 0.02980, 1.7826),
-       500: (0.3362, 0.03800, 1.7721),
-       510: (0.3187, 0.04800, 1.7441),
-       520: (0.2908, 0.06000, 1.6692),
-       530: (0.2511, 0.07390, 1.5281),
-       540: (0.1954, 0.09100, 1.2876),
-       550: (0.1421, 0.11260, 1.0419),
-       560: (0.0956, 0.13902, 0.8120),
-       570: (0.05795, 0.1693, 0.6162),
-       580: (0.03201, 0.20802, 0.4652),
-       590: (0.01470, 0.2586, 0.3533),
-       600: (0.00490, 0.3230, 0.2720),
-       610: (0.00240, 0.4073, 0.2123),
-       620: (0.00930, 0.5030, 0.1582),
-       630: (0.02910, 0.6082, 0.1117),
-       640: (0.06330, 0.7100, 0.0782),
-       650: (0.10960, 0.7932, 0.0573),
-       660: (0.16550, 0.8620, 0.04216),
-       670: (0.22570, 0.9149, 0.02984),
-       680: (0.29040, 0.9540, 0.02030),
-       690: (0.35970, 0.9803, 0.01340),
-       700: (0.43340, 0.9949, 0.00875)
-    }
-    cmf_wavelengths = np.array(sorted(cmf_data.keys()))
-    cmf_x = np.array([cmf_data[w][0] for w in cmf_wavelengths])
-    cmf_y = np.array([cmf_data[w][1] for w in cmf_wavelengths])
-    cmf_z = np.array([cmf_data[w][2] for w in cmf_wavelengths])
-    # 對輸入波長進行插值
-    x_bar = np.interp(wavelengths, cmf_wavelengths, cmf_x)
-    y_bar = np.interp(wavelengths, cmf_wavelengths, cmf_y)
-    z_bar = np.interp(wavelengths, cmf_wavelengths, cmf_z)
-    # 計算 X, Y, Z（使用數值積分，波長單位 nm）
-    X = np.trapz(intensities * x_bar, wavelengths)
-    Y = np.trapz(intensities * y_bar, wavelengths)
-    Z = np.trapz(intensities * z_bar, wavelengths)
-    sumXYZ = X + Y + Z
-    if sumXYZ == 0:
-        return 0.0
-    x = X / sumXYZ
-    y = Y / sumXYZ
-    # McCamy 公式所需參數 n
-    n = (x - 0.3320) / (y - 0.1858)
-    cct = -449 * n**3 + 3525 * n**2 - 6823.3 * n + 5520.33
-    return cct
-
-def calculate_CRI(wavelengths, intensities):
-    """
-    使用 colour-science 套件計算顯色指數 (CRI)。
-    若無法載入該套件，則回傳預設值 85。
-    """
-    if colour is None:
-        return 85.0
-    # 建立光譜分佈物件；確保波長與強度均為數值且以 nm 為單位
-    data = dict(zip(wavelengths, intensities))
-    sd = colour.SpectralDistribution(data, name="Test")
-    try:
-        cri_dict = colour.quality.colour_rendering_index(sd)
-        # 'Ra' 為平均顯色指數
-        return cri_dict['Ra']
-    except Exception as ex:
-        return 85.0
-
 # =======================
 # 資料層：單個光譜資料
 # =======================
@@ -135,14 +48,10 @@ class SpectrumData:
     
     def load_data(self):
         try:
-            # 假設 CSV 檔案必含 'wavelength' 與 'intensity' 欄位
-            self.df = pd.read_csv(self.filepath)
-            if not {'wavelength', 'intensity'}.issubset(self.df.columns):
-                raise ValueError("CSV 檔案格式錯誤，必須包含 'wavelength' 與 'intensity' 欄位")
-            self.df['wavelength'] = pd.to_numeric(self.df['wavelength'], errors='coerce')
-            self.df['intensity'] = pd.to_numeric(self.df['intensity'], errors='coerce')
-            self.df.dropna(inplace=True)
-            self.df.sort_values('wavelength', inplace=True)
+            # 假設 CSV 檔案必含 'wavelength' 與 'intensity' 欄位（由 spectral_core 讀取、排序並去除無效資料）
+            self.spectrum = read_spectrum(self.filepath, columns=('wavelength', 'intensity'))
+            self.df = pd.DataFrame({'wavelength': self.spectrum.wavelengths,
+                                    'intensity': self.spectrum.values})
         except Exception as e:
             raise Exception(f"載入檔案 {self.filename} 失敗：{str(e)}")
     
@@ -210,6 +119,8 @@ class MainApp(tk.Tk):
         self.geometry(f"{APP_WIDTH}x{APP_HEIGHT}")
         self.center_window(APP_WIDTH, APP_HEIGHT)
         self.spectra = []  # 儲存 SpectrumData 物件
+        self.stack = SpectrumStack(step=GRID_STEP)  # 各光譜內插到共同格點後的矩陣
+        self.scheduler = ComputeScheduler(self)  # CRI 在背景執行緒計算，不會卡住視窗
         self.create_menu()
         self.create_widgets()
     
@@ -288,6 +199,8 @@ class MainApp(tk.Tk):
         self.canvas_fig = FigureCanvasTkAgg(self.fig, master=self.right_frame)
         self.canvas_fig.draw()
         self.canvas_fig.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        # 總光譜、填色與對比曲線只換資料並用 blit 重畫，座標軸與文字只在範圍改變時重畫
+        self.plot = BlitPlot(self.canvas_fig)
 
     def load_spectra(self):
         filepaths = filedialog.askopenfilenames(title="選擇光譜資料檔案（CSV格式）", filetypes=[("CSV Files", "*.csv")])
@@ -299,6 +212,7 @@ class MainApp(tk.Tk):
         for fp in filepaths:
             try:
                 spectrum = SpectrumData(fp)
+                self.stack.set(spectrum, spectrum.spectrum)
                 self.spectra.append(spectrum)
                 self.add_spectrum_widget(spectrum)
             except Exception as e:
@@ -315,29 +229,19 @@ class MainApp(tk.Tk):
         entry_multiplier.pack(side=tk.TOP, padx=5, pady=2, anchor="w")
         entry_multiplier.bind("<Return>", lambda event, sp=spectrum, var=multiplier_var: self.on_multiplier_change(sp, var))
         spectrum.multiplier_var = multiplier_var
-        fig_small = Figure(figsize=(3, 1.5), dpi=80)
-        ax_small = fig_small.add_subplot(111)
-        ax_small.plot(spectrum.df['wavelength'], spectrum.get_scaled_intensity(), color=ACCENT_COLOR)
-        ax_small.set_title("預覽", fontname=FONT_NAME, fontsize=8)
-        ax_small.tick_params(labelsize=6)
-        fig_small.tight_layout(pad=1.0)
-        canvas_small = FigureCanvasTkAgg(fig_small, master=frame)
-        canvas_small.draw()
-        canvas_small.get_tk_widget().pack(side=tk.TOP, fill=tk.X, padx=5, pady=2)
-        spectrum.fig_small = fig_small
-        spectrum.ax_small = ax_small
-        spectrum.canvas_small = canvas_small
+        spectrum.preview = SpectrumPreview(frame, width=240, height=90, color=ACCENT_COLOR,
+                                           text_color=FG_COLOR, bg=BG_COLOR, title="預覽")
+        spectrum.preview.pack(side=tk.TOP, fill=tk.X, padx=5, pady=2)
+        spectrum.preview.set_data(spectrum.spectrum.wavelengths, spectrum.spectrum.values * spectrum.multiplier)
 
     def on_multiplier_change(self, spectrum, var):
         try:
             new_multiplier = float(var.get())
             spectrum.multiplier = new_multiplier
-            spectrum.ax_small.cla()
-            spectrum.ax_small.plot(spectrum.df['wavelength'], spectrum.get_scaled_intensity(), color=ACCENT_COLOR)
-            spectrum.ax_small.set_title("預覽", fontname=FONT_NAME, fontsize=8)
-            spectrum.ax_small.tick_params(labelsize=6)
-            spectrum.canvas_small.draw()
-            self.update_all_plots()
+            spectrum.preview.set_data(spectrum.spectrum.wavelengths, spectrum.spectrum.values * new_multiplier)
+            # 總光譜只加上這條光譜的變化量（rank-1 更新），只更新有變動的圖形
+            if self.stack.set_multiplier(spectrum, new_multiplier):
+                self.update_changed(spectrum)
         except Exception as e:
             messagebox.showerror("倍率更新錯誤", f"請輸入有效數字。\n錯誤內容：{str(e)}")
     
@@ -345,69 +249,96 @@ class MainApp(tk.Tk):
         if not self.spectra:
             return
         try:
-            wavelengths = self.spectra[0].df['wavelength'].values
-            total_intensity = np.zeros_like(wavelengths, dtype=float)
-            for sp in self.spectra:
-                total_intensity += sp.get_scaled_intensity().values
+            # 各光譜已內插到共同格點，總光譜 = 倍率 @ 光譜矩陣
+            wavelengths = self.stack.grid
+            total_intensity = self.stack.mixed_total()
             self.ax_fill.cla()
+            self.plot.reset()
             self.ax_fill.set_title("光譜填色圖", fontname=FONT_NAME)
             self.ax_fill.set_xlabel("波長 (nm)", fontname=FONT_NAME)
             self.ax_fill.set_ylabel("強度", fontname=FONT_NAME)
-            norm = mcolors.Normalize(vmin=400, vmax=700)
-            cmap = matplotlib.cm.get_cmap("jet")
-            colors = [cmap(norm(w)) for w in wavelengths]
-            self.ax_fill.plot(wavelengths, total_intensity, color=ACCENT_COLOR)
-            for i in range(len(wavelengths)-1):
-                self.ax_fill.fill_between(wavelengths[i:i+2], total_intensity[i:i+2],
-                                          color=colors[i])
+            # 從400nm 紫色漸變至700nm 紅色，整條光譜只用一個 artist 填色
+            self.total_line = self.plot.add(self.ax_fill.plot(wavelengths, total_intensity, color=ACCENT_COLOR)[0])
+            self.total_fill = self.plot.add_fill(
+                fill_spectrum(self.ax_fill, wavelengths, total_intensity, cmap="jet", vmin=400, vmax=700))
+            self.plot.fit(self.ax_fill, wavelengths, total_intensity)
             self.ax_compare.cla()
             self.ax_compare.set_title("標準化光譜對比圖", fontname=FONT_NAME)
             self.ax_compare.set_xlabel("波長 (nm)", fontname=FONT_NAME)
             self.ax_compare.set_ylabel("歸一化強度", fontname=FONT_NAME)
+            self.compare_lines = {}
             for sp in self.spectra:
-                intensity = sp.get_scaled_intensity().values
-                if np.max(intensity) != 0:
-                    intensity_norm = intensity / np.max(intensity)
-                else:
-                    intensity_norm = intensity
-                self.ax_compare.plot(wavelengths, intensity_norm, label=sp.filename)
+                line, = self.ax_compare.plot(sp.df['wavelength'].values, self.normalized_intensity(sp), label=sp.filename)
+                self.compare_lines[sp] = self.plot.add(line)
+            self.plot.fit(self.ax_compare, np.concatenate([sp.spectrum.wavelengths[[0, -1]] for sp in self.spectra]),
+                          np.concatenate([line.get_ydata() for line in self.compare_lines.values()]))
             self.ax_compare.legend(fontsize=8)
-            self.canvas_fig.draw()
-            self.update_ppf_info(total_intensity=total_intensity, wavelengths=wavelengths)
+            self.plot.update()
+            self.show_metrics()
         except Exception as e:
             messagebox.showerror("繪圖更新錯誤", str(e))
+
+    def update_changed(self, spectrum):
+        """倍率改變後只更新總光譜、填色與這條光譜的對比曲線"""
+        try:
+            wavelengths = self.stack.grid
+            total_intensity = self.stack.mixed_total()
+            self.total_line.set_ydata(total_intensity)
+            self.total_fill.update(wavelengths, total_intensity)
+            self.plot.fit(self.ax_fill, wavelengths, total_intensity)
+            self.compare_lines[spectrum].set_ydata(self.normalized_intensity(spectrum))
+            self.plot.update()
+            self.show_metrics()
+        except Exception as e:
+            messagebox.showerror("繪圖更新錯誤", str(e))
+
+    @staticmethod
+    def normalized_intensity(spectrum):
+        intensity = spectrum.spectrum.values * spectrum.multiplier
+        if np.max(intensity) != 0:
+            return intensity / np.max(intensity)
+        return intensity
+
+    def show_metrics(self):
+        """PPF 與 CCT/Duv 立刻顯示；CRI 在背景執行緒計算，算好後再顯示"""
+        def fast():
+            self.update_ppf_info(self.stack.mixed_metrics())
+            return self.stack.grid, self.stack.mixed_total().copy()
+
+        self.scheduler.schedule(fast, lambda args: colour_rendering_ra(*args), self.show_cri,
+                                lambda e: messagebox.showerror("積分計算錯誤", str(e)))
+
+    def show_cri(self, cri):
+        self.cri_var.set(f"顯色指數 (CRI): {np.nan_to_num(cri):.0f}")
     
-    def update_ppf_info(self, total_intensity=None, wavelengths=None):
+    def update_ppf_info(self, metrics=None):
         """
-        計算並顯示 PPF、CCT 與 CRI 資訊：
+        顯示 PPF、CCT 與 CRI 資訊：
           - 對於每個波長 n (nm)，ppf(n) = n * intensity * 0.008359 / 1000.0
           - 分別累加計算總 PPF、藍光（400-499nm）、綠光（500-599nm）、紅光（600-700nm）
-          - CCT 由光譜數據轉換至 CIE XYZ 後以 McCamy 公式估算
-          - CRI 透過 colour-science 套件計算（若未安裝則回傳預設值）
+          - CCT 與 Duv 由光譜數據轉換至 CIE XYZ 後以 Ohno (2013) 普朗克軌跡查表計算
+          - CRI 由 spectral_core 的 CIE 13.3 顯色指數計算（算不出來時顯示 0）
+          以上都由 spectral_core 計算；CRI 在背景執行緒算好後由 show_cri 顯示（見 show_metrics）
         """
         try:
-            if total_intensity is None or wavelengths is None:
+            if metrics is None:
                 total_ppf = blue_ppf = green_ppf = red_ppf = 0.0
-                cct = 0.0
-                cri = 0.0
+                cct = duv = 0.0
             else:
-                mask_total = (wavelengths >= 400) & (wavelengths <= 700)
-                mask_blue  = (wavelengths >= 400) & (wavelengths < 500)
-                mask_green = (wavelengths >= 500) & (wavelengths < 600)
-                mask_red   = (wavelengths >= 600) & (wavelengths <= 700)
-                factor = 0.008359 / 1000.0
-                total_ppf = np.sum(wavelengths[mask_total] * total_intensity[mask_total] * factor)
-                blue_ppf  = np.sum(wavelengths[mask_blue] * total_intensity[mask_blue] * factor)
-                green_ppf = np.sum(wavelengths[mask_green] * total_intensity[mask_green] * factor)
-                red_ppf   = np.sum(wavelengths[mask_red] * total_intensity[mask_red] * factor)
-                cct = calculate_CCT_from_spectrum(wavelengths[mask_total], total_intensity[mask_total])
-                cri = calculate_CRI(wavelengths[mask_total], total_intensity[mask_total])
+                m = metrics
+                total_ppf, blue_ppf = m['total_ppf'], m['blue_ppf']
+                green_ppf, red_ppf = m['green_ppf'], m['red_ppf']
+                cct = np.nan_to_num(m['cct'])
+                duv = np.nan_to_num(m['duv'])
             self.ppf_total_var.set(f"總 PPF (400-700nm): {total_ppf:.2f}")
             self.ppf_blue_var.set(f"藍光 PPF (400-499nm): {blue_ppf:.2f}")
             self.ppf_green_var.set(f"綠光 PPF (500-599nm): {green_ppf:.2f}")
             self.ppf_red_var.set(f"紅光 PPF (600-700nm): {red_ppf:.2f}")
-            self.cct_var.set(f"色溫 (CCT): {cct:.0f}K")
-            self.cri_var.set(f"顯色指數 (CRI): {cri:.0f}")
+            self.cct_var.set(f"色溫 (CCT): {cct:.0f}K  Duv: {duv:.4f}")
+            if metrics is None:
+                self.show_cri(0.0)
+            else:
+                self.cri_var.set("顯色指數 (CRI): 計算中…")  # 背景執行緒算好後由 show_cri 顯示
         except Exception as e:
             messagebox.showerror("積分計算錯誤", str(e))
 
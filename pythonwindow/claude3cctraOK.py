@@ -7,24 +7,15 @@ import os
 
 import numpy as np
 import pandas as pd
-import colour
-from colour.temperature import CCT_to_xy_CIE_D, xy_to_CCT_CIE_D
-from colour.colorimetry import (
-    SpectralDistribution,
-    SPECTRAL_SHAPE_DEFAULT,
-    sd_to_XYZ,
-    wavelength_to_XYZ
-
-)
-from colour.quality import colour_rendering_index
-
 import matplotlib
 matplotlib.use('TkAgg')
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.colors as mcolors
 import matplotlib.pyplot as plt
 
+from spectral_core import read_spectrum, colour_rendering_ra, SpectrumStack
+from spectral_ui import BlitPlot, ComputeScheduler, SpectrumPreview, fill_spectrum
+
 # =======================
 # 全域配置
 # =======================
@@ -34,6 +25,7 @@ FONT_NAME = "Microsoft JhengHei"  # 微軟正黑體
 BG_COLOR = "#2E2E2E"
 FG_COLOR = "#FFFFFF"
 ACCENT_COLOR = "#4CAF50"
+GRID_STEP = 1.0  # 各光譜內插到共同波長格點的間隔（nm），取樣間隔、範圍不同的檔案也能加總
 
 # 預設帳號
 PRESET_USER = "WSL"
@@ -54,60 +46,23 @@ class SpectrumData:
     
     def load_data(self):
         try:
-            # 假設 CSV 檔案有兩欄：wavelength, intensity
-            self.df = pd.read_csv(self.filepath)
-            # 檢查必要欄位
-            if not {'wavelength', 'intensity'}.issubset(self.df.columns):
-                raise ValueError("CSV 檔案格式錯誤，必須包含 'wavelength' 與 'intensity' 欄位")
-            # 轉換資料型態，確保為數值型
-            self.df['wavelength'] = pd.to_numeric(self.df['wavelength'], errors='coerce')
-            self.df['intensity'] = pd.to_numeric(self.df['intensity'], errors='coerce')
-            self.df.dropna(inplace=True)
-            # 依波長排序（由小到大）
-            self.df.sort_values('wavelength', inplace=True)
+            # 假設 CSV 檔案有兩欄：wavelength, intensity（由 spectral_core 讀取、排序並去除無效資料）
+            self.spectrum = read_spectrum(self.filepath, columns=('wavelength', 'intensity'))
+            self.df = pd.DataFrame({'wavelength': self.spectrum.wavelengths,
+                                    'intensity': self.spectrum.values})
+            # 原始最大/最小值先存起來，改倍率時不用重新掃描整條光譜
+            self.peak = float(self.spectrum.values.max())
+            self.trough = float(self.spectrum.values.min())
         except Exception as e:
             raise Exception(f"載入檔案 {self.filename} 失敗：{str(e)}")
     
     def get_scaled_intensity(self):
         """回傳倍率調整後的光譜資料"""
         return self.df['intensity'] * self.multiplier
-    
-    def get_spectral_distribution(self):
-        """將光譜資料轉換為 colour-science SpectralDistribution 物件"""
-        data = dict(zip(self.df['wavelength'], self.get_scaled_intensity()))
-        return SpectralDistribution(data)
 
-# =======================
-# 光譜計算功能
-# =======================
-def calculate_cct_ra(wavelengths, intensity):
-    """計算相關色溫(CCT)和顯色指數(Ra)"""
-    try:
-        # 建立光譜分布物件
-        spd = SpectralDistribution(dict(zip(wavelengths, intensity)))
-        
-        # 計算 XYZ 三刺激值
-        # XYZ = spectral_to_XYZ(spd)
-        XYZ = sd_to_XYZ(spd)
-        # 計算色度座標
-        xy = colour.XYZ_to_xy(XYZ)
-        
-        # 計算相關色溫 (CCT)
-        try:
-            cct = xy_to_CCT_CIE_D(xy)
-        except RuntimeError:
-            cct = 0  # 若計算失敗，返回 0
-        
-        # 計算顯色指數 (Ra)
-        try:
-            ra = colour_rendering_index(spd)
-        except Exception:
-            ra = 0  # 若計算失敗，返回 0
-        
-        return cct, ra
-    except Exception as e:
-        print(f"CCT/Ra calculation error: {str(e)}")
-        return 0, 0
+    def scaled_max(self):
+        """回傳倍率調整後的最大強度"""
+        return max(self.multiplier * self.peak, self.multiplier * self.trough)
 
 # =======================
 # 登入視窗
@@ -179,6 +134,8 @@ class MainApp(tk.Tk):
         self.geometry(f"{APP_WIDTH}x{APP_HEIGHT}")
         self.center_window(APP_WIDTH, APP_HEIGHT)
         self.spectra = []  # 儲存 SpectrumData 物件
+        self.stack = SpectrumStack(step=GRID_STEP)  # 各光譜內插到共同格點後的矩陣
+        self.scheduler = ComputeScheduler(self)  # Ra 在背景執行緒計算，不會卡住視窗
         self.create_menu()
         self.create_widgets()
     
@@ -286,6 +243,8 @@ class MainApp(tk.Tk):
         self.canvas_fig = FigureCanvasTkAgg(self.fig, master=self.right_frame)
         self.canvas_fig.draw()
         self.canvas_fig.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        # 總光譜、填色與對比曲線只換資料並用 blit 重畫，座標軸與文字只在範圍改變時重畫
+        self.plot = BlitPlot(self.canvas_fig)
     
     def load_spectra(self):
         filepaths = filedialog.askopenfilenames(title="選擇光譜資料檔案（CSV格式）", filetypes=[("CSV Files", "*.csv")])
@@ -300,6 +259,7 @@ class MainApp(tk.Tk):
         for fp in filepaths:
             try:
                 spectrum = SpectrumData(fp)
+                self.stack.set(spectrum, spectrum.spectrum)
                 self.spectra.append(spectrum)
                 self.add_spectrum_widget(spectrum)
             except Exception as e:
@@ -325,22 +285,11 @@ class MainApp(tk.Tk):
         # 將 multiplier_var 保存到 spectrum 物件中，方便日後參考
         spectrum.multiplier_var = multiplier_var
 
-        # 小型 Matplotlib 圖形顯示該光譜
-        fig_small = Figure(figsize=(3, 1.5), dpi=80)
-        ax_small = fig_small.add_subplot(111)
-        ax_small.plot(spectrum.df['wavelength'], spectrum.get_scaled_intensity(), color=ACCENT_COLOR)
-        ax_small.set_title("預覽", fontname=FONT_NAME, fontsize=8)
-        ax_small.tick_params(labelsize=6)
-        fig_small.tight_layout(pad=1.0)
-
-        canvas_small = FigureCanvasTkAgg(fig_small, master=frame)
-        canvas_small.draw()
-        canvas_small.get_tk_widget().pack(side=tk.TOP, fill=tk.X, padx=5, pady=2)
-
-        # 將小圖控制元件保存到 spectrum 物件中，方便後續更新
-        spectrum.fig_small = fig_small
-        spectrum.ax_small = ax_small
-        spectrum.canvas_small = canvas_small
+        # 小型預覽圖：直接畫在 tk.Canvas 上（不建立 matplotlib Figure），只在改倍率時重畫
+        spectrum.preview = SpectrumPreview(frame, width=240, height=90, color=ACCENT_COLOR,
+                                           text_color=FG_COLOR, bg=BG_COLOR, title="預覽")
+        spectrum.preview.pack(side=tk.TOP, fill=tk.X, padx=5, pady=2)
+        spectrum.preview.set_data(spectrum.spectrum.wavelengths, spectrum.spectrum.values * spectrum.multiplier)
 
     def on_multiplier_change(self, spectrum, var):
         try:
@@ -348,108 +297,125 @@ class MainApp(tk.Tk):
             new_multiplier = float(var.get())
             spectrum.multiplier = new_multiplier
             # 更新該光譜的小圖
-            spectrum.ax_small.cla()
-            spectrum.ax_small.plot(spectrum.df['wavelength'], spectrum.get_scaled_intensity(), color=ACCENT_COLOR)
-            spectrum.ax_small.set_title("預覽", fontname=FONT_NAME, fontsize=8)
-            spectrum.ax_small.tick_params(labelsize=6)
-            spectrum.canvas_small.draw()
-            # 更新整體圖形與積分資訊
-            self.update_all_plots()
+            spectrum.preview.set_data(spectrum.spectrum.wavelengths, spectrum.spectrum.values * new_multiplier)
+            # 總光譜只加上這條光譜的變化量（rank-1 更新），只更新有變動的圖形
+            if self.stack.set_multiplier(spectrum, new_multiplier):
+                self.update_changed(spectrum)
         except Exception as e:
             messagebox.showerror("倍率更新錯誤", f"請輸入有效數字。\n錯誤內容：{str(e)}")
     
     def update_all_plots(self):
-        # 計算總光譜：各光譜資料疊加（倍率調整後）
+        # 載入光譜後重建所有圖形；之後改倍率只呼叫 update_changed 更新資料
         if not self.spectra:
             return
         try:
-            # 假設所有光譜覆蓋的波長範圍一致，以第一組為準
-            wavelengths = self.spectra[0].df['wavelength'].values
-            total_intensity = np.zeros_like(wavelengths, dtype=float)
-            for sp in self.spectra:
-                total_intensity += sp.get_scaled_intensity().values
+            # 各光譜已內插到共同格點，總光譜 = 倍率 @ 光譜矩陣
+            wavelengths = self.stack.grid
+            total_intensity = self.stack.mixed_total()
             # 更新右側上方填色圖：利用線性分段色階映射（從400nm 紫色漸變至700nm 紅色）
             self.ax_fill.cla()
+            self.plot.reset()
             self.ax_fill.set_title("光譜填色圖", fontname=FONT_NAME)
             self.ax_fill.set_xlabel("波長 (nm)", fontname=FONT_NAME)
             self.ax_fill.set_ylabel("強度", fontname=FONT_NAME)
-            norm = mcolors.Normalize(vmin=400, vmax=700)
-            cmap = matplotlib.cm.get_cmap("jet")
-            colors = [cmap(norm(w)) for w in wavelengths]
-            self.ax_fill.plot(wavelengths, total_intensity, color=ACCENT_COLOR)
-            for i in range(len(wavelengths)-1):
-                self.ax_fill.fill_between(wavelengths[i:i+2], total_intensity[i:i+2],
-                                          color=colors[i])
+            # 從400nm 紫色漸變至700nm 紅色，整條光譜只用一個 artist 填色
+            self.total_line = self.plot.add(self.ax_fill.plot(wavelengths, total_intensity, color=ACCENT_COLOR)[0])
+            self.total_fill = self.plot.add_fill(
+                fill_spectrum(self.ax_fill, wavelengths, total_intensity, cmap="jet", vmin=400, vmax=700))
+            self.plot.fit(self.ax_fill, wavelengths, total_intensity)
             # 更新右側下方：標準化各光譜對比折線圖
             self.ax_compare.cla()
             self.ax_compare.set_title("標準化光譜對比圖", fontname=FONT_NAME)
             self.ax_compare.set_xlabel("波長 (nm)", fontname=FONT_NAME)
             self.ax_compare.set_ylabel("歸一化強度", fontname=FONT_NAME)
             # 找出所有光譜的最大強度值
-            max_intensity = 0
-            for sp in self.spectra:
-                intensity = sp.get_scaled_intensity().values
-                current_max = np.max(intensity)
-                if current_max > max_intensity:
-                    max_intensity = current_max
+            self.max_intensity = max(sp.scaled_max() for sp in self.spectra)
         
-            # 使用全域最大強度進行歸一化
+            # 使用全域最大強度進行歸一化（各光譜畫在自己的波長上）
+            self.compare_lines = {}
             for sp in self.spectra:
-                intensity = sp.get_scaled_intensity().values
-                if max_intensity != 0:
-                    intensity_norm = intensity / max_intensity
-                else:
-                    intensity_norm = intensity
-                self.ax_compare.plot(wavelengths, intensity_norm, label=sp.filename)
+                line, = self.ax_compare.plot(sp.df['wavelength'].values, self.normalized_intensity(sp), label=sp.filename)
+                self.compare_lines[sp] = self.plot.add(line)
         
+            self.plot.fit(self.ax_compare, np.concatenate([sp.spectrum.wavelengths[[0, -1]] for sp in self.spectra]),
+                          np.concatenate([line.get_ydata() for line in self.compare_lines.values()]))
             self.ax_compare.legend(fontsize=8)
-            self.canvas_fig.draw()
+            self.plot.update()
             # 更新積分資訊
-            self.update_ppf_info(total_intensity=total_intensity, wavelengths=wavelengths)
+            self.show_metrics()
         except Exception as e:
             messagebox.showerror("繪圖更新錯誤", str(e))
+
+    def update_changed(self, spectrum):
+        """
+        某一條光譜倍率改變後，只更新總光譜、填色與受影響的對比曲線
+        """
+        try:
+            wavelengths = self.stack.grid
+            total_intensity = self.stack.mixed_total()
+            self.total_line.set_ydata(total_intensity)
+            self.total_fill.update(wavelengths, total_intensity)
+            self.plot.fit(self.ax_fill, wavelengths, total_intensity)
+            # 全域最大值沒變時，只有這條光譜的歸一化曲線需要更新
+            max_intensity = max(sp.scaled_max() for sp in self.spectra)
+            changed = self.spectra if max_intensity != self.max_intensity else [spectrum]
+            self.max_intensity = max_intensity
+            for sp in changed:
+                self.compare_lines[sp].set_ydata(self.normalized_intensity(sp))
+            self.plot.update()
+            self.show_metrics()
+        except Exception as e:
+            messagebox.showerror("繪圖更新錯誤", str(e))
+
+    def normalized_intensity(self, spectrum):
+        intensity = spectrum.spectrum.values * spectrum.multiplier
+        if self.max_intensity != 0:
+            return intensity / self.max_intensity
+        return intensity
+
+    def show_metrics(self):
+        """
+        PPF 與 CCT/Duv 由各光譜預先算好的波段 PPF 與 XYZ 加權相加，立刻顯示；
+        Ra 需要整條光譜，放到背景執行緒計算，算好後再顯示（期間又改倍率時舊的結果不使用）
+        """
+        def fast():
+            self.update_ppf_info(self.stack.mixed_metrics())
+            return self.stack.grid, self.stack.mixed_total().copy()
+
+        self.scheduler.schedule(fast, lambda args: colour_rendering_ra(*args), self.show_ra,
+                                lambda e: messagebox.showerror("計算錯誤", str(e)))
+
+    def show_ra(self, ra):
+        self.ra_var.set(f"顯色指數 (Ra): {np.nan_to_num(ra):.1f}")
     
-    def update_ppf_info(self, total_intensity=None, wavelengths=None):
+    def update_ppf_info(self, metrics=None):
         """
-        計算並顯示 PPF、CCT 與 Ra 資訊
+        顯示 PPF、CCT 與 Ra 資訊
         """
         try:
-            if total_intensity is None or wavelengths is None:
+            if metrics is None:
                 total_ppf = blue_ppf = green_ppf = red_ppf = 0.0
-                cct = ra = 0.0
-            else:
-                # PPF 計算
-                mask_total = (wavelengths >= 400) & (wavelengths <= 700)
-                mask_blue  = (wavelengths >= 400) & (wavelengths < 500)
-                mask_green = (wavelengths >= 500) & (wavelengths < 600)
-                mask_red   = (wavelengths >= 600) & (wavelengths <= 700)
-
-                factor = 0.008359 / 1000.0
-
-                total_ppf = np.sum(wavelengths[mask_total] * total_intensity[mask_total] * factor)
-                blue_ppf  = np.sum(wavelengths[mask_blue]  * total_intensity[mask_blue]  * factor)
-                green_ppf = np.sum(wavelengths[mask_green] * total_intensity[mask_green] * factor)
-                red_ppf   = np.sum(wavelengths[mask_red]   * total_intensity[mask_red]   * factor)
-
-                # CCT 與 Ra 計算
-                cct, ra = calculate_cct_ra(wavelengths[mask_total], total_intensity[mask_total])
-
-            # 計算百分比
-            if total_ppf > 0:
-                blue_percent = (blue_ppf / total_ppf) * 100
-                green_percent = (green_ppf / total_ppf) * 100
-                red_percent = (red_ppf / total_ppf) * 100
-            else:
                 blue_percent = green_percent = red_percent = 0.0
-            
-            
+                cct = duv = 0.0
+            else:
+                # PPF、百分比、CCT/Duv（Ohno 2013）與 Ra 由 spectral_core 計算，算不出來時顯示 0
+                m = metrics
+                total_ppf, blue_ppf = m['total_ppf'], m['blue_ppf']
+                green_ppf, red_ppf = m['green_ppf'], m['red_ppf']
+                blue_percent, green_percent, red_percent = m['blue_percent'], m['green_percent'], m['red_percent']
+                cct = np.nan_to_num(m['cct'])
+                duv = np.nan_to_num(m['duv'])
+
             # 更新顯示資訊
             self.ppf_total_var.set(f"總 PPF (400-700nm): {total_ppf:.2f}")
             self.ppf_blue_var.set(f"藍光 PPF (400-499nm): {blue_ppf:.2f} ({blue_percent:.1f}%)")
             self.ppf_green_var.set(f"綠光 PPF (500-599nm): {green_ppf:.2f} ({green_percent:.1f}%)")
             self.ppf_red_var.set(f"紅光 PPF (600-700nm): {red_ppf:.2f} ({red_percent:.1f}%)")
-            self.cct_var.set(f"相關色溫 (CCT): {cct:.1f}K")
-            self.ra_var.set(f"顯色指數 (Ra): {ra:.1f}")
+            self.cct_var.set(f"相關色溫 (CCT): {cct:.1f}K  Duv: {duv:.4f}")
+            if metrics is None:
+                self.show_ra(0.0)
+            else:
+                self.ra_var.set("顯色指數 (Ra): 計算中…")  # 背景執行緒算好後由 show_ra 顯示
 
         except Exception as e:
             messagebox.showerror("計算錯誤", str(e))
@@ -5,14 +5,19 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.path import Path
 from matplotlib.patches import PathPatch
+from matplotlib.collections import PolyCollection
 import numpy as np
 
+from spectral_core import Spectrum, SpectrumStack
+from spectral_ui import BlitPlot, SpectrumPreview
+
 # 全局樣式設定
 BG_COLOR = "#F0F0F0"
 PRIMARY_COLOR = "#2C3E50"
 SECONDARY_COLOR = "#3498DB"
 ACCENT_COLOR = "#E74C3C"
 TEXT_COLOR = "#2C3E50"
+SUM_GRID = (400, 700, 1)  # 總和光譜的波長格點(start, stop, step),各檔案先內插到這組波長再相加
 
 def wavelength_to_rgb(wavelength, gamma=0.8):
     """精確對應可見光譜顏色分布（400-700nm）"""
@@ -126,8 +131,7 @@ class MainWindow:
         
         self.setup_style()
         self.spectra_data = []
-        self.figures = []
-        self.canvases = []
+        self.previews = []  # 各光譜的縮圖(tk.Canvas)
         self.scale_entries = []  # 新增：存儲倍率輸入框
         self.current_n = 0
         
@@ -198,6 +202,10 @@ class MainWindow:
         self.norm_canvas = FigureCanvasTkAgg(self.norm_fig, master=chart_frame)
         self.norm_canvas.get_tk_widget().pack(fill=tk.BOTH, pady=5)
 
+        # 曲線和填色只換資料並用blit重畫，座標軸只在範圍改變時重畫
+        self.sum_plot = BlitPlot(self.sum_canvas)
+        self.norm_plot = BlitPlot(self.norm_canvas)
+
         # PPF計算結果面板
         self.ppf_frame = ttk.LabelFrame(right_frame, text="PPF 計算結果", padding=15)
         self.ppf_frame.pack(fill=tk.BOTH, pady=10)
@@ -235,9 +243,10 @@ class MainWindow:
         for widget in self.left_frame.winfo_children():
             widget.destroy()
         
-        self.figures = []
-        self.canvases = []
+        self.previews = []
         self.spectra_data = []
+        self.stack = SpectrumStack(grid=SUM_GRID)
+        self.sum_artists = None  # 總和圖和正規化圖的artist(全部載入後才建立)
         self.scale_entries = []  # 清空倍率輸入框列表
         self.current_n = n
 
@@ -247,17 +256,11 @@ class MainWindow:
                 frame.pack(fill=tk.X, pady=5, padx=5)
                 frame.config(relief='groove', borderwidth=1)
                 
-                # 創建Matplotlib圖形
-                fig = plt.figure(figsize=(8,2.5), facecolor=BG_COLOR)
-                ax = fig.add_subplot(111)
-                ax.set_facecolor(BG_COLOR)
-                ax.tick_params(colors=TEXT_COLOR)
-                for spine in ax.spines.values():
-                    spine.set_color(TEXT_COLOR)
-                
-                # 嵌入Canvas
-                canvas = FigureCanvasTkAgg(fig, master=frame)
-                canvas.get_tk_widget().pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+                # 光譜縮圖：直接畫在tk.Canvas上（漸變填充是numpy算好的圖片），不建立Matplotlib圖形
+                preview = SpectrumPreview(frame, width=480, height=150, color=PRIMARY_COLOR,
+                                          cmap=spectrum_cmap, vmin=400, vmax=700,
+                                          text_color=TEXT_COLOR, bg=BG_COLOR, title="光譜圖")
+                preview.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
                 
                 # 添加載入按鈕和倍率輸入
                 btn_frame = ttk.Frame(frame)
@@ -273,8 +276,7 @@ class MainWindow:
                           command=lambda idx=i: self.load_file(idx)).pack(pady=5)
                 
                 # 存儲圖形對象
-                self.figures.append(fig)
-                self.canvases.append(canvas)
+                self.previews.append(preview)
                 self.spectra_data.append({'data': None, 'scale': 1.0})  # 存儲數據和倍率
                 
             self.left_frame.update_idletasks()
@@ -285,12 +287,17 @@ class MainWindow:
     def update_scales(self):
         """更新所有光譜的倍率"""
         try:
+            changed = False
             for i, entry in enumerate(self.scale_entries):
                 scale = float(entry.get())
                 if scale < 0:
                     raise ValueError("倍率不能為負數")
                 self.spectra_data[i]['scale'] = scale
-            self.update_sum_plots()
+                # 已載入的光譜：總和光譜只加上倍率的變化量（rank-1更新）
+                if self.spectra_data[i]['data'] and self.stack.set_multiplier(i, scale):
+                    changed = True
+            if changed:
+                self.refresh_sum_plots()
         except ValueError as e:
             messagebox.showerror("輸入錯誤", f"無效的倍率值: {str(e)}")
         except Exception as e:
@@ -318,15 +325,12 @@ class MainWindow:
                     data['nm'].append(float(values[0]))
                     data['mw'].append(float(values[1]))
                     
+                spectrum = Spectrum(data['nm'], data['mw'], path=filepath)
+                self.stack.set(index, spectrum, multiplier=self.spectra_data[index]['scale'])
                 self.spectra_data[index]['data'] = data
                 
-                # 更新圖表
-                ax = self.figures[index].get_axes()[0]
-                ax.clear()
-                
-                # 繪製光譜圖
-                self.draw_spectrum(ax, data['nm'], data['mw'])
-                self.canvases[index].draw()
+                # 更新縮圖
+                self.previews[index].set_data(spectrum.wavelengths, spectrum.values)
                 self.update_sum_plots()
                 
         except Exception as e:
@@ -353,7 +357,7 @@ class MainWindow:
         im.set_clip_path(patch)
 
         # 繪製白色邊框曲線
-        ax.plot(x, y, color='white', linewidth=1.5, alpha=0.8)
+        line, = ax.plot(x, y, color='white', linewidth=1.5, alpha=0.8)
         
         # 設置坐標軸樣式
         ax.set_title(f"光譜圖", fontname='Microsoft JhengHei', 
@@ -361,52 +365,68 @@ class MainWindow:
         ax.set_xlabel("波長 (nm)", fontname='Microsoft JhengHei', color=TEXT_COLOR)
         ax.set_ylabel("強度 (mw)", fontname='Microsoft JhengHei', color=TEXT_COLOR)
         ax.grid(True, alpha=0.3)
+        return im, patch, line
 
     def update_sum_plots(self):
-        """更新總和圖表和PPF計算"""
+        """重建總和圖表（載入檔案後），倍率改變時只呼叫refresh_sum_plots"""
         if not all(data['data'] for data in self.spectra_data):
             return
             
         try:
-            # 計算總和光譜（考慮倍率）
-            sum_mw = [0] * 301
-            for data in self.spectra_data:
-                if data['data']:
-                    scale = data['scale']
-                    for i, val in enumerate(data['data']['mw']):
-                        sum_mw[i] += val * scale
-                        
-            x = list(range(400, 701))
+            # 計算總和光譜（考慮倍率）：各檔案已內插到SUM_GRID，不同取樣間隔或範圍也能相加
+            sum_mw = self.stack.mixed_total()
+            x = self.stack.grid
             
             # 更新總和光譜圖
             self.sum_ax.clear()
-            self.draw_spectrum(self.sum_ax, x, sum_mw)
+            self.sum_plot.reset()
+            im, patch, line = self.draw_spectrum(self.sum_ax, x, sum_mw)
+            self.sum_plot.add(im)
+            self.sum_plot.add(line)
             self.sum_ax.set_title("總和光譜圖", fontname='Microsoft JhengHei')
-            self.sum_canvas.draw()
 
             # 更新正規化光譜圖
-            max_val = max(sum_mw) if sum_mw else 1
-            norm_mw = [val/max_val for val in sum_mw] if max_val != 0 else [0]*301
             self.norm_ax.clear()
-            self.norm_ax.plot(x, norm_mw, color=SECONDARY_COLOR)
-            self.norm_ax.fill_between(x, 0, norm_mw, color=SECONDARY_COLOR, alpha=0.3)
+            self.norm_plot.reset()
+            norm_line = self.norm_plot.add(self.norm_ax.plot(x, np.zeros_like(x), color=SECONDARY_COLOR)[0])
+            norm_fill = self.norm_plot.add(PolyCollection([], facecolors=SECONDARY_COLOR, edgecolors='face', alpha=0.3))
+            self.norm_ax.add_collection(norm_fill)
             self.norm_ax.set_title("正規化光譜圖", fontname='Microsoft JhengHei')
             self.norm_ax.grid(True, alpha=0.3)
-            self.norm_canvas.draw()
+
+            self.sum_artists = (im, patch, line, norm_line, norm_fill)
+            self.refresh_sum_plots()
+        except Exception as e:
+            messagebox.showerror("計算錯誤", f"更新圖表失敗: {str(e)}")
+
+    def refresh_sum_plots(self):
+        """只更新總和圖表的資料和PPF（各光譜的波段PPF已預先算好，這裡只是加權相加）"""
+        if self.sum_artists is None:
+            return
+
+        try:
+            im, patch, line, norm_line, norm_fill = self.sum_artists
+            sum_mw = self.stack.mixed_total()
+            x = self.stack.grid
+
+            max_val = sum_mw.max() if len(sum_mw) else 1
+            im.set_extent([400, 700, 0, max_val if max_val > 0 else 1])
+            patch.set_path(Path(np.column_stack([x, sum_mw])))
+            line.set_ydata(sum_mw)
+            self.sum_plot.fit(self.sum_ax, x, sum_mw)
+            self.sum_plot.update()
+
+            norm_mw = sum_mw / max_val if max_val != 0 else np.zeros_like(sum_mw)
+            norm_line.set_ydata(norm_mw)
+            norm_fill.set_verts([np.column_stack([np.r_[x[0], x, x[-1]], np.r_[0, norm_mw, 0]])])
+            self.norm_plot.fit(self.norm_ax, x, norm_mw)
+            self.norm_plot.update()
 
             # 計算PPF值
-            total_ppf = ppf_blue = ppf_green = ppf_red = 0.0
-            for i, mw in enumerate(sum_mw):
-                wavelength = 400 + i
-                ppf_value = wavelength * mw * 0.008359 / 1000.0
-                total_ppf += ppf_value
-
-                if 400 <= wavelength <= 499:
-                    ppf_blue += ppf_value
-                elif 500 <= wavelength <= 599:
-                    ppf_green += ppf_value
-                elif 600 <= wavelength <= 700:
-                    ppf_red += ppf_value
+            # 區間定義見 spectral_core.PPF_BANDS
+            ppf = self.stack.mixed_metrics()
+            total_ppf, ppf_blue = ppf['total_ppf'], ppf['blue_ppf']
+            ppf_green, ppf_red = ppf['green_ppf'], ppf['red_ppf']
 
             self.ppf_label_0.config(text=f"{total_ppf:.2f} μmol/s")
             self.ppf_label_1.config(text=f"{ppf_blue:.2f} μmol/s")
@@ -2,16 +2,20 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import pandas as pd
 import numpy as np
 from datetime import datetime
 import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
 from matplotlib.collections import PolyCollection
 
+from spectral_core import read_spectrum, SpectrumStack
+from spectral_ui import BlitPlot, ComputeScheduler, SpectrumFill, SpectrumPreview
+
 plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei']
 plt.rcParams['axes.unicode_minus'] = False
 
+GRID_STEP = 1.0  # 各光谱插值到共同波长格点的间隔(nm)
+
 class StyledApp:
     def __init__(self, master):
         self.master = master
@@ -31,6 +35,8 @@ class StyledApp:
         self.spectrum_data = []
         self.spectrum_plots = []
         self.spectrum_scales = []
+        self.stack = SpectrumStack(step=GRID_STEP)  # 已加载的光谱插值到共同格点
+        self.scheduler = ComputeScheduler(self.master)  # 倍率输入停止后才重画图表
         self.create_precise_colormap()
         self.create_widgets()
     
@@ -116,6 +122,9 @@ class StyledApp:
         self.norm_ax = self.norm_fig.add_subplot(111)
         self.norm_canvas = FigureCanvasTkAgg(self.norm_fig, right_frame)
         self.norm_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        # 曲线和填色只换数据并用blit重画,坐标轴只在范围改变时重画
+        self.sum_plot = BlitPlot(self.sum_canvas)
+        self.norm_plot = BlitPlot(self.norm_canvas)
         content_pane.add(right_frame)
 
     def validate_and_create_plots(self):
@@ -125,6 +134,8 @@ class StyledApp:
                 raise ValueError
             
             self.spectrum_data = [None]*n
+            self.stack.clear()
+            self.scheduler.cancel()
             self.spectrum_plots.clear()
             self.spectrum_scales.clear()
             for widget in self.spectrum_frame.winfo_children():
@@ -143,16 +154,16 @@ class StyledApp:
                 self.spectrum_scales.append(scale_var)
                 ttk.Entry(control_panel, textvariable=scale_var, width=6).pack(side=tk.RIGHT)
                 ttk.Label(control_panel, text="倍率:").pack(side=tk.RIGHT)
-                scale_var.trace_add('write', lambda *_, idx=i: self.update_total_spectrum())
+                scale_var.trace_add('write', lambda *_, idx=i: self.on_scale_change(idx))
                 
                 ttk.Button(control_panel, text="加载文件", 
                          command=lambda idx=i: self.load_spectrum(idx)).pack(side=tk.RIGHT, padx=5)
                 
-                fig = Figure(figsize=(6,2), dpi=100)
-                ax = fig.add_subplot(111)
-                canvas = FigureCanvasTkAgg(fig, frame)
-                canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-                self.spectrum_plots.append((fig, ax, canvas))
+                # 预览直接画在tk.Canvas上,不为每条光谱建立matplotlib Figure
+                preview = SpectrumPreview(frame, width=600, height=160, color='#2c3e50',
+                                          bg='white', title=f"光谱 {i+1}")
+                preview.pack(fill=tk.BOTH, expand=True)
+                self.spectrum_plots.append(preview)
         
         except ValueError:
             messagebox.showerror("输入错误", "请输入1到10之间的整数")
@@ -161,84 +172,87 @@ class StyledApp:
         filename = filedialog.askopenfilename(filetypes=[("文本文件", "*.csv")])
         if filename:
             try:
-                df = pd.read_csv(filename, names=['nm', 'mw'], skiprows=1)
-                self.spectrum_data[index] = df
-                fig, ax, canvas = self.spectrum_plots[index]
-                ax.clear()
-                ax.plot(df['nm'], df['mw'], color='#2c3e50')
-                ax.set_title(f"光谱 {index+1}")
-                ax.set_xlabel("波长 (nm)")
-                ax.set_ylabel("强度 (mW)")
-                canvas.draw()
+                spectrum = read_spectrum(filename)
+                self.stack.set(index, spectrum, multiplier=self.get_scale(index))
+                self.spectrum_data[index] = spectrum
+                self.spectrum_plots[index].set_data(spectrum.wavelengths, spectrum.values)
                 self.update_total_spectrum()
             except Exception as e:
                 messagebox.showerror("文件错误", f"文件读取失败: {str(e)}")
 
+    def get_scale(self, index):
+        try:
+            return float(self.spectrum_scales[index].get())
+        except:
+            return 1.0
+
+    def on_scale_change(self, index):
+        # 只改了一条光谱的倍率:总光谱加上这条光谱的变化量(rank-1更新)
+        # 每输入一个字都会触发,PPF马上更新,重画图表等停止输入后再做一次
+        if self.spectrum_data[index] is None:
+            return
+        if self.stack.set_multiplier(index, self.get_scale(index)):
+            self.scheduler.schedule(self.show_ppf_values, done=lambda _: self.redraw_total_spectrum())
+
     def update_total_spectrum(self):
+        # 加载文件后重建两张图的artist,之后倍率改变只调用redraw_total_spectrum
+        self.scheduler.cancel()
         self.sum_ax.clear()
         self.norm_ax.clear()
+        self.sum_plot.reset()
+        self.norm_plot.reset()
+        self.sum_fill = None
+        self.norm_line = None
         
-        valid_data = []
-        for i, df in enumerate(self.spectrum_data):
-            if df is not None:
-                try:
-                    scale = float(self.spectrum_scales[i].get())
-                except:
-                    scale = 1.0
-                valid_data.append(df.copy().assign(mw=df['mw']*scale))
-        
-        if valid_data:
-            sum_df = pd.concat(valid_data).groupby('nm', as_index=False).sum()
-            sum_df = sum_df.sort_values('nm')
-            x = sum_df['nm'].values
-            y = sum_df['mw'].values
+        if len(self.stack):
+            # 各光谱已插值到共同格点(取样间隔、范围不同也能相加),总光谱 = 倍率 @ 光谱矩阵
+            x = self.stack.grid
             
             if len(x) > 1:
-                verts = []
-                colors = []
-                for i in range(len(x)-1):
-                    mid_nm = (x[i] + x[i+1]) / 2
-                    color = self.wavelength_cmap((mid_nm - 400) / 300)
-                    verts.append([(x[i], 0), (x[i], y[i]), (x[i+1], y[i+1]), (x[i+1], 0)])
-                    colors.append(color)
-                
-                poly = PolyCollection(
-                    verts,
-                    facecolors=colors,
-                    edgecolors='none',
-                    alpha=0.8
-                )
-                self.sum_ax.add_collection(poly)
+                # 每一段用中點波長的顏色，同色的段落合併成一個多邊形
+                self.sum_fill = self.sum_plot.add_fill(SpectrumFill(self.sum_ax, cmap=self.wavelength_cmap,
+                                                                    vmin=400, vmax=700, color_at='mid', alpha=0.8))
                 self.sum_ax.set_xlim(380, 720)
-                self.sum_ax.set_ylim(0, y.max()*1.1)
                 self.sum_ax.set_title("光谱强度分布（精确填色）", pad=20)
                 self.sum_ax.set_xlabel("波长 (nm)", labelpad=10)
                 self.sum_ax.set_ylabel("强度 (mW)", labelpad=10)
             
-            norm_y = y / y.max()
-            self.norm_ax.plot(x, norm_y, color='#34495e', linewidth=1.5)
-            self.norm_ax.fill_between(x, norm_y, color='#bdc3c7', alpha=0.3)
+            self.norm_line = self.norm_plot.add(self.norm_ax.plot(x, np.zeros_like(x), color='#34495e', linewidth=1.5)[0])
+            self.norm_fill = self.norm_plot.add(PolyCollection([], facecolors='#bdc3c7', edgecolors='face', alpha=0.3))
+            self.norm_ax.add_collection(self.norm_fill)
             self.norm_ax.set_title("标准化光谱对比", pad=15)
             self.norm_ax.set_xlabel("波长 (nm)", labelpad=10)
             self.norm_ax.set_ylabel("相对强度", labelpad=10)
-            
-            self.calculate_ppf_values(x, y)
-            
+            self.redraw_total_spectrum()
+            self.show_ppf_values()
+        else:
             self.sum_canvas.draw()
             self.norm_canvas.draw()
 
-    def calculate_ppf_values(self, wavelengths, intensities):
-        ppf = wavelengths * intensities * 0.008359 / 1000
+    def redraw_total_spectrum(self):
+        x = self.stack.grid
+        y = self.stack.mixed_total()
+        if self.sum_fill is not None:
+            self.sum_fill.update(x, y)
+            self.sum_ax.set_xlim(380, 720)
+            self.sum_plot.fit(self.sum_ax, y=y)  # y轴上限 = 最大值*1.1,超出或降到一半以下才重设
         
-        # 定义PPF计算区间
-        blue_mask = (wavelengths >= 400) & (wavelengths <= 499)
-        green_mask = (wavelengths >= 500) & (wavelengths <= 599)
-        red_mask = (wavelengths >= 600) & (wavelengths <= 700)
+        norm_y = y / y.max()
+        self.norm_line.set_ydata(norm_y)
+        self.norm_fill.set_verts([np.column_stack([np.r_[x[0], x, x[-1]], np.r_[0, norm_y, 0]])])
+        self.norm_plot.fit(self.norm_ax, x, norm_y)
         
-        total_ppf = ppf.sum()
-        blue_ppf = ppf[blue_mask].sum()
-        green_ppf = ppf[green_mask].sum()
-        red_ppf = ppf[red_mask].sum()
+        self.sum_plot.update()
+        self.norm_plot.update()
+
+    def show_ppf_values(self):
+        # 区间定义见 spectral_core.PPF_BANDS(总 PPF 只计 400-700nm);
+        # 各光谱的波段PPF预先算好,这里只是按倍率加权相加的结果
+        metrics = self.stack.mixed_metrics()
+        total_ppf = metrics['total_ppf']
+        blue_ppf = metrics['blue_ppf']
+        green_ppf = metrics['green_ppf']
+        red_ppf = metrics['red_ppf']
         
         self.total_ppf_label.config(text=f"{total_ppf:.4f}")
         self.blue_ppf_label.config(text=f"{blue_ppf:.4f}")
@@ -1,9 +1,15 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import paho.mqtt.client as mqtt
-from threading import Event
+from tkinter import ttk, messagebox, scrolledtext
+from threading import Event, Thread
 import random
-import time
+import os
+import sys
+
+#共用的MQTT連線管理放在BlynkMQTTSamples/supervisor.py
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'BlynkMQTTSamples'))
+from supervisor import MQTTSupervisor
+from mqttpump import MessagePump
+import mqttbench
 
 class MQTTPairApp:
     def __init__(self, master):
@@ -20,6 +26,7 @@ class MQTTPairApp:
         self.password = "1234567"
         self.client = None
         self.connected = Event()  # 連接狀態標記
+        self.bench = None  # 進行中的效能測試(mqttbench.Benchmark)
 
         # 通訊配對配置
         self.pairs = [
@@ -44,6 +51,8 @@ class MQTTPairApp:
         ]
 
         self.create_widgets()
+        #MQTT執行緒只把訊息放進佇列,由Tk每個frame一次更新畫面
+        self.pump = MessagePump(self.master, self.show_messages, on_stats=self.show_stats)
         self.connect_mqtt()
 
     def setup_styles(self):
@@ -80,71 +89,66 @@ class MQTTPairApp:
                        padding=5)
 
     def connect_mqtt(self):
-        """建立MQTT連線"""
-        self.client = mqtt.Client(client_id=self.client_id)
-        self.client.username_pw_set(self.username, self.password)
-        self.client.on_connect = self.on_connect
-        self.client.on_disconnect = self.on_disconnect
-        self.client.on_message = self.on_message
-        self.client.on_subscribe = self.on_subscribe
+        """建立MQTT連線(斷線時由supervisor退避重連,訂閱會自動恢復)"""
+        self.client = MQTTSupervisor(self.client_id, self.broker, self.port,
+                                     username=self.username, password=self.password,
+                                     on_connect=self.on_connect,
+                                     on_disconnect=self.on_disconnect,
+                                     on_message=self.on_message)
+        self.client.client.on_subscribe = self.on_subscribe
         
         try:
-            self.client.connect_async(self.broker, self.port)
-            self.client.loop_start()  # 啟動非阻塞網路循環
+            self.subscribe_all()
+            self.client.start()  # 在背景執行緒連線和處理網路事件
         except Exception as e:
             messagebox.showerror("連線錯誤", 
                 f"MQTT連線初始化失敗:\n{str(e)}")
             self.master.destroy()
 
-    def on_connect(self, client, userdata, flags, rc):
+    def on_connect(self, supervisor, rc, session_present):
         """連線回調函數"""
         if rc == 0:
             self.connected.set()
-            self.master.after(0, self.update_status, "成功連線至MQTT伺服器", 'success')
-            self.subscribe_all()
+            report = supervisor.report()
+            if report['connects'] > 1:
+                message = (f"重新連線成功 (第{report['connects'] - 1}次，"
+                           f"斷線共{report['disconnected_s']:.1f}秒，補送{report['flushed']}則)")
+            else:
+                message = "成功連線至MQTT伺服器"
+            self.master.after(0, self.update_status, message, 'success')
         else:
-            error_msg = {
-                1: "協議版本錯誤",
-                2: "客戶端ID無效",
-                3: "伺服器不可用",
-                4: "使用者名稱或密碼錯誤",
-                5: "未授權"
-            }.get(rc, f"未知錯誤代碼: {rc}")
-            self.master.after(0, self.update_status, f"連線失敗: {error_msg}", 'error')
-
-    def on_disconnect(self, client, userdata, rc):
-        """斷線回調函數"""
+            self.master.after(0, self.update_status, f"連線失敗: {rc}", 'error')
+
+    def on_disconnect(self, supervisor, rc):
+        """斷線回調函數(supervisor會用退避+抖動自動重連)"""
         self.connected.clear()
         if rc != 0:
             self.master.after(0, self.update_status, "意外斷線，正在嘗試重連...", 'error')
-            self.reconnect()
-
-    def reconnect(self):
-        """自動重連機制"""
-        retry_count = 0
-        while not self.connected.is_set() and retry_count < 5:
-            try:
-                self.client.reconnect()
-                return
-            except:
-                retry_count += 1
-                time.sleep(2 ** retry_count)
-        self.master.after(0, self.update_status, "重連失敗，請檢查網路", 'error')
 
-    def on_subscribe(self, client, userdata, mid, granted_qos):
+    def on_subscribe(self, client, userdata, mid, reason_code_list, properties):
         """訂閱成功回調"""
-        self.master.after(0, self.update_status, f"主題訂閱成功 (QoS: {granted_qos[0]})", 'info')
+        self.master.after(0, self.update_status, f"主題訂閱成功 (QoS: {reason_code_list[0]})", 'info')
 
     def on_message(self, client, userdata, msg):
-        """訊息接收處理"""
+        """訊息接收處理(在paho的網路執行緒,只放進佇列)"""
+        bench = self.bench
+        if bench is not None and bench.handle(msg):
+            return
         for idx, pair in enumerate(self.pairs):
             if msg.topic == pair["receive_topic"]:
-                self.master.after(0, self.update_receive_display, idx, msg.payload.decode())
-                self.master.after(0, self.update_status, f"收到來自 {msg.topic} 的更新", 'info')
+                self.pump.put(idx, msg.payload.decode())
                 break
 
+    def show_messages(self, index, payloads):
+        """一個frame內同一個主題收到多則時只顯示最新的"""
+        self.update_receive_display(index, payloads[-1])
+        self.update_status(f"收到來自 {self.pairs[index]['receive_topic']} 的更新 ({len(payloads)}則)", 'info')
+
+    def show_stats(self, stats):
+        self.pump_label.config(text=self.pump.describe())
+
     def subscribe_all(self):
-        """訂閱所有主題"""
+        """訂閱所有主題(supervisor會記住,重新連線時自動恢復)"""
         for pair in self.pairs:
             # self.client.subscribe(pair["receive_topic"], qos=1)
             self.client.subscribe(pair["receive_topic"], qos=0)
@@ -207,6 +211,13 @@ class MQTTPairApp:
                                      foreground=self.colors['success'],
                                      font=('Helvetica', 9))
         self.status_label.pack(side=tk.RIGHT)
+        self.pump_label = ttk.Label(self.status_bar,
+                                    text="佇列:0 丟棄:0",
+                                    foreground=self.colors['primary'],
+                                    font=('Helvetica', 9))
+        self.pump_label.pack(side=tk.LEFT)
+        ttk.Button(self.status_bar, text="效能測試",
+                   command=self.open_benchmark).pack(side=tk.LEFT, padx=10)
 
     def update_status(self, message, status_type='info'):
         """更新狀態欄"""
@@ -222,10 +233,6 @@ class MQTTPairApp:
 
     def send_data(self, index):
         """發送數據方法"""
-        if not self.connected.is_set():
-            messagebox.showerror("連線錯誤", "尚未連線至MQTT伺服器")
-            return
-
         data = self.entries[index].get().strip()
         pair = self.pairs[index]
         
@@ -244,8 +251,10 @@ class MQTTPairApp:
                 raise ValueError("不支援的數據類型")
                 
             # self.client.publish(pair["send_topic"], str(converted_data), qos=1)
-            self.client.publish(pair["send_topic"], str(converted_data), qos=0)            
-            self.update_status(f"成功發送到 {pair['send_topic']}", 'success')
+            if self.client.publish(pair["send_topic"], str(converted_data), qos=0):
+                self.update_status(f"成功發送到 {pair['send_topic']}", 'success')
+            else:
+                self.update_status("尚未連線，訊息已排入佇列，連線後送出", 'info')
         except ValueError as e:
             messagebox.showerror("格式錯誤", f"無效的 {pair['label']} 格式\n錯誤訊息: {e}")
             self.update_status(f"輸入格式錯誤: {str(e)}", 'error')
@@ -261,11 +270,90 @@ class MQTTPairApp:
         display.insert(0, message)
         display.config(state='readonly')
 
+    def open_benchmark(self):
+        """效能測試視窗:送出有序號的JSON,量回傳主題的來回時間"""
+        window = tk.Toplevel(self.master)
+        window.title("MQTT 效能測試")
+        form = ttk.Frame(window, padding=10)
+        form.pack(fill=tk.X)
+
+        pair_box = ttk.Combobox(form, state='readonly', width=28,
+                                values=[pair["send_topic"] for pair in self.pairs])
+        pair_box.current(0)
+        rate_entry = ttk.Entry(form, width=8)
+        rate_entry.insert(0, "50")
+        count_entry = ttk.Entry(form, width=8)
+        count_entry.insert(0, "500")
+        mode = tk.StringVar(value="rate")
+        for row, (label, widget) in enumerate((("主題", pair_box), ("每秒幾則", rate_entry),
+                                               ("則數", count_entry))):
+            ttk.Label(form, text=label).grid(row=row, column=0, sticky=tk.W, pady=2)
+            widget.grid(row=row, column=1, sticky=tk.W, pady=2)
+        modes = ttk.Frame(form)
+        modes.grid(row=3, column=0, columnspan=2, sticky=tk.W)
+        for text, value in (("固定速率", "rate"), ("一次送出", "burst"), ("找最大速率", "sweep")):
+            ttk.Radiobutton(modes, text=text, variable=mode, value=value).pack(side=tk.LEFT)
+
+        output = scrolledtext.ScrolledText(window, height=12, width=70, font=('Consolas', 9))
+        output.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        results = []  # 測試執行緒放進來,Tk執行緒每200ms取出顯示
+
+        def show_results():
+            while results:
+                output.insert(tk.END, results.pop(0) + "\n")
+                output.see(tk.END)
+            if window.winfo_exists():
+                window.after(200, show_results)
+
+        def run(pair, rate, count, how):
+            def run_once(rate, count=count, burst=False):
+                self.bench = mqttbench.Benchmark(self.client, pair["send_topic"], pair["receive_topic"],
+                                                 rate, count, burst)
+                return self.bench.run()
+            try:
+                if how == "sweep":
+                    seconds = mqttbench.SWEEP_SECONDS
+                    best, _ = mqttbench.sweep(lambda r: run_once(r, max(20, int(r * seconds))),
+                                              on_report=lambda r: results.append(mqttbench.format_report(r)))
+                    results.append(f"最大可持續速率: {best}則/秒")
+                else:
+                    results.append(mqttbench.format_report(run_once(rate, count, how == "burst")))
+            finally:
+                self.bench = None
+                results.append("測試結束")
+
+        def start():
+            if self.bench is not None:
+                return
+            if not self.connected.is_set():
+                messagebox.showerror("連線錯誤", "尚未連線至MQTT伺服器", parent=window)
+                return
+            try:
+                rate = float(rate_entry.get())
+                count = int(count_entry.get())
+            except ValueError:
+                messagebox.showerror("格式錯誤", "速率和則數要是數字", parent=window)
+                return
+            pair = self.pairs[pair_box.current()]
+            output.insert(tk.END, f"測試 {pair['send_topic']} -> {pair['receive_topic']} ...\n")
+            Thread(target=run, args=(pair, rate, count, mode.get()), daemon=True).start()
+
+        def stop():
+            if self.bench is not None:
+                self.bench.stop()
+
+        buttons = ttk.Frame(form)
+        buttons.grid(row=4, column=0, columnspan=2, sticky=tk.W, pady=5)
+        ttk.Button(buttons, text="開始", command=start).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="停止", command=stop).pack(side=tk.LEFT, padx=5)
+        window.protocol("WM_DELETE_WINDOW", lambda: (stop(), window.destroy()))
+        show_results()
+
     def on_closing(self):
         """關閉視窗處理"""
+        self.pump.stop()
         if self.client:
-            self.client.disconnect()
-            self.client.loop_stop()
+            self.client.stop()
         self.master.destroy()
 
 if __name__ == "__main__":
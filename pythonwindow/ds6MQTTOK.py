@@ -1,15 +1,26 @@
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
+from tkinter import ttk, messagebox
 import paho.mqtt.client as mqtt
 import random
 import json
+import os
+
+from mqttpump import MessagePump
+from ringlog import RingLog
+
+LOG_LINES = 2000   #每個接收區在記憶體保留的行數
+LOG_DIR = os.path.join(os.path.expanduser("~"), ".mqttlog")  #放在使用者目錄,不寫進程式資料夾;None代表不寫檔案
 
 class MQTTApp:
     def __init__(self, root):
         self.root = root
         self.root.title("MQTT Client - Kenny1119")
         self.root.geometry("800x600")
+        if LOG_DIR:
+            os.makedirs(LOG_DIR, exist_ok=True)
         self.setup_ui()
+        #MQTT執行緒只把訊息放進佇列,由Tk每個frame一次更新畫面
+        self.pump = MessagePump(self.root, self.show_messages, on_stats=self.show_stats)
         self.setup_mqtt()
 
     def setup_ui(self):
@@ -68,10 +79,22 @@ class MQTTApp:
             lbl = ttk.Label(frame, text=title, style='Header.TLabel')
             lbl.pack(anchor=tk.W)
             
-            text_box = scrolledtext.ScrolledText(frame, height=4, wrap=tk.WORD)
+            #只保留最近LOG_LINES行,更早的寫到檔案(可以搜尋)
+            spill = os.path.join(LOG_DIR, topic.replace("/", "_") + ".log") if LOG_DIR else None
+            text_box = RingLog(frame, capacity=LOG_LINES, height=4, spill_path=spill)
             text_box.pack(fill=tk.BOTH, expand=True)
             self.text_boxes[topic] = text_box
 
+        bottom = ttk.Frame(main_frame)
+        bottom.pack(fill=tk.X)
+        if LOG_DIR:
+            self.search_entry = ttk.Entry(bottom, width=20)
+            self.search_entry.pack(side=tk.LEFT)
+            self.search_entry.bind("<Return>", lambda e: self.search_logs())
+            ttk.Button(bottom, text="搜尋記錄", command=self.search_logs).pack(side=tk.LEFT, padx=5)
+        self.stats_label = ttk.Label(bottom, text="佇列:0 丟棄:0")
+        self.stats_label.pack(side=tk.RIGHT)
+
     def setup_mqtt(self):
         client_id = f"mqttgokenny50968758-{random.randint(1000,9999)}"
         self.client = mqtt.Client(client_id=client_id)
@@ -92,13 +115,33 @@ class MQTTApp:
         client.subscribe(topics)
 
     def on_message(self, client, userdata, msg):
-        payload = msg.payload.decode()
-        text_box = self.text_boxes.get(msg.topic)
-        if text_box:
-            text_box.config(state=tk.NORMAL)
-            text_box.insert(tk.END, f"{payload}\n")
-            text_box.see(tk.END)
-            text_box.config(state=tk.DISABLED)
+        #在paho的網路執行緒,不能直接改Tk元件
+        if msg.topic in self.text_boxes:
+            self.pump.put(msg.topic, msg.payload.decode())
+
+    def show_messages(self, topic, payloads):
+        self.text_boxes[topic].append(payloads)
+
+    def search_logs(self):
+        pattern = self.search_entry.get()
+        if not pattern:
+            return
+        for topic, text_box in self.text_boxes.items():
+            text_box.search(pattern, lambda results, t=topic: self.show_results(t, pattern, results))
+
+    def show_results(self, topic, pattern, results):
+        window = tk.Toplevel(self.root)
+        window.title(f"{topic}: {pattern} ({len(results)}筆)")
+        listbox = tk.Listbox(window, width=80, height=20)
+        listbox.pack(fill=tk.BOTH, expand=True)
+        for number, line in results:
+            listbox.insert(tk.END, f"{number + 1}: {line}")
+        text_box = self.text_boxes[topic]
+        listbox.bind("<Double-Button-1>",
+                     lambda e: listbox.curselection() and text_box.goto(results[listbox.curselection()[0]][0]))
+
+    def show_stats(self, stats):
+        self.stats_label.config(text=self.pump.describe())
 
     def send_data(self, topic, entry, dtype):
         try:
@@ -112,6 +155,7 @@ class MQTTApp:
             messagebox.showerror("發送錯誤", f"數據發送失敗: {str(e)}")
 
     def on_closing(self):
+        self.pump.stop()
         self.client.disconnect()
         self.client.loop_stop()
         self.root.destroy()
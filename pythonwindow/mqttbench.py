@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+'''
+MQTT來回延遲(RTT)和吞吐量測試
+
+MQTTPairApp的每個發送主題(kenny1119/dataint1119)都有一個回傳主題(updatekenny1119/dataint1119),
+裝置收到後會把值送回來,剛好可以量來回時間:
+1.送出有序號和時間的JSON:{"bench": 測試編號, "seq": 序號, "t": 送出時間}
+2.回傳主題收到同一個測試編號的JSON就算回來了,計算RTT
+3.報告RTT的p50/p95/p99、遺失率、實際送出/收到的速率
+4.--sweep逐步提高速率,找出遺失率和p99都還在範圍內的最大速率
+
+沒有裝置回傳時加--echo,由這個程式自己把發送主題轉到回傳主題;
+--local會在本機啟動pico/emulator的broker,不用網路就能測試(可以和真的broker比較)
+
+使用方式:
+    python mqttbench.py --rate 50 --count 500
+    python mqttbench.py --burst --count 1000 --echo
+    python mqttbench.py --local --echo --sweep --seconds 3
+'''
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'BlynkMQTTSamples'))
+from supervisor import MQTTSupervisor
+
+BROKER = "broker.MQTTGO.io"
+PORT = 1883
+USERNAME = "Steve"
+PASSWORD = "1234567"
+
+#和ds5MWTTOK.MQTTPairApp一樣的主題
+PAIRS = [
+    ("kenny1119/dataint1119", "updatekenny1119/dataint1119"),
+    ("kenny1119/datafloat1119", "updatekenny1119/datafloat1119"),
+    ("kenny1119/datastring1119", "updatekenny1119/datastring1119"),
+]
+
+TIMEOUT = 5.0                  #最後一則送出後等回傳的時間
+SWEEP_RATES = [10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+MAX_LOSS = 0.01                #sweep時允許的遺失率
+MAX_P99_MS = 500               #sweep時允許的p99
+SWEEP_SECONDS = 3              #sweep每個速率測幾秒
+
+
+def percentile(sorted_values, p):
+    '''
+    nearest-rank百分位數,sorted_values要先排序
+    '''
+    if not sorted_values:
+        return float('nan')
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p * len(sorted_values) / 100) - 1))
+    return sorted_values[k]
+
+
+class Benchmark:
+    def __init__(self, supervisor, send_topic, receive_topic, rate=50, count=500, burst=False,
+                 qos=0, timeout=TIMEOUT):
+        '''
+        :param supervisor:已經start()的MQTTSupervisor,receive_topic要先訂閱
+        :param rate:每秒送幾則(burst=True時不限速,一次全部送出)
+        '''
+        self.supervisor = supervisor
+        self.send_topic = send_topic
+        self.receive_topic = receive_topic
+        self.rate = rate
+        self.count = count
+        self.burst = burst
+        self.qos = qos
+        self.timeout = timeout
+        self.run_id = f"{random.randint(0, 0xFFFFFF):06x}"
+        self.sent_at = [0.0] * count
+        self.rtt = []
+        self.duplicates = 0
+        self.received = 0
+        self.seen = bytearray(count)
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.send_elapsed = 0.0
+        self.first_reply = None
+        self.last_reply = None
+        self.done = threading.Event()
+        self.stopped = False
+
+    def handle(self, msg):
+        '''
+        在on_message裡呼叫;是這次測試的訊息傳回True(呼叫的人就不用再處理)
+        '''
+        if msg.topic != self.receive_topic:
+            return False
+        now = time.perf_counter()
+        try:
+            data = json.loads(msg.payload)
+            if data.get("bench") != self.run_id:
+                return False
+            seq = int(data["seq"])
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return False
+        if not 0 <= seq < self.count:
+            return True
+        with self.lock:
+            if self.seen[seq]:
+                self.duplicates += 1
+                return True
+            self.seen[seq] = 1
+            self.received += 1
+            self.rtt.append(now - self.sent_at[seq])
+            if self.first_reply is None:
+                self.first_reply = now
+            self.last_reply = now
+            if self.received == self.count:
+                self.done.set()
+        return True
+
+    def run(self):
+        '''
+        送出全部訊息,等回傳(最多timeout秒),傳回report()
+        '''
+        interval = 0 if self.burst or not self.rate else 1.0 / self.rate
+        publish = self.supervisor.client.publish #不經過斷線佇列,量到的才是真的網路
+        start = time.perf_counter()
+        for seq in range(self.count):
+            if self.stopped:
+                break
+            if interval:
+                delay = start + seq * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            now = time.perf_counter()
+            self.sent_at[seq] = now
+            payload = json.dumps({"bench": self.run_id, "seq": seq, "t": now})
+            publish(self.send_topic, payload, self.qos)
+            self.sent += 1
+        self.send_elapsed = time.perf_counter() - start
+        self.done.wait(self.timeout)
+        return self.report()
+
+    def stop(self):
+        self.stopped = True
+        self.done.set()
+
+    def report(self):
+        with self.lock:
+            rtt = sorted(self.rtt)
+            received = self.received
+            duplicates = self.duplicates
+            first, last = self.first_reply, self.last_reply
+        sent = self.sent
+        ms = [r * 1000 for r in rtt]
+        return {
+            "mode": "burst" if self.burst else f"{self.rate}/s",
+            "sent": sent,
+            "received": received,
+            "lost": sent - received,
+            "loss": (sent - received) / sent if sent else 0.0,
+            "duplicates": duplicates,
+            "send_rate": sent / self.send_elapsed if self.send_elapsed > 0 else float('inf'),
+            "receive_rate": (received - 1) / (last - first) if received > 1 and last > first else 0.0,
+            "p50_ms": percentile(ms, 50),
+            "p95_ms": percentile(ms, 95),
+            "p99_ms": percentile(ms, 99),
+            "max_ms": ms[-1] if ms else float('nan'),
+            "stopped": self.stopped,
+        }
+
+
+def format_report(report):
+    return (f"[{report['mode']}] 送出:{report['sent']} 收到:{report['received']} "
+            f"遺失:{report['lost']} ({report['loss'] * 100:.1f}%) 重複:{report['duplicates']}\n"
+            f"  RTT p50:{report['p50_ms']:.1f}ms p95:{report['p95_ms']:.1f}ms "
+            f"p99:{report['p99_ms']:.1f}ms max:{report['max_ms']:.1f}ms\n"
+            f"  送出速率:{report['send_rate']:.0f}則/秒 收到速率:{report['receive_rate']:.0f}則/秒")
+
+
+def sweep(run_once, rates=SWEEP_RATES, max_loss=MAX_LOSS, max_p99_ms=MAX_P99_MS, on_report=None):
+    '''
+    由低到高測試每個速率,傳回(最大可持續速率, 所有報告)
+    :param run_once:run_once(rate)傳回report
+    '''
+    best = 0
+    reports = []
+    for rate in rates:
+        report = run_once(rate)
+        reports.append(report)
+        if on_report is not None:
+            on_report(report)
+        if report["stopped"]:
+            break
+        if report["loss"] > max_loss or report["p99_ms"] > max_p99_ms or report["send_rate"] < rate * 0.9:
+            break
+        best = rate
+    return best, reports
+
+
+class Echo:
+    '''
+    代替裝置:把發送主題收到的訊息原封不動送到回傳主題
+    '''
+    def __init__(self, host, port, username=None, password=None, pairs=PAIRS):
+        self.routes = dict(pairs)
+        self.supervisor = MQTTSupervisor(f"bench-echo-{random.randint(0, 0xFFFF):04x}", host, port,
+                                         username=username, password=password,
+                                         on_message=self._on_message, name="echo")
+        for send_topic in self.routes:
+            self.supervisor.subscribe(send_topic)
+
+    def _on_message(self, client, userdata, msg):
+        client.publish(self.routes[msg.topic], msg.payload, msg.qos)
+
+    def start(self):
+        self.supervisor.start()
+        return self
+
+    def stop(self):
+        self.supervisor.stop()
+
+
+def wait_connected(supervisor, timeout=15):
+    if not supervisor.connected.wait(timeout):
+        raise SystemExit(f"{supervisor.host}:{supervisor.port} 連線逾時")
+    time.sleep(0.3) #等SUBACK
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT來回延遲和吞吐量測試")
+    parser.add_argument("--broker", default=BROKER)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--user", default=USERNAME)
+    parser.add_argument("--password", default=PASSWORD)
+    parser.add_argument("--local", action="store_true", help="在本機啟動測試用的broker(pico/emulator/broker.py)")
+    parser.add_argument("--echo", action="store_true", help="由這個程式代替裝置回傳")
+    parser.add_argument("--pair", type=int, default=0, help="使用第幾組主題(0~2)")
+    parser.add_argument("--rate", type=float, default=50, help="每秒送幾則")
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--burst", action="store_true", help="不限速,一次全部送出")
+    parser.add_argument("--sweep", action="store_true", help="逐步提高速率找出最大可持續速率")
+    parser.add_argument("--seconds", type=float, default=SWEEP_SECONDS, help="sweep每個速率測幾秒")
+    parser.add_argument("--qos", type=int, default=0, choices=(0, 1))
+    parser.add_argument("--timeout", type=float, default=TIMEOUT)
+    args = parser.parse_args()
+
+    broker = None
+    if args.local:
+        sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pico"))
+        from emulator.broker import LocalBroker
+        broker = LocalBroker("127.0.0.1", 0).start()
+        args.broker, args.port = broker.host, broker.port
+        print(f"本機broker: {broker.host}:{broker.port}")
+
+    send_topic, receive_topic = PAIRS[args.pair]
+    echo = Echo(args.broker, args.port, args.user, args.password).start() if args.echo else None
+    bench = {"current": None}
+
+    def on_message(client, userdata, msg):
+        current = bench["current"]
+        if current is not None:
+            current.handle(msg)
+
+    supervisor = MQTTSupervisor(f"bench-{random.randint(0, 0xFFFF):04x}", args.broker, args.port,
+                                username=args.user, password=args.password,
+                                on_message=on_message, name="bench")
+    supervisor.subscribe(receive_topic, args.qos)
+    supervisor.start()
+    try:
+        if echo is not None:
+            wait_connected(echo.supervisor)
+        wait_connected(supervisor)
+
+        def run_once(rate, count, burst=False):
+            bench["current"] = Benchmark(supervisor, send_topic, receive_topic, rate, count,
+                                         burst, args.qos, args.timeout)
+            return bench["current"].run()
+
+        if args.sweep:
+            best, _ = sweep(lambda rate: run_once(rate, max(20, int(rate * args.seconds))),
+                            on_report=lambda r: print(format_report(r)))
+            print(f"最大可持續速率: {best}則/秒 (遺失<={MAX_LOSS * 100:.0f}%, p99<={MAX_P99_MS}ms)")
+        else:
+            print(format_report(run_once(args.rate, args.count, args.burst)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+        if echo is not None:
+            echo.stop()
+        if broker is not None:
+            broker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+'''
+MQTT訊息送到Tk畫面的幫浦
+
+paho的callback在網路執行緒執行,不能直接改Tk的元件;每則訊息呼叫一次after,
+訊息一多Tk的事件迴圈就塞住。改成:
+1.網路執行緒只做deque.append(不用lock,GIL保證append/popleft是安全的)
+2.Tk每個frame用一個after取出最多max_batch則,同一個key的訊息合併成一次handler呼叫
+3.deque有上限,來不及處理時丟掉最舊的,記錄丟掉和還在排隊的數量
+
+使用方式:
+    self.pump = MessagePump(root, self.show_messages)
+    def on_message(self, client, userdata, msg):   #網路執行緒
+        self.pump.put(msg.topic, msg.payload.decode())
+    def show_messages(self, topic, payloads):       #Tk執行緒,payloads是list
+        text_box.insert(tk.END, '\\n'.join(payloads) + '\\n')
+'''
+
+import time
+from collections import deque
+
+INTERVAL_MS = 33     #約30fps
+MAX_BATCH = 2000     #每個frame最多處理幾則
+QUEUE_SIZE = 100000  #排隊的上限,超過丟掉最舊的
+
+
+class MessagePump:
+    def __init__(self, master, handler, interval_ms=INTERVAL_MS, max_batch=MAX_BATCH,
+                 queue_size=QUEUE_SIZE, on_stats=None):
+        '''
+        :param handler:handler(key, items),在Tk執行緒呼叫,items是這個frame收到的list(照順序)
+        :param on_stats:on_stats(stats),每秒在Tk執行緒呼叫一次,可以顯示在狀態列
+        '''
+        self.master = master
+        self.handler = handler
+        self.interval_ms = interval_ms
+        self.max_batch = max_batch
+        self.on_stats = on_stats
+        self.queue = deque(maxlen=queue_size)
+        self.received = 0     #只有網路執行緒會改
+        self.drained = 0      #只有Tk執行緒會改
+        self.batches = 0
+        self.max_tick_ms = 0.0
+        self._rate_mark = (time.monotonic(), 0)
+        self.rate = 0.0
+        self._after_id = None
+        self.start()
+
+    def put(self, key, item):
+        '''
+        任何執行緒都可以呼叫(通常是paho的on_message)
+        '''
+        self.received += 1
+        self.queue.append((key, item))
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.master.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.master.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        start = time.perf_counter()
+        queue = self.queue
+        groups = {}
+        n = 0
+        try:
+            while n < self.max_batch:
+                key, item = queue.popleft()
+                items = groups.get(key)
+                if items is None:
+                    groups[key] = [item]
+                else:
+                    items.append(item)
+                n += 1
+        except IndexError: #排隊的處理完了
+            pass
+        self.drained += n
+        if n:
+            self.batches += 1
+            for key, items in groups.items():
+                self.handler(key, items)
+        self.max_tick_ms = max(self.max_tick_ms, (time.perf_counter() - start) * 1000)
+        now = time.monotonic()
+        mark_time, mark_count = self._rate_mark
+        if now - mark_time >= 1.0:
+            self.rate = (self.drained - mark_count) / (now - mark_time)
+            self._rate_mark = (now, self.drained)
+            if self.on_stats is not None:
+                self.on_stats(self.stats())
+        self._after_id = self.master.after(self.interval_ms, self._tick)
+
+    @property
+    def queued(self):
+        return len(self.queue)
+
+    @property
+    def dropped(self):
+        #deque滿了會自己丟掉最舊的,所以用收到的數量推算
+        return max(0, self.received - self.drained - len(self.queue))
+
+    def stats(self):
+        return {'received': self.received, 'drained': self.drained, 'queued': self.queued,
+                'dropped': self.dropped, 'rate': self.rate, 'batches': self.batches,
+                'max_tick_ms': self.max_tick_ms}
+
+    def describe(self):
+        '''
+        狀態列用的一行文字
+        '''
+        return f"佇列:{self.queued} 丟棄:{self.dropped} 處理:{self.rate:.0f}則/秒"
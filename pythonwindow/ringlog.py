@@ -0,0 +1,211 @@
+'''
+固定容量的訊息記錄元件,取代一直append的ScrolledText
+
+1.行存在記憶體的list(最多capacity行),超過capacity+chunk時一次刪掉最舊的chunk行
+2.Text元件只放看得到的那幾行,捲動時重畫這幾行,不管總共有幾行都一樣快
+3.spill_path有設定時,被刪掉的行寫到檔案,search()在背景執行緒搜尋檔案和記憶體裡的行
+  重新開啟時接在檔案後面(行號接續);檔案超過SPILL_MAX_BYTES時先改名成spill_path + '.1'再重新開始
+
+使用方式:
+    log = RingLog(frame, capacity=5000, height=4, spill_path='recv.log')
+    log.pack(fill=tk.BOTH, expand=True)
+    log.append(['第一行', '第二行'])
+    log.search('error', lambda results: print(results))  #results是[(行號, 內容), ...]
+'''
+
+import os
+import re
+import threading
+import tkinter as tk
+from tkinter import ttk, font as tkfont
+
+CAPACITY = 5000     #記憶體裡最多保留幾行
+CHUNK = 500         #一次刪掉幾行
+MAX_RESULTS = 1000  #搜尋最多傳回幾筆
+SPILL_MAX_BYTES = 64 * 1024 * 1024  #spill檔超過這個大小時,開啟時換一個新檔(舊的留一份.1)
+
+
+def _count_lines(path):
+    count = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            count += block.count(b'\n')
+    return count
+
+
+class RingLog(ttk.Frame):
+    def __init__(self, master, capacity=CAPACITY, chunk=CHUNK, height=10, spill_path=None,
+                 font=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.capacity = capacity
+        self.chunk = chunk
+        self.lines = []
+        self.base = 0         #self.lines[0]的行號(之前刪掉了幾行,包含spill檔裡上次留下的)
+        self.top = 0          #畫面第一行在self.lines的位置
+        self.rows = height    #畫面放得下幾行
+        self.follow = True    #在最底下時,有新的行就跟著捲動
+        self.spill_path = spill_path
+        if spill_path:
+            self._open_spill()
+        self._render_pending = False
+
+        self.text = tk.Text(self, height=height, wrap=tk.NONE, state=tk.DISABLED, font=font)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.linespace = tkfont.Font(font=self.text.cget('font')).metrics('linespace')
+        self.text.bind('<Configure>', self._on_configure)
+        self.text.bind('<MouseWheel>', self._on_wheel)
+        self.text.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.text.bind('<Button-5>', lambda e: self.scroll(3))
+        self.text.bind('<Up>', lambda e: self.scroll(-1))
+        self.text.bind('<Down>', lambda e: self.scroll(1))
+        self.text.bind('<Prior>', lambda e: self.scroll(-self.rows))
+        self.text.bind('<Next>', lambda e: self.scroll(self.rows))
+
+    def _open_spill(self):
+        '''
+        保留上次的記錄:檔案太大時改名成.1,否則行號從檔案現有的行數接下去
+        '''
+        path = self.spill_path
+        if not os.path.exists(path):
+            open(path, 'w', encoding='utf-8').close()
+            return
+        if os.path.getsize(path) > SPILL_MAX_BYTES:
+            os.replace(path, path + '.1')
+            open(path, 'w', encoding='utf-8').close()
+            return
+        self.base = _count_lines(path)
+
+    #----------------------------------------------------------------------------
+    def append(self, lines):
+        '''
+        加入一行(str)或多行(list),要在Tk的執行緒呼叫
+        '''
+        if isinstance(lines, str):
+            lines = [lines]
+        #一個payload有換行時拆成多行,行號才會和檔案一致
+        self.lines.extend('\n'.join(lines).split('\n'))
+        if len(self.lines) > self.capacity + self.chunk:
+            self._trim(len(self.lines) - self.capacity)
+        if self.follow:
+            self.top = max(0, len(self.lines) - self.rows)
+        self._schedule_render()
+
+    def clear(self):
+        self._trim(len(self.lines))
+        self.top = 0
+        self._schedule_render()
+
+    def _trim(self, n):
+        dropped = self.lines[:n]
+        del self.lines[:n]
+        self.base += n
+        self.top = max(0, self.top - n)
+        if self.spill_path and dropped:
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(dropped) + '\n')
+
+    def __len__(self):
+        return self.base + len(self.lines)
+
+    #----------------------------------------------------------------------------
+    def _on_configure(self, event):
+        rows = max(1, event.height // self.linespace)
+        if rows != self.rows:
+            self.rows = rows
+            if self.follow:
+                self.top = max(0, len(self.lines) - rows)
+            self._schedule_render()
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def scroll(self, n):
+        self._set_top(self.top + n)
+
+    def yview(self, *args):
+        '''
+        Scrollbar的command
+        '''
+        if args[0] == 'moveto':
+            self._set_top(int(float(args[1]) * len(self.lines)))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self.scroll(step * self.rows if args[2] == 'pages' else step)
+
+    def _set_top(self, top):
+        last = max(0, len(self.lines) - self.rows)
+        self.top = min(max(0, top), last)
+        self.follow = self.top >= last
+        self._schedule_render()
+
+    def _schedule_render(self):
+        #同一個frame內append很多次只重畫一次
+        if not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self._render)
+
+    def _render(self):
+        self._render_pending = False
+        visible = self.lines[self.top:self.top + self.rows]
+        text = self.text
+        text.config(state=tk.NORMAL)
+        text.delete('1.0', tk.END)
+        text.insert('1.0', '\n'.join(visible))
+        text.config(state=tk.DISABLED)
+        total = len(self.lines)
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + len(visible)) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    #----------------------------------------------------------------------------
+    def search(self, pattern, callback, max_results=MAX_RESULTS, regex=False):
+        '''
+        在背景執行緒搜尋(檔案+記憶體),完成後在Tk執行緒呼叫callback([(行號, 內容), ...])
+        '''
+        snapshot = list(self.lines)
+        base = self.base
+        matcher = re.compile(pattern) if regex else None
+        match = matcher.search if matcher else (lambda line: pattern in line)
+
+        def run():
+            results = []
+            if self.spill_path:
+                #只讀到base行,之後才寫進檔案的行在snapshot裡
+                with open(self.spill_path, encoding='utf-8') as f:
+                    for number, line in enumerate(f):
+                        if number >= base:
+                            break
+                        line = line.rstrip('\n')
+                        if match(line):
+                            results.append((number, line))
+                            if len(results) >= max_results:
+                                break
+            for i, line in enumerate(snapshot):
+                if len(results) >= max_results:
+                    break
+                if match(line):
+                    results.append((base + i, line))
+            done.append(results)
+
+        #Tk不能在別的執行緒呼叫,由Tk執行緒輪詢結果
+        done = []
+        def poll():
+            if done:
+                callback(done[0])
+            else:
+                self.after(50, poll)
+
+        threading.Thread(target=run, name='ringlog-search', daemon=True).start()
+        self.after(50, poll)
+
+    def goto(self, number):
+        '''
+        捲動到某一行(行號從0開始,已經刪掉的行傳回False)
+        '''
+        if number < self.base:
+            return False
+        self._set_top(number - self.base)
+        return True
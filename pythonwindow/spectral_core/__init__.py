@@ -0,0 +1,27 @@
+'''
+光譜計算核心(pythonwindow的各個光譜GUI、批次工具共用)
+
+只依賴numpy,不會import tkinter或matplotlib(CIE的表格放在data/)
+1.spectrum:Spectrum(波長、強度陣列)和read_spectrum()讀CSV/TXT
+2.ppf:PPF(總/藍/綠/紅),可以一次算多條光譜
+3.colorimetry:CIE 1931色匹配函數、XYZ、xy、uv、McCamy色溫
+4.cct:相關色溫和Duv(Ohno 2013、Robertson),可以一次算很多點
+5.cri:顯色指數Ra和R1-R14,可以一次算多條光譜
+6.resample:線性/Sprague內插到另一組波長
+7.stack:SpectrumStack把多條光譜放到共同格點,加總是一次矩陣乘法
+8.metrics:evaluate()一次算出全部;evaluate_features()從預先算好的波段PPF/XYZ算(改倍率時用)
+
+使用方式:
+    import spectral_core as sc
+    s = sc.read_spectrum('led.csv', columns=('wavelength', 'intensity'))
+    print(sc.evaluate_spectrum(s))
+'''
+
+from .spectrum import Spectrum, read_spectrum
+from .ppf import PPF_FACTOR, PPF_BANDS, band_masks, band_weights, ppf_bands, ppf_percentages
+from .colorimetry import cmfs, spectrum_to_XYZ, XYZ_to_xy, XYZ_to_uv, cct_mccamy, cct_from_spectrum
+from .cct import cct_ohno, cct_robertson, uv_to_cct, xy_to_cct, XYZ_to_cct
+from .cri import colour_rendering_index, colour_rendering_indexes
+from .resample import resample, resample_matrix
+from .stack import SpectrumStack, make_grid, resample_spectrum
+from .metrics import METRICS, colour_rendering_ra, evaluate, evaluate_features, evaluate_spectrum, linear_weights
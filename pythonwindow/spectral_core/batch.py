@@ -0,0 +1,152 @@
+'''
+批次計算很多光譜檔的PPF/CCT/Ra(每批LED量測的幾千個CSV/TXT)
+
+1.用glob找出資料夾裡的檔案,分成chunk交給ProcessPoolExecutor(每個process一次處理一個chunk)
+2.每個檔案一列:檔名、點數、波長範圍、總/藍/綠/紅PPF、百分比、CCT、Ra、錯誤訊息
+3.結果依照檔名順序寫成一個CSV(或Parquet,需要pandas+pyarrow)
+4.進度和每秒處理幾個檔案印在stderr
+
+使用方式(在pythonwindow資料夾內執行):
+    python -m spectral_core.batch D:/lot42 --pattern "*.csv" --out lot42.csv
+    python -m spectral_core.batch D:/lot42 --pattern "**/*.txt" --workers 8 --no-cri --out lot42.parquet
+'''
+
+import argparse
+import csv
+import glob
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .metrics import METRICS, evaluate_spectrum
+from .spectrum import read_spectrum
+
+COLUMNS = ('file', 'points', 'wl_min', 'wl_max') + METRICS + ('error',)
+CHUNK_SIZE = 32   #每個工作處理幾個檔案(太小的話process間傳遞的成本變高)
+
+
+def evaluate_file(path, columns=None, cri=True):
+    '''
+    一個檔案的結果(dict,欄位見COLUMNS);讀檔或計算失敗時error有訊息,其他欄位是nan
+    '''
+    row = dict.fromkeys(COLUMNS, math.nan)
+    row['file'] = path
+    row['error'] = ''
+    try:
+        spectrum = read_spectrum(path, columns)
+        if len(spectrum) < 2:
+            raise ValueError('資料少於2點')
+        row['points'] = len(spectrum)
+        row['wl_min'] = float(spectrum.wavelengths[0])
+        row['wl_max'] = float(spectrum.wavelengths[-1])
+        row.update(evaluate_spectrum(spectrum, cri))
+    except Exception as e: #一個壞檔案不應該讓整批停下來
+        row['error'] = f'{type(e).__name__}: {e}'
+    return row
+
+
+def evaluate_chunk(paths, columns=None, cri=True):
+    '''
+    在子process執行:處理一個chunk,傳回每個檔案的row
+    '''
+    import warnings
+    warnings.simplefilter('ignore') #壞檔案的numpy警告每個都印會太多
+    return [evaluate_file(path, columns, cri) for path in paths]
+
+
+def find_files(directory, pattern='*.csv'):
+    return sorted(glob.glob(os.path.join(directory, pattern), recursive=True))
+
+
+def run(paths, workers=None, chunk_size=CHUNK_SIZE, columns=None, cri=True, progress=None):
+    '''
+    平行處理所有檔案,傳回和paths同順序的rows
+    :param progress:progress(完成數, 總數, 經過秒數),每完成一個chunk呼叫一次
+    '''
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    results = [None] * len(chunks)
+    done = 0
+    start = time.perf_counter()
+    if workers == 1:
+        #不開process(除錯或檔案很少時)
+        for i, chunk in enumerate(chunks):
+            results[i] = evaluate_chunk(chunk, columns, cri)
+            done += len(chunk)
+            if progress is not None:
+                progress(done, len(paths), time.perf_counter() - start)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(evaluate_chunk, chunk, columns, cri): i for i, chunk in enumerate(chunks)}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                done += len(chunks[i])
+                if progress is not None:
+                    progress(done, len(paths), time.perf_counter() - start)
+    return [row for rows in results for row in rows]
+
+
+def write_csv(rows, path):
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f: #utf-8-sig:Excel開中文檔名不會亂碼
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parquet_available():
+    from importlib.util import find_spec
+    return find_spec('pandas') is not None and (find_spec('pyarrow') is not None or find_spec('fastparquet') is not None)
+
+
+def write_parquet(rows, path):
+    import pandas as pd
+    pd.DataFrame(rows, columns=COLUMNS).to_parquet(path, index=False)
+
+
+def print_progress(done, total, elapsed):
+    rate = done / elapsed if elapsed > 0 else 0.0
+    eta = (total - done) / rate if rate > 0 else 0.0
+    print(f'\r{done}/{total} ({done * 100 // max(total, 1)}%) {rate:.1f}檔/秒 剩餘約{eta:.0f}秒',
+          end='', file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批次計算光譜檔的PPF/CCT/Ra')
+    parser.add_argument('directory')
+    parser.add_argument('--pattern', default='*.csv', help='glob樣式,例如"*.txt"或"**/*.csv"')
+    parser.add_argument('--out', default='spectra_results.csv', help='.csv或.parquet')
+    parser.add_argument('--workers', type=int, default=None, help='process數,預設是CPU核心數,1代表不開process')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--columns', default=None,
+                        help='波長和強度的欄名,例如"wavelength,intensity";預設用前兩個數字欄位')
+    parser.add_argument('--no-cri', action='store_true', help='不算Ra')
+    args = parser.parse_args(argv)
+
+    paths = find_files(args.directory, args.pattern)
+    if not paths:
+        raise SystemExit(f'{args.directory}裡沒有符合{args.pattern}的檔案')
+    parquet = args.out.lower().endswith('.parquet')
+    if parquet and not parquet_available():
+        raise SystemExit('寫Parquet需要pandas和pyarrow(或fastparquet),請改用.csv或先pip install pyarrow')
+    columns = tuple(args.columns.split(',')) if args.columns else None
+    workers = args.workers or os.cpu_count()
+    print(f'{len(paths)}個檔案, {workers}個process, 每個chunk {args.chunk_size}個檔案', file=sys.stderr)
+
+    start = time.perf_counter()
+    rows = run(paths, workers, args.chunk_size, columns, not args.no_cri, print_progress)
+    elapsed = time.perf_counter() - start
+    print(file=sys.stderr)
+
+    if parquet:
+        write_parquet(rows, args.out)
+    else:
+        write_csv(rows, args.out)
+    errors = sum(1 for row in rows if row['error'])
+    print(f'完成: {len(rows)}個檔案, {elapsed:.2f}秒, {len(rows) / elapsed:.1f}檔/秒, 錯誤{errors}個 -> {args.out}',
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
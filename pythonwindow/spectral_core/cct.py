@@ -0,0 +1,207 @@
+'''
+相關色溫(CCT)和Duv,輸入CIE 1960 uv或xy的陣列(..., 2),一次算全部,沒有Python迴圈
+
+1.cct_ohno:Ohno(2013),用1000K-100000K的普朗克軌跡表(每一格差0.1%,第一次使用時由色匹配函數算出),
+  每個點用二分法找軌跡上最近的一格,再用前後三格做三角形/拋物線內插;一百萬點約0.3秒
+2.cct_robertson:Robertson(1968)等溫線表,CRI選參考光源用(和CIE 13.3、colour一樣)
+Duv在普朗克軌跡上方(偏綠)是正的;|Duv| > 0.05時CCT沒有意義
+普朗克軌跡用360-830nm的色匹配函數(colour預設只到780nm,兩者的CCT差約0.005%)
+
+使用方式:
+    cct, duv = xy_to_cct([[0.3457, 0.3585], [0.4476, 0.4074]])
+'''
+
+from functools import lru_cache
+
+import numpy as np
+
+from .colorimetry import XYZ_to_uv, cmfs
+
+PLANCK_MIN = 1000.0      #普朗克軌跡表的範圍(K)
+PLANCK_MAX = 100000.0
+PLANCK_STEP = 1.001      #相鄰兩格的溫度比
+OHNO_TRIANGULAR_DUV = 0.002   #|Duv|小於這個值用三角形內插,否則用拋物線
+C2 = 1.4388e-2           #普朗克定律的第二輻射常數(m·K)
+
+#Robertson等溫線表:(mired(10^6/K), u, v, 等溫線斜率t),Wyszecki & Stiles表1(3.11)
+#325 mired的u用Lindbloom修正過的0.24792(和colour-science一樣)
+ROBERTSON_TABLE = np.array([
+    (0, 0.18006, 0.26352, -0.24341),
+    (10, 0.18066, 0.26589, -0.25479),
+    (20, 0.18133, 0.26846, -0.26876),
+    (30, 0.18208, 0.27119, -0.28539),
+    (40, 0.18293, 0.27407, -0.30470),
+    (50, 0.18388, 0.27709, -0.32675),
+    (60, 0.18494, 0.28021, -0.35156),
+    (70, 0.18611, 0.28342, -0.37915),
+    (80, 0.18740, 0.28668, -0.40955),
+    (90, 0.18880, 0.28997, -0.44278),
+    (100, 0.19032, 0.29326, -0.47888),
+    (125, 0.19462, 0.30141, -0.58204),
+    (150, 0.19962, 0.30921, -0.70471),
+    (175, 0.20525, 0.31647, -0.84901),
+    (200, 0.21142, 0.32312, -1.0182),
+    (225, 0.21807, 0.32909, -1.2168),
+    (250, 0.22511, 0.33439, -1.4512),
+    (275, 0.23247, 0.33904, -1.7298),
+    (300, 0.24010, 0.34308, -2.0637),
+    (325, 0.24792, 0.34655, -2.4681),
+    (350, 0.25591, 0.34951, -2.9641),
+    (375, 0.26400, 0.35200, -3.5814),
+    (400, 0.27218, 0.35407, -4.3633),
+    (425, 0.28039, 0.35577, -5.3762),
+    (450, 0.28863, 0.35714, -6.7262),
+    (475, 0.29685, 0.35823, -8.5955),
+    (500, 0.30505, 0.35907, -11.324),
+    (525, 0.31320, 0.35968, -15.628),
+    (550, 0.32129, 0.36011, -23.325),
+    (575, 0.32931, 0.36038, -40.770),
+    (600, 0.33724, 0.36051, -116.45),
+])
+
+
+def cct_robertson(uv):
+    '''
+    :param uv:(..., 2)的CIE 1960 uv
+    :return:(CCT, Duv),形狀都是uv.shape[:-1];Duv在普朗克軌跡上方(偏綠)是正的
+    1667K(600 mired)以下沒有表格,用最後兩條等溫線外插
+    '''
+    uv = np.asarray(uv, dtype=float)
+    shape = uv.shape[:-1]
+    u = uv.reshape(-1, 2)[:, :1]
+    v = uv.reshape(-1, 2)[:, 1:]
+    mired, u_line, v_line, slope = ROBERTSON_TABLE.T
+    length = np.hypot(1.0, slope)
+    du_line = 1.0 / length
+    dv_line = slope / length
+    #每個點到每條等溫線(從第2條開始)的帶號距離,第一個<=0的就是跨過的那條
+    dt = -(u - u_line[1:]) * dv_line[1:] + (v - v_line[1:]) * du_line[1:]
+    crossed = dt <= 0
+    i = np.where(crossed.any(axis=1), crossed.argmax(axis=1) + 1, len(mired) - 1)
+    rows = np.arange(len(i))
+    dt_current = -np.minimum(dt[rows, i - 1], 0.0)
+    dt_previous = dt[rows, i - 2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f = np.where(i > 1, dt_current / (dt_previous + dt_current), 0.0)
+    with np.errstate(divide='ignore'):
+        cct = 1.0e6 / (mired[i - 1] * f + mired[i] * (1 - f))
+    #軌跡上的內插點和方向,Duv是到軌跡的帶號距離
+    u_i = u_line[i - 1] * f + u_line[i] * (1 - f)
+    v_i = v_line[i - 1] * f + v_line[i] * (1 - f)
+    du_i = du_line[i] * (1 - f) + du_line[i - 1] * f
+    dv_i = dv_line[i] * (1 - f) + dv_line[i - 1] * f
+    length_i = np.hypot(du_i, dv_i)
+    duv = -((u[:, 0] - u_i) * du_i + (v[:, 0] - v_i) * dv_i) / length_i
+    return cct.reshape(shape), duv.reshape(shape)
+
+
+@lru_cache(maxsize=None)
+def planckian_table():
+    '''
+    普朗克軌跡表:傳回(溫度, u, v, 切線方向du, dv),溫度由低到高,唯讀
+    '''
+    count = int(np.ceil(np.log(PLANCK_MAX / PLANCK_MIN) / np.log(PLANCK_STEP))) + 1
+    T = PLANCK_MIN * PLANCK_STEP ** np.arange(count)
+    wavelengths, values = cmfs()
+    l = wavelengths * 1e-9
+    #c1和常數倍數在uv裡會消掉,只留下和波長、溫度有關的部分
+    spectra = l ** -5 / np.expm1(C2 / (l * T[:, np.newaxis]))
+    u, v = XYZ_to_uv(spectra @ values.T).T
+    tangent = np.gradient(np.stack([u, v]), axis=1)
+    du, dv = tangent / np.hypot(*tangent)
+    table = (T, u, v, du, dv)
+    for array in table:
+        array.flags.writeable = False
+    return table
+
+
+def cct_ohno(uv):
+    '''
+    :param uv:(..., 2)的CIE 1960 uv
+    :return:(CCT, Duv),形狀都是uv.shape[:-1];最近的點超出1000K-100000K時CCT和Duv是nan
+    '''
+    uv = np.asarray(uv, dtype=float)
+    shape = uv.shape[:-1]
+    u = uv.reshape(-1, 2)[:, 0]
+    v = uv.reshape(-1, 2)[:, 1]
+    T, u_line, v_line, du_line, dv_line = planckian_table()
+    n = len(T)
+
+    #最近點的條件:點到軌跡的向量和切線垂直;沿著軌跡往高溫走時投影由正變負,用二分法找變號的位置
+    low = np.zeros(len(u), dtype=np.intp)
+    high = np.full(len(u), n - 1, dtype=np.intp)
+    for _ in range(int(np.ceil(np.log2(n)))):
+        middle = (low + high) // 2
+        ahead = (u - u_line[middle]) * du_line[middle] + (v - v_line[middle]) * dv_line[middle] > 0
+        low = np.where(ahead, middle, low)
+        high = np.where(ahead, high, middle)
+    d_low = np.hypot(u - u_line[low], v - v_line[low])
+    d_high = np.hypot(u - u_line[high], v - v_line[high])
+    m = np.clip(np.where(d_low < d_high, low, high), 1, n - 2)
+    outside = ((u - u_line[0]) * du_line[0] + (v - v_line[0]) * dv_line[0] < 0) | \
+              ((u - u_line[-1]) * du_line[-1] + (v - v_line[-1]) * dv_line[-1] > 0)
+
+    T0, T1, T2 = T[m - 1], T[m], T[m + 1]
+    d0 = np.hypot(u - u_line[m - 1], v - v_line[m - 1])
+    d1 = np.hypot(u - u_line[m], v - v_line[m])
+    d2 = np.hypot(u - u_line[m + 1], v - v_line[m + 1])
+
+    #三角形內插(Ohno 2013式(7)-(10))
+    l = np.hypot(u_line[m + 1] - u_line[m - 1], v_line[m + 1] - v_line[m - 1])
+    x = (d0 ** 2 - d2 ** 2 + l ** 2) / (2 * l)
+    cct = T0 + (T2 - T0) * x / l
+    v_x = v_line[m - 1] + (v_line[m + 1] - v_line[m - 1]) * x / l
+    duv = np.sqrt(np.maximum(d0 ** 2 - x ** 2, 0.0)) * np.sign(v - v_x)
+
+    #|Duv|比較大時用拋物線內插(式(11)-(15))
+    parabolic = np.abs(duv) >= OHNO_TRIANGULAR_DUV
+    if parabolic.any():
+        T0, T1, T2 = T0[parabolic], T1[parabolic], T2[parabolic]
+        d0, d1, d2 = d0[parabolic], d1[parabolic], d2[parabolic]
+        X = (T2 - T1) * (T0 - T2) * (T1 - T0)
+        a = (T0 * (d2 - d1) + T1 * (d0 - d2) + T2 * (d1 - d0)) / X
+        b = -(T0 ** 2 * (d2 - d1) + T1 ** 2 * (d0 - d2) + T2 ** 2 * (d1 - d0)) / X
+        c = -(d0 * (T2 - T1) * T1 * T2 + d1 * (T0 - T2) * T0 * T2 + d2 * (T1 - T0) * T0 * T1) / X
+        t = -b / (2 * a)
+        cct[parabolic] = t
+        duv[parabolic] = (a * t ** 2 + b * t + c) * np.sign(duv[parabolic])
+
+    cct[outside] = np.nan
+    duv[outside] = np.nan
+    return cct.reshape(shape), duv.reshape(shape)
+
+
+def xy_to_uv(xy):
+    '''
+    CIE 1931 xy -> CIE 1960 uv
+    '''
+    xy = np.asarray(xy, dtype=float)
+    x, y = xy[..., 0], xy[..., 1]
+    d = -2.0 * x + 12.0 * y + 3.0
+    return np.stack([4.0 * x / d, 6.0 * y / d], axis=-1)
+
+
+def uv_to_cct(uv, method='ohno'):
+    '''
+    :param method:'ohno'或'robertson'
+    :return:(CCT, Duv)
+    '''
+    if method == 'ohno':
+        return cct_ohno(uv)
+    if method == 'robertson':
+        return cct_robertson(uv)
+    raise ValueError(f'不支援的CCT方法: {method}')
+
+
+def xy_to_cct(xy, method='ohno'):
+    return uv_to_cct(xy_to_uv(xy), method)
+
+
+def XYZ_to_cct(XYZ, method='ohno'):
+    '''
+    XYZ(..., 3) -> (CCT, Duv);X+Y+Z是0(沒有光)時是nan
+    '''
+    XYZ = np.asarray(XYZ, dtype=float)
+    cct, duv = uv_to_cct(XYZ_to_uv(XYZ), method)
+    dark = ~(XYZ.sum(axis=-1) > 0)
+    return np.where(dark, np.nan, cct), np.where(dark, np.nan, duv)
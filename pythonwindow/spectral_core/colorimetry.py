@@ -0,0 +1,95 @@
+'''
+色度計算:CIE 1931 2度色匹配函數、XYZ、xy、CIE 1960 uv、McCamy色溫
+
+色匹配函數放在data/cie1931_2deg.csv(360-830nm,1nm),第一次使用時載入
+'''
+
+import os
+from functools import lru_cache
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+@lru_cache(maxsize=None)
+def cmfs():
+    '''
+    傳回(波長, (3, 波長數)的x_bar/y_bar/z_bar),唯讀
+    '''
+    data = np.loadtxt(os.path.join(DATA_DIR, 'cie1931_2deg.csv'), delimiter=',', skiprows=2)
+    wavelengths = data[:, 0].copy()
+    values = np.ascontiguousarray(data[:, 1:].T)
+    wavelengths.flags.writeable = False
+    values.flags.writeable = False
+    return wavelengths, values
+
+
+def cmfs_at(wavelengths):
+    '''
+    色匹配函數內插到指定的波長,超出360-830nm的是0
+    '''
+    cmf_wavelengths, values = cmfs()
+    w = np.asarray(wavelengths, dtype=float)
+    return np.stack([np.interp(w, cmf_wavelengths, v, left=0.0, right=0.0) for v in values])
+
+
+def integration_weights(wavelengths):
+    '''
+    梯形積分的權重,sum(weights * f) == trapezoid(f, wavelengths)
+    '''
+    w = np.asarray(wavelengths, dtype=float)
+    weights = np.zeros_like(w)
+    if len(w) > 1:
+        d = np.diff(w) / 2
+        weights[:-1] += d
+        weights[1:] += d
+    return weights
+
+
+def spectrum_to_XYZ(wavelengths, intensities):
+    '''
+    :param intensities:一條光譜(波長數,)或多條(光譜數, 波長數)
+    :return:(3,)或(光譜數, 3)的XYZ(沒有正規化,單位跟著強度)
+    '''
+    matrix = cmfs_at(wavelengths) * integration_weights(wavelengths)
+    return np.asarray(intensities, dtype=float) @ matrix.T
+
+
+def XYZ_to_xy(XYZ):
+    '''
+    XYZ -> xy色度座標,X+Y+Z=0時是(0, 0)
+    '''
+    XYZ = np.asarray(XYZ, dtype=float)
+    total = XYZ.sum(axis=-1, keepdims=True)
+    return np.divide(XYZ[..., :2], total, out=np.zeros_like(XYZ[..., :2]), where=total != 0)
+
+
+def XYZ_to_uv(XYZ):
+    '''
+    XYZ -> CIE 1960 UCS的uv:u = 4X / (X + 15Y + 3Z), v = 6Y / (X + 15Y + 3Z),分母是0時是(0, 0)
+    '''
+    XYZ = np.asarray(XYZ, dtype=float)
+    X, Y, Z = XYZ[..., 0], XYZ[..., 1], XYZ[..., 2]
+    d = X + 15.0 * Y + 3.0 * Z
+    uv = np.stack([4.0 * X, 6.0 * Y], axis=-1)
+    return np.divide(uv, d[..., np.newaxis], out=np.zeros_like(uv), where=d[..., np.newaxis] != 0)
+
+
+def cct_mccamy(xy):
+    '''
+    McCamy公式:n = (x - 0.3320) / (y - 0.1858), CCT = -449n^3 + 3525n^2 - 6823.3n + 5520.33
+    只在2000K~12500K附近準確;xy是(0, 0)(沒有光)時傳回0
+    '''
+    xy = np.asarray(xy, dtype=float)
+    x, y = xy[..., 0], xy[..., 1]
+    n = (x - 0.3320) / (y - 0.1858)
+    cct = ((-449.0 * n + 3525.0) * n - 6823.3) * n + 5520.33
+    return np.where((x == 0) & (y == 0), 0.0, cct)
+
+
+def cct_from_spectrum(wavelengths, intensities):
+    '''
+    光譜 -> XYZ -> xy -> McCamy色溫(取代各GUI的calculate_CCT_from_spectrum)
+    '''
+    return cct_mccamy(XYZ_to_xy(spectrum_to_XYZ(wavelengths, intensities)))
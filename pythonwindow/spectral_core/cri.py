@@ -0,0 +1,189 @@
+'''
+顯色指數(CIE 13.3-1995 CRI):Ra和R1-R14,一次算很多條光譜
+
+colour.quality.colour_rendering_index每次呼叫都重新內插試驗色樣、建立參考光源,
+一條光譜要幾十ms;這裡把所有表格先放在固定的波長格點(360-780nm,1nm)上:
+1.色匹配函數和14個試驗色樣乘好的權重矩陣(45, 格點數),光譜矩陣乘一次就得到
+  光源的XYZ和14個色樣的XYZ
+2.參考光源:CCT < 5000K用普朗克黑體(直接算),其他用D系列(S0 + M1*S1 + M2*S2)
+3.von Kries色適應、UVW、色差都是陣列運算
+計算步驟和colour-science一樣(光譜先用resample內插到格點,等間隔用Sprague);
+FL2、A、colorrenderingindex.py的sample光譜和LED光譜驗證過,Ra和R1-R14的差異小於1e-6
+(colour內建的FL2等光源標成線性內插,要比對時用method='linear';
+不等間隔的光譜colour用三次樣條,這裡用線性)
+'''
+
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from .cct import cct_robertson
+from .colorimetry import DATA_DIR, XYZ_to_uv, cmfs
+from .resample import resample
+
+GRID = np.arange(360.0, 781.0)  #和colour的SPECTRAL_SHAPE_DEFAULT一樣
+TCS_COUNT = 14
+C1 = 3.741771e-16   #普朗克定律的第一、第二輻射常數(和colour一樣)
+C2 = 1.4388e-2
+D_SERIES_MIN_CCT = 5000
+
+
+def _load(name):
+    return np.loadtxt(os.path.join(DATA_DIR, name), delimiter=',', skiprows=2)
+
+
+@lru_cache(maxsize=None)
+def tables():
+    '''
+    傳回(weights, d_basis),都在GRID上,唯讀
+    weights:(3 + 14*3, 格點數),前3列是x_bar/y_bar/z_bar,之後是每個色樣的反射率乘上x_bar/y_bar/z_bar
+    d_basis:(3, 格點數)的D系列基底S0/S1/S2(和colour一樣用線性內插到1nm)
+    '''
+    cmf_wavelengths, cmf_values = cmfs()
+    cmf = np.stack([np.interp(GRID, cmf_wavelengths, v) for v in cmf_values])
+    tcs = _load('cie1995_tcs.csv')[:, 1:].T
+    weights = np.concatenate([cmf, (tcs[:, np.newaxis, :] * cmf).reshape(-1, len(GRID))])
+    basis = _load('cie_d_series_basis.csv')
+    d_basis = np.stack([np.interp(GRID, basis[:, 0], basis[:, i]) for i in (1, 2, 3)])
+    for array in (weights, d_basis):
+        array.flags.writeable = False
+    return weights, d_basis
+
+
+def reference_illuminants(cct):
+    '''
+    每個CCT的參考光源(光譜數, 格點數):5000K以下黑體,以上D系列
+    '''
+    cct = np.atleast_1d(np.asarray(cct, dtype=float))
+    _, d_basis = tables()
+    reference = np.empty((len(cct), len(GRID)))
+    planck = cct < D_SERIES_MIN_CCT
+    if planck.any():
+        l = GRID * 1e-9
+        with np.errstate(over='ignore', divide='ignore'):
+            reference[planck] = C1 / np.pi / l ** 5 / np.expm1(C2 / (l * cct[planck, np.newaxis]))
+    daylight = ~planck
+    if daylight.any():
+        t = cct[daylight]
+        x = np.where(t <= 7000,
+                     -4.607e9 / t ** 3 + 2.9678e6 / t ** 2 + 0.09911e3 / t + 0.244063,
+                     -2.0064e9 / t ** 3 + 1.9018e6 / t ** 2 + 0.24748e3 / t + 0.23704)
+        y = -3.0 * x ** 2 + 2.87 * x - 0.275
+        m = 0.0241 + 0.2562 * x - 0.7341 * y
+        m1 = np.around((-1.3515 - 1.7703 * x + 5.9114 * y) / m, 3)
+        m2 = np.around((0.0300 - 31.4424 * x + 30.0717 * y) / m, 3)
+        reference[daylight] = np.stack([np.ones_like(m1), m1, m2], axis=1) @ d_basis
+    return reference
+
+
+def _colorimetry(spectra):
+    '''
+    :return:(光源uv (N, 2), 色樣的Y (N, 14), 色樣uv (N, 14, 2));Y是完全反射體=100
+    '''
+    weights, _ = tables()
+    XYZ = spectra @ weights.T
+    white = XYZ[:, :3]
+    samples = XYZ[:, 3:].reshape(len(spectra), TCS_COUNT, 3)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Y = samples[..., 1] * (100.0 / white[:, 1:2])
+    return XYZ_to_uv(white), Y, XYZ_to_uv(samples)
+
+
+def _cd(uv):
+    u, v = uv[..., 0], uv[..., 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (4.0 - u - 10.0 * v) / v, (1.708 * v + 0.404 - 1.481 * u) / v
+
+
+def colour_rendering_indexes(wavelengths, intensities, method='auto'):
+    '''
+    :param intensities:一條光譜(波長數,)或多條(光譜數, 波長數),共用同一組波長;
+                       超出量測範圍的格點用端點的值(和colour一樣)
+    :param method:內插到格點的方式,見resample.resample_matrix
+    :return:(Ra, R),Ra是(光譜數,),R是(光譜數, 14)的R1-R14;一條光譜時少第一維
+            沒有光(全部是0)的光譜是nan
+    '''
+    v = np.asarray(intensities, dtype=float)
+    single = v.ndim == 1
+    spectra = resample(wavelengths, np.atleast_2d(v), GRID, method)
+
+    uv_t, Y_t, uv_tcs_t = _colorimetry(spectra)
+    cct, _ = cct_robertson(uv_t)
+    uv_r, Y_r, uv_tcs_r = _colorimetry(reference_illuminants(cct))
+
+    #von Kries色適應(CIE 1960 uv上的c、d座標)
+    c_t, d_t = _cd(uv_t)
+    c_r, d_r = _cd(uv_r)
+    c_i, d_i = _cd(uv_tcs_t)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c = (c_r / c_t)[:, np.newaxis] * c_i
+        d = (d_r / d_t)[:, np.newaxis] * d_i
+        denominator = 16.518 + 1.481 * c - d
+        u_adapted = (10.872 + 0.404 * c - 4.0 * d) / denominator
+        v_adapted = 5.52 / denominator
+
+        W_t = 25.0 * np.cbrt(Y_t) - 17.0
+        W_r = 25.0 * np.cbrt(Y_r) - 17.0
+    U_t = 13.0 * W_t * (u_adapted - uv_r[:, :1])
+    V_t = 13.0 * W_t * (v_adapted - uv_r[:, 1:])
+    U_r = 13.0 * W_r * (uv_tcs_r[..., 0] - uv_r[:, :1])
+    V_r = 13.0 * W_r * (uv_tcs_r[..., 1] - uv_r[:, 1:])
+
+    R = 100.0 - 4.6 * np.sqrt((U_t - U_r) ** 2 + (V_t - V_r) ** 2 + (W_t - W_r) ** 2)
+    dark = ~(spectra > 0).any(axis=1)
+    R[dark] = np.nan
+    Ra = R[:, :8].mean(axis=1)
+    if single:
+        return Ra[0], R[0]
+    return Ra, R
+
+
+def colour_rendering_index(wavelengths, intensities):
+    '''
+    一條光譜的Ra;光譜是空的或全部是0時raise ValueError
+    '''
+    w = np.asarray(wavelengths, dtype=float)
+    v = np.asarray(intensities, dtype=float)
+    if len(w) < 2 or not np.any(v > 0):
+        raise ValueError('光譜是空的或全部是0')
+    Ra, _ = colour_rendering_indexes(w, v)
+    return float(Ra)
+
+
+#--------------------------------------------------------------------------------
+def compare_with_colour(paths=()):
+    '''
+    和colour-science比較(需要安裝colour):colour內建的FL2/A/LED-B3和paths裡的光譜檔,
+    傳回[(名稱, colour的Ra, 這裡的Ra, R1-R14最大差異), ...]
+    '''
+    import warnings
+    import colour
+    from .spectrum import read_spectrum
+    warnings.simplefilter('ignore')
+    sds = [colour.SDS_ILLUMINANTS[name] for name in ('FL2', 'A', 'LED-B3')]
+    for path in paths:
+        s = read_spectrum(path)
+        sds.append(colour.SpectralDistribution(s.values, s.wavelengths, name=s.name))
+    results = []
+    for sd in sds:
+        method = 'linear' if sd.interpolator is colour.LinearInterpolator else 'auto'
+        spec = colour.colour_rendering_index(sd, additional_data=True)
+        R_colour = np.array([spec.Q_as[i].Q_a for i in range(1, TCS_COUNT + 1)])
+        Ra, R = colour_rendering_indexes(sd.wavelengths, sd.values, method)
+        results.append((sd.name, spec.Q_a, float(Ra), float(np.abs(R - R_colour).max())))
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    for name, Ra_colour, Ra, dR in compare_with_colour(sys.argv[1:]):
+        print(f'{name:<24} colour Ra={Ra_colour:8.4f}  Ra={Ra:8.4f}  R1-R14最大差異={dR:.1e}')
+    w = np.arange(400.0, 701.0)
+    spectra = np.random.default_rng(0).uniform(0.1, 1.0, (10000, 3)) @ np.stack(
+        [np.exp(-((w - 450) / 10) ** 2), np.exp(-((w - 560) / 50) ** 2), np.exp(-((w - 640) / 15) ** 2)])
+    start = time.perf_counter()
+    colour_rendering_indexes(w, spectra)
+    elapsed = time.perf_counter() - start
+    print(f'{len(spectra)}條光譜: {elapsed:.2f}秒 ({elapsed / len(spectra) * 1e6:.0f}us/條)')
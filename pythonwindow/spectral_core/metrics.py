@@ -0,0 +1,78 @@
+'''
+一次算出GUI和批次工具需要的所有數值
+
+除了Ra以外的數值都只和「各波段PPF」和「XYZ」有關,而這兩個對強度是線性的:
+features = linear_weights(波長) @ 強度,多條光譜混合時features也可以直接用倍率加權相加
+(SpectrumStack改倍率時就是這樣更新,不用重算整條光譜)
+'''
+
+import numpy as np
+
+from .cct import XYZ_to_cct
+from .colorimetry import cmfs_at, integration_weights
+from .cri import colour_rendering_index
+from .ppf import PPF_BANDS, band_weights, ppf_percentages
+
+CCT_RANGE = (400, 700)  #CCT和Ra用的波長範圍(和各GUI原本一樣只用400-700nm)
+METRICS = ('total_ppf', 'blue_ppf', 'green_ppf', 'red_ppf',
+           'blue_percent', 'green_percent', 'red_percent', 'cct', 'duv', 'ra')
+
+
+def cct_mask(wavelengths):
+    w = np.asarray(wavelengths, dtype=float)
+    return (w >= CCT_RANGE[0]) & (w <= CCT_RANGE[1])
+
+
+def linear_weights(wavelengths):
+    '''
+    (波段數 + 3, 波長數):前面是PPF_BANDS各波段的權重,最後3列是CCT_RANGE內的XYZ積分權重
+    '''
+    w = np.asarray(wavelengths, dtype=float)
+    mask = cct_mask(w)
+    xyz = np.zeros((3, len(w)))
+    if mask.any():
+        xyz[:, mask] = cmfs_at(w[mask]) * integration_weights(w[mask])
+    return np.concatenate([band_weights(w), xyz])
+
+
+def evaluate_features(features):
+    '''
+    features(linear_weights @ 強度) -> {名稱: 值},沒有ra
+    '''
+    features = np.asarray(features, dtype=float)
+    ppf = {name: features[i] for i, name in enumerate(PPF_BANDS)}
+    percent = ppf_percentages(ppf)
+    result = {f'{name}_ppf': float(value) for name, value in ppf.items()}
+    result.update({f'{name}_percent': float(value) for name, value in percent.items()})
+    cct, duv = XYZ_to_cct(features[len(PPF_BANDS):])
+    result['cct'] = float(cct)
+    result['duv'] = float(duv)
+    return result
+
+
+def evaluate(wavelengths, intensities, cri=True):
+    '''
+    :param cri:False時不算Ra,ra是nan
+    :return:{名稱: 值},名稱見METRICS;CCT(Ohno 2013)、Duv或Ra算不出來時是nan
+    '''
+    w = np.asarray(wavelengths, dtype=float)
+    v = np.asarray(intensities, dtype=float)
+    result = evaluate_features(linear_weights(w) @ v)
+    result['ra'] = colour_rendering_ra(w, v) if cri else float('nan')
+    return result
+
+
+def colour_rendering_ra(wavelengths, intensities):
+    '''
+    CCT_RANGE內的Ra,算不出來時是nan
+    '''
+    w = np.asarray(wavelengths, dtype=float)
+    mask = cct_mask(w)
+    try:
+        return colour_rendering_index(w[mask], np.asarray(intensities, dtype=float)[mask])
+    except (ValueError, ArithmeticError):
+        return float('nan')
+
+
+def evaluate_spectrum(spectrum, cri=True):
+    return evaluate(spectrum.wavelengths, spectrum.values, cri)
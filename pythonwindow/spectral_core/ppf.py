@@ -0,0 +1,55 @@
+'''
+光合光量子通量(PPF)
+
+每個波長n(nm)的ppf(n) = n * 強度(mW) * 0.008359 / 1000,各波段再加總
+(和各GUI原本的算法一樣:逐點加總,不是積分)
+'''
+
+import numpy as np
+
+PPF_FACTOR = 0.008359 / 1000.0
+
+#名稱 -> (下限, 上限, 是否包含上限)
+PPF_BANDS = {
+    'total': (400, 700, True),
+    'blue': (400, 500, False),
+    'green': (500, 600, False),
+    'red': (600, 700, True),
+}
+
+
+def band_masks(wavelengths, bands=PPF_BANDS):
+    '''
+    每個波段的布林遮罩,傳回(波段數, 波長數)的陣列(同一組波長可以重複使用)
+    '''
+    w = np.asarray(wavelengths, dtype=float)
+    masks = np.empty((len(bands), len(w)), dtype=bool)
+    for i, (low, high, include_high) in enumerate(bands.values()):
+        masks[i] = (w >= low) & ((w <= high) if include_high else (w < high))
+    return masks
+
+
+def band_weights(wavelengths, bands=PPF_BANDS):
+    '''
+    n * PPF_FACTOR乘上波段遮罩,ppf = weights @ intensity
+    '''
+    w = np.asarray(wavelengths, dtype=float)
+    return band_masks(w, bands) * (w * PPF_FACTOR)
+
+
+def ppf_bands(wavelengths, intensities, bands=PPF_BANDS):
+    '''
+    :param intensities:一條光譜(波長數,)或多條(光譜數, 波長數)
+    :return:{波段名稱: ppf},多條光譜時每個值是(光譜數,)的陣列
+    '''
+    values = band_weights(wavelengths, bands) @ np.asarray(intensities, dtype=float).T
+    return {name: values[i] for i, name in enumerate(bands)}
+
+
+def ppf_percentages(ppf):
+    '''
+    藍/綠/紅占總PPF的百分比,總PPF是0時都是0
+    '''
+    total = np.asarray(ppf['total'], dtype=float)
+    scale = np.divide(100.0, total, out=np.zeros_like(total), where=total > 0)
+    return {name: ppf[name] * scale for name in ppf if name != 'total'}
@@ -0,0 +1,125 @@
+'''
+把光譜重新取樣到另一組波長(格點)
+
+內插對強度是線性的,所以先算出(格點數, 原本波長數)的內插矩陣,
+多條共用同一組波長的光譜一次矩陣相乘就好
+1.linear:線性內插
+2.sprague:Sprague五次多項式內插(CIE 167建議,等間隔資料用;和colour-science的SpragueInterpolator一樣)
+超出原本波長範圍的格點預設用端點的值(和colour的Constant外插一樣),
+extrapolate=False時是0(加總不同範圍的光譜時用)
+'''
+
+import numpy as np
+
+#Sprague內插在兩端各補兩個點用的係數(除以209)
+SPRAGUE_EDGE = np.array([
+    [884, -1960, 3033, -2648, 1080, -180],
+    [508, -540, 488, -367, 144, -24],
+    [-24, 144, -367, 488, -540, 508],
+    [-180, 1080, -2648, 3033, -1960, 884],
+]) / 209.0
+#多項式係數a1..a5對r[i-2]..r[i+3]的權重(除以24)
+SPRAGUE_WEIGHTS = np.array([
+    [2, -16, 0, 16, -2, 0],
+    [-1, 16, -30, 16, -1, 0],
+    [-9, 39, -70, 66, -33, 7],
+    [13, -64, 126, -124, 61, -12],
+    [-5, 25, -50, 50, -25, 5],
+]) / 24.0
+
+
+def is_uniform(wavelengths, rtol=1e-9):
+    w = np.asarray(wavelengths, dtype=float)
+    if len(w) < 2:
+        return False
+    d = np.diff(w)
+    return bool(np.all(np.abs(d - d[0]) <= rtol * abs(d[0])))
+
+
+def _outside(matrix, w, g, extrapolate):
+    if not extrapolate:
+        matrix[(g < w[0]) | (g > w[-1])] = 0.0
+    return matrix
+
+
+def linear_matrix(wavelengths, grid, extrapolate=True):
+    '''
+    (格點數, 波長數)的線性內插矩陣,wavelengths要由小到大排序
+    '''
+    w = np.asarray(wavelengths, dtype=float)
+    g = np.asarray(grid, dtype=float)
+    matrix = np.zeros((len(g), len(w)))
+    if len(w) == 1:
+        matrix[:, 0] = 1.0
+        return _outside(matrix, w, g, extrapolate)
+    index = np.clip(np.searchsorted(w, g, side='right') - 1, 0, len(w) - 2)
+    t = np.clip((g - w[index]) / (w[index + 1] - w[index]), 0.0, 1.0)
+    rows = np.arange(len(g))
+    matrix[rows, index] = 1.0 - t
+    matrix[rows, index + 1] += t
+    return _outside(matrix, w, g, extrapolate)
+
+
+def sprague_matrix(wavelengths, grid, extrapolate=True):
+    '''
+    (格點數, 波長數)的Sprague內插矩陣;wavelengths要等間隔而且至少6點
+    '''
+    w = np.asarray(wavelengths, dtype=float)
+    g = np.asarray(grid, dtype=float)
+    n = len(w)
+    if n < 6 or not is_uniform(w):
+        raise ValueError('Sprague內插需要至少6點等間隔的資料')
+    h = w[1] - w[0]
+    #兩端各補兩個點:padded = pad @ values
+    pad = np.zeros((n + 4, n))
+    pad[0, :6] = SPRAGUE_EDGE[0]
+    pad[1, :6] = SPRAGUE_EDGE[1]
+    pad[2:-2] = np.eye(n)
+    pad[-2, -6:] = SPRAGUE_EDGE[2]
+    pad[-1, -6:] = SPRAGUE_EDGE[3]
+    padded_w = np.concatenate([[w[0] - 2 * h, w[0] - h], w, [w[-1] + h, w[-1] + 2 * h]])
+
+    inside = (g >= w[0]) & (g <= w[-1])
+    gi = g[inside]
+    i = np.searchsorted(padded_w, gi) - 1
+    X = (gi - padded_w[i]) / h
+    powers = X[:, np.newaxis] ** np.arange(1, 6)          #(點數, 5)
+    local = powers @ SPRAGUE_WEIGHTS                     #對r[i-2]..r[i+3]的權重
+    local[:, 2] += 1.0                                   #y = r[i] + sum(a_k * X^k)
+    matrix_padded = np.zeros((len(gi), n + 4))
+    rows = np.arange(len(gi))[:, np.newaxis]
+    np.add.at(matrix_padded, (rows, i[:, np.newaxis] + np.arange(-2, 4)), local)
+
+    matrix = np.zeros((len(g), n))
+    matrix[inside] = matrix_padded @ pad
+    if extrapolate:
+        matrix[g < w[0], 0] = 1.0
+        matrix[g > w[-1], -1] = 1.0
+    return matrix
+
+
+def resample_matrix(wavelengths, grid, method='auto', extrapolate=True):
+    '''
+    :param method:'linear'、'sprague',或'auto'(等間隔且至少6點用Sprague,否則線性;
+                  colour對不等間隔的資料用三次樣條,這裡用線性)
+    '''
+    if method == 'auto':
+        method = 'sprague' if len(wavelengths) >= 6 and is_uniform(wavelengths) else 'linear'
+    if method == 'sprague':
+        return sprague_matrix(wavelengths, grid, extrapolate)
+    if method == 'linear':
+        return linear_matrix(wavelengths, grid, extrapolate)
+    raise ValueError(f'不支援的內插方式: {method}')
+
+
+def resample(wavelengths, intensities, grid, method='auto', extrapolate=True):
+    '''
+    :param intensities:(波長數,)或(光譜數, 波長數),共用同一組波長
+    :return:(格點數,)或(光譜數, 格點數)
+    '''
+    w = np.asarray(wavelengths, dtype=float)
+    g = np.asarray(grid, dtype=float)
+    v = np.asarray(intensities, dtype=float)
+    if len(w) == len(g) and np.array_equal(w, g):
+        return v
+    return v @ resample_matrix(w, g, method, extrapolate).T
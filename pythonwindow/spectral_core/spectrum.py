@@ -0,0 +1,85 @@
+'''
+光譜資料:波長和強度的numpy陣列,以及讀檔
+'''
+
+import os
+import re
+
+import numpy as np
+
+_SPLIT = re.compile(r'[,;\t ]+')
+
+
+class Spectrum:
+    '''
+    一條光譜,wavelengths(nm)由小到大排序,values和wavelengths一樣長
+    '''
+    __slots__ = ('wavelengths', 'values', 'name', 'path')
+
+    def __init__(self, wavelengths, values, name='', path=None):
+        wavelengths = np.asarray(wavelengths, dtype=float)
+        values = np.asarray(values, dtype=float)
+        if wavelengths.shape != values.shape or wavelengths.ndim != 1:
+            raise ValueError('wavelengths和values必須是一樣長的一維陣列')
+        if len(wavelengths) > 1 and np.any(np.diff(wavelengths) <= 0):
+            order = np.argsort(wavelengths, kind='stable')
+            wavelengths, index = np.unique(wavelengths[order], return_index=True)
+            values = values[order][index]
+        self.wavelengths = wavelengths
+        self.values = values
+        self.name = name
+        self.path = path
+
+    def __len__(self):
+        return len(self.wavelengths)
+
+    def __repr__(self):
+        if not len(self):
+            return f'Spectrum({self.name!r}, 空的)'
+        return f'Spectrum({self.name!r}, {self.wavelengths[0]:g}-{self.wavelengths[-1]:g}nm, {len(self)}點)'
+
+    def __mul__(self, k):
+        return Spectrum(self.wavelengths, self.values * k, self.name, self.path)
+
+    __rmul__ = __mul__
+
+    def band(self, low, high, include_high=False):
+        '''
+        low <= 波長 < high(include_high=True時含high)的部分
+        '''
+        w = self.wavelengths
+        mask = (w >= low) & ((w <= high) if include_high else (w < high))
+        return Spectrum(w[mask], self.values[mask], self.name, self.path)
+
+
+def read_spectrum(path, columns=None, name=None):
+    '''
+    讀取CSV/TXT光譜檔(逗號、分號、tab或空白分隔),非數字的行(標題)會跳過
+    :param columns:(波長欄名, 強度欄名),例如('wavelength', 'intensity');
+                   None時用前兩個數字欄位,有給時標題一定要有這兩個欄位
+    '''
+    index = (0, 1)
+    header = None
+    rows = []
+    with open(path, encoding='utf-8-sig', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = _SPLIT.split(line)
+            try:
+                rows.append((float(fields[index[0]]), float(fields[index[1]])))
+            except (ValueError, IndexError):
+                if rows:
+                    continue #資料中間的壞行跳過(和pandas的to_numeric+dropna一樣)
+                header = [field.strip().strip('"').lower() for field in fields]
+                if columns is not None:
+                    try:
+                        index = (header.index(columns[0].lower()), header.index(columns[1].lower()))
+                    except ValueError:
+                        raise ValueError(f"{os.path.basename(path)}格式錯誤,必須包含'{columns[0]}'與'{columns[1]}'欄位") from None
+    if columns is not None and header is None:
+        raise ValueError(f"{os.path.basename(path)}格式錯誤,必須包含'{columns[0]}'與'{columns[1]}'欄位")
+    data = np.array(rows, dtype=float).reshape(-1, 2)
+    data = data[np.isfinite(data).all(axis=1)]
+    return Spectrum(data[:, 0], data[:, 1], name or os.path.basename(path), path)
@@ -0,0 +1,229 @@
+'''
+共同波長格點:取樣間隔(0.5nm、1nm、5nm...)或範圍不同的光譜放到同一組波長上,
+加總變成一次矩陣乘法
+
+1.make_grid(start, stop, step):格點(包含stop)
+2.resample_spectrum():光譜內插到格點,超出量測範圍的部分是0;
+  依(波長和強度資料的hash, 格點, 內插方式)快取,同一條光譜重畫或重新加入都不會重算
+  (s*2、s.band()會保留path,所以不能用檔案當key)
+3.SpectrumStack:一組光譜疊成(光譜數, 格點數)的矩陣,total(倍率) = 倍率 @ 矩陣
+4.SpectrumStack也記住每條光譜的倍率;set_multiplier()只改一條時總光譜用rank-1更新
+  (total += (新 - 舊) * 那一條),各波段PPF和XYZ每條光譜先算好,總值只是幾個數字的加減
+
+PPF是逐點加總,所以不同取樣間隔的檔案要先放到同一個格點上,總PPF才有意義
+
+使用方式:
+    stack = SpectrumStack(step=1.0)          #或SpectrumStack(grid=(400, 700, 1))固定格點
+    stack.set(0, read_spectrum('blue.csv'))
+    stack.set(1, read_spectrum('red.txt'))
+    total = stack.total([1.0, 0.5])          #波長是stack.grid
+
+    stack.set_multiplier(1, 0.8)             #互動調整倍率
+    stack.mixed_total(), stack.mixed_metrics()
+'''
+
+import hashlib
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from .metrics import evaluate_features, linear_weights
+from .resample import resample
+
+CACHE_SIZE = 256    #最多快取幾個(光譜, 格點)的內插結果
+REFRESH_EVERY = 1000  #rank-1更新幾次之後重新完整加總一次(避免浮點誤差累積)
+
+_cache = OrderedDict()
+
+
+def make_grid(start, stop, step=1.0):
+    count = int(round((stop - start) / step)) + 1
+    return start + step * np.arange(count)
+
+
+def _data_key(spectrum):
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (spectrum.wavelengths, spectrum.values):
+        array = np.ascontiguousarray(array, dtype=float)
+        digest.update(len(array).to_bytes(8, 'little'))
+        digest.update(array.tobytes())
+    return digest.digest()
+
+
+def resample_spectrum(spectrum, grid, method='auto'):
+    '''
+    :param grid:(start, stop, step)
+    :return:(格點數,)的唯讀陣列,量測範圍以外是0
+    '''
+    key = (_data_key(spectrum), tuple(grid), method)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    values = resample(spectrum.wavelengths, spectrum.values, make_grid(*grid), method, extrapolate=False)
+    values = np.array(values, dtype=float)
+    values.flags.writeable = False
+    _cache[key] = values
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return values
+
+
+def clear_cache():
+    _cache.clear()
+
+
+class SpectrumStack:
+    '''
+    依加入順序排列的一組光譜(key可以是index、檔名等),內插到同一個格點
+    '''
+
+    def __init__(self, grid=None, step=1.0, method='auto'):
+        '''
+        :param grid:(start, stop, step)固定的格點;None時用step、涵蓋所有光譜的範圍
+        :param method:內插方式,見resample.resample_matrix
+        '''
+        self.fixed_grid = grid
+        self.step = step
+        self.method = method
+        self.spectra = OrderedDict()
+        self.multipliers = OrderedDict()
+        self._grid = None
+        self._matrix = None
+        self._features = None
+        self._mixed = None          #(總光譜, 總features),倍率改變時rank-1更新
+        self._updates = 0
+
+    def __len__(self):
+        return len(self.spectra)
+
+    def keys(self):
+        return list(self.spectra)
+
+    def set(self, key, spectrum, multiplier=None):
+        '''
+        :param multiplier:None時保留這個key原本的倍率(新的key是1)
+        '''
+        if len(spectrum) < 2:
+            raise ValueError(f'{spectrum.name}資料少於2點')
+        self.spectra[key] = spectrum
+        if multiplier is not None or key not in self.multipliers:
+            self.multipliers[key] = 1.0 if multiplier is None else float(multiplier)
+        self._matrix = None
+
+    def remove(self, key):
+        self.spectra.pop(key, None)
+        self.multipliers.pop(key, None)
+        self._matrix = None
+
+    def clear(self):
+        self.spectra.clear()
+        self.multipliers.clear()
+        self._matrix = None
+
+    def grid_spec(self):
+        '''
+        目前的(start, stop, step);自動格點對齊step的整數倍
+        '''
+        if self.fixed_grid is not None:
+            return tuple(self.fixed_grid)
+        if not self.spectra:
+            return None
+        low = min(s.wavelengths[0] for s in self.spectra.values())
+        high = max(s.wavelengths[-1] for s in self.spectra.values())
+        step = self.step
+        return (math.floor(low / step + 1e-9) * step, math.ceil(high / step - 1e-9) * step, step)
+
+    def _build(self):
+        spec = self.grid_spec()
+        if spec is None:
+            self._grid = np.empty(0)
+            self._matrix = np.empty((0, 0))
+        else:
+            self._grid = make_grid(*spec)
+            self._matrix = np.stack([resample_spectrum(s, spec, self.method) for s in self.spectra.values()])
+        self._features = None
+        self._mixed = None
+
+    @property
+    def grid(self):
+        '''
+        格點的波長陣列
+        '''
+        if self._matrix is None:
+            self._build()
+        return self._grid
+
+    @property
+    def matrix(self):
+        '''
+        (光譜數, 格點數),列的順序和keys()一樣
+        '''
+        if self._matrix is None:
+            self._build()
+        return self._matrix
+
+    def row(self, key):
+        return self.matrix[self.keys().index(key)]
+
+    @property
+    def features(self):
+        '''
+        (光譜數, 特徵數):每條光譜的各波段PPF和XYZ(見metrics.linear_weights)
+        '''
+        if self._features is None:
+            matrix = self.matrix
+            self._features = matrix @ linear_weights(self._grid).T if len(matrix) else np.empty((0, 0))
+        return self._features
+
+    def total(self, multipliers=None):
+        '''
+        :param multipliers:和keys()同順序的倍率,或{key: 倍率};None是全部1
+        '''
+        if multipliers is None:
+            multipliers = np.ones(len(self))
+        elif isinstance(multipliers, dict):
+            multipliers = [multipliers.get(key, 0.0) for key in self.spectra]
+        return np.asarray(multipliers, dtype=float) @ self.matrix
+
+    def _mix(self):
+        if self._mixed is None or self._updates >= REFRESH_EVERY:
+            m = np.fromiter(self.multipliers.values(), dtype=float, count=len(self.multipliers))
+            self._mixed = (m @ self.matrix, m @ self.features)
+            self._updates = 0
+        return self._mixed
+
+    def set_multiplier(self, key, value):
+        '''
+        改一條光譜的倍率,總光譜和總features用rank-1更新;傳回有沒有改變
+        '''
+        value = float(value)
+        old = self.multipliers[key]
+        if value == old:
+            return False
+        self.multipliers[key] = value
+        if self._mixed is not None and self._matrix is not None:
+            i = self.keys().index(key)
+            total, features = self._mixed
+            total += (value - old) * self._matrix[i]
+            features += (value - old) * self.features[i]
+            self._updates += 1
+        return True
+
+    def mixed_total(self):
+        '''
+        目前倍率下的總光譜(格點上);傳回的陣列之後會被更新,要保留的話請copy
+        '''
+        return self._mix()[0]
+
+    def mixed_metrics(self):
+        '''
+        目前倍率下的PPF、百分比、CCT、Duv(不含Ra),只用每條光譜預先算好的features
+        '''
+        return evaluate_features(self._mix()[1])
+
+    def scaled(self, key):
+        '''
+        一條光譜乘上倍率後在格點上的值
+        '''
+        return self.multipliers[key] * self.row(key)
@@ -0,0 +1,13 @@
+'''
+光譜GUI共用的繪圖元件(pythonwindow的各個光譜程式共用)
+
+fill:依波長變色的光譜填色圖,一個artist畫完
+scheduler:輸入debounce、慢的計算放到背景執行緒再交回Tk
+plot:重用artist、用blit只重畫會動的部分
+preview:直接畫在tk.Canvas上的光譜縮圖(不用matplotlib)
+'''
+
+from .fill import SpectrumFill, fill_spectrum
+from .plot import BlitPlot
+from .preview import SpectrumPreview
+from .scheduler import ComputeScheduler
@@ -0,0 +1,212 @@
+'''
+光譜填色圖:用一個artist畫出依波長變色的填色,取代每一段呼叫一次fill_between
+
+舊的做法每兩個點就產生一個PolyCollection(1nm約300個,0.1nm約3萬個),重畫要好幾秒
+1.SpectrumFill(mode='poly'):一個PolyCollection;色階只有cmap.N(256)種顏色,
+  同一個顏色的連續幾段合併成一個多邊形,0.1nm也只有約256個多邊形,顏色和逐段填色一樣
+2.SpectrumFill(mode='image'):一張漸層圖片用曲線下方的路徑裁切,重畫時間和點數無關
+
+使用方式:
+    fill = SpectrumFill(ax, cmap='jet')
+    fill.update(wavelengths, intensity)   #之後資料改變時再呼叫update
+    canvas.draw()
+
+python -m spectral_ui.fill 會比較三種做法在300、3000、30000點的重畫時間
+'''
+
+import numpy as np
+import matplotlib
+from matplotlib.collections import PolyCollection
+from matplotlib.patches import PathPatch
+from matplotlib.path import Path
+
+VMIN = 400          #色階的波長範圍(nm)
+VMAX = 700
+IMAGE_COLUMNS = 1024
+
+
+def get_cmap(cmap):
+    '''
+    名稱或Colormap物件都可以(matplotlib.cm.get_cmap在3.9之後已經移除)
+    '''
+    return matplotlib.colormaps[cmap] if isinstance(cmap, str) else cmap
+
+
+def segment_colors(x, cmap, vmin=VMIN, vmax=VMAX, color_at='left'):
+    '''
+    每一段的顏色(RGBA),color_at='left'用左端點的波長,'mid'用中點
+    '''
+    x = np.asarray(x, dtype=float)
+    nm = (x[:-1] + x[1:]) / 2 if color_at == 'mid' else x[:-1]
+    return get_cmap(cmap)((nm - vmin) / (vmax - vmin))
+
+
+def color_runs(x, cmap, vmin=VMIN, vmax=VMAX, color_at='left'):
+    '''
+    把顏色相同的連續段落合併,傳回(每個run開始的段落index, 結束index(不含), 每個run的RGBA)
+    '''
+    x = np.asarray(x, dtype=float)
+    cmap = get_cmap(cmap)
+    nm = (x[:-1] + x[1:]) / 2 if color_at == 'mid' else x[:-1]
+    #和Colormap.__call__一樣的量化方式,超出範圍的是-1(under)和N(over)
+    index = np.floor((nm - vmin) / (vmax - vmin) * cmap.N)
+    index = np.clip(index, -1, cmap.N).astype(int)
+    index[(nm == vmax)] = cmap.N - 1
+    starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    ends = np.r_[starts[1:], len(index)]
+    rgba = cmap(index[starts]) #整數直接查表,-1和N會拿到under/over的顏色
+    return starts, ends, rgba
+
+
+def run_verts(x, y, starts, ends, baseline=0.0):
+    '''
+    每個run的多邊形:基準線 -> 曲線上的點(段落start到end,含end那一點) -> 基準線
+    '''
+    polys = []
+    for a, b in zip(starts.tolist(), ends.tolist()):
+        k = b - a + 1
+        verts = np.empty((k + 2, 2))
+        verts[0] = (x[a], baseline)
+        verts[1:-1, 0] = x[a:b + 1]
+        verts[1:-1, 1] = y[a:b + 1]
+        verts[-1] = (x[b], baseline)
+        polys.append(verts)
+    return polys
+
+
+def outline_path(x, y, baseline=0.0):
+    '''
+    曲線和基準線圍起來的封閉路徑,用來裁切漸層圖片
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    verts = np.empty((len(x) + 3, 2))
+    verts[0] = (x[0], baseline)
+    verts[1:-2, 0] = x
+    verts[1:-2, 1] = y
+    verts[-2] = (x[-1], baseline)
+    verts[-1] = (x[0], baseline)
+    codes = np.full(len(verts), Path.LINETO, dtype=Path.code_type)
+    codes[0] = Path.MOVETO
+    codes[-1] = Path.CLOSEPOLY
+    return Path(verts, codes)
+
+
+class SpectrumFill:
+    def __init__(self, ax, cmap='jet', vmin=VMIN, vmax=VMAX, mode='poly', color_at='left',
+                 alpha=1.0, baseline=0.0, zorder=1):
+        '''
+        :param mode:'poly'合併同色段落的多邊形(顏色和原本逐段fill_between一樣),'image'裁切的漸層圖片
+        :param color_at:每一段用左端點('left')或中點('mid')的波長決定顏色
+        '''
+        self.ax = ax
+        self.cmap = get_cmap(cmap)
+        self.vmin = vmin
+        self.vmax = vmax
+        self.mode = mode
+        self.color_at = color_at
+        self.baseline = baseline
+        self._x = None
+        self._runs = None
+        if mode == 'poly':
+            #和fill_between(color=...)一樣邊框用填色畫,相鄰的多邊形之間不會有細縫
+            self.artist = PolyCollection([], edgecolors='face', alpha=alpha, zorder=zorder)
+            ax.add_collection(self.artist, autolim=False)
+        elif mode == 'image':
+            self.artist = ax.imshow(np.zeros((1, 2, 4)), aspect='auto', origin='lower',
+                                    interpolation='bilinear', alpha=alpha, zorder=zorder,
+                                    extent=(0, 1, 0, 1))
+            self.clip = PathPatch(Path([(0, 0)]), transform=ax.transData)
+        else:
+            raise ValueError(f'不支援的mode: {mode}')
+
+    def update(self, x, y):
+        '''
+        換成新的資料(波長沒變時不重算顏色),傳回artist
+        '''
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        same_x = self._x is not None and len(self._x) == len(x) and np.array_equal(self._x, x)
+        if self.mode == 'poly':
+            if not same_x:
+                self._runs = color_runs(x, self.cmap, self.vmin, self.vmax, self.color_at)
+            starts, ends, rgba = self._runs
+            self.artist.set_verts(run_verts(x, y, starts, ends, self.baseline))
+            if not same_x:
+                self.artist.set_facecolor(rgba)
+        else:
+            top = float(np.max(y)) if len(y) else 1.0
+            if not same_x:
+                columns = np.linspace(x[0], x[-1], IMAGE_COLUMNS)
+                self.artist.set_data(self.cmap((columns - self.vmin) / (self.vmax - self.vmin))[np.newaxis])
+            self.artist.set_extent((x[0], x[-1], self.baseline, max(top, self.baseline + 1e-12)))
+            self.clip.set_path(outline_path(x, y, self.baseline))
+            self.artist.set_clip_path(self.clip)
+        if not same_x:
+            self._x = x.copy()
+        self._update_limits(x, y)
+        return self.artist
+
+    def _update_limits(self, x, y):
+        if len(x) == 0:
+            return
+        self.ax.update_datalim([(x.min(), min(self.baseline, y.min())), (x.max(), max(self.baseline, y.max()))])
+        self.ax.autoscale_view()
+
+    def remove(self):
+        self.artist.remove()
+
+
+def fill_spectrum(ax, x, y, cmap='jet', **kwargs):
+    '''
+    一次性的填色(ax.cla()之後每次重畫的程式用這個)
+    '''
+    fill = SpectrumFill(ax, cmap, **kwargs)
+    fill.update(x, y)
+    return fill
+
+
+#--------------------------------------------------------------------------------
+def benchmark(sizes=(300, 3000, 30000), repeat=3, legacy_limit=3000):
+    '''
+    比較舊的逐段fill_between和兩種新做法,傳回[(點數, 做法, 建立ms, 重畫ms), ...]
+    舊做法超過legacy_limit點太慢,不測
+    '''
+    import time
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    def legacy(ax, x, y):
+        cmap = get_cmap('jet')
+        colors = [cmap((w - VMIN) / (VMAX - VMIN)) for w in x]
+        for i in range(len(x) - 1):
+            ax.fill_between(x[i:i + 2], y[i:i + 2], color=colors[i])
+
+    results = []
+    for n in sizes:
+        x = np.linspace(380, 780, n)
+        y = np.exp(-((x - 450) / 20) ** 2) + 0.8 * np.exp(-((x - 630) / 30) ** 2)
+        methods = [('poly', lambda ax: fill_spectrum(ax, x, y, mode='poly')),
+                   ('image', lambda ax: fill_spectrum(ax, x, y, mode='image'))]
+        if n <= legacy_limit:
+            methods.insert(0, ('fill_between', lambda ax: legacy(ax, x, y)))
+        for name, build in methods:
+            fig = Figure(figsize=(8, 4), dpi=100)
+            canvas = FigureCanvasAgg(fig)
+            ax = fig.add_subplot(111)
+            start = time.perf_counter()
+            build(ax)
+            build_ms = (time.perf_counter() - start) * 1000
+            canvas.draw() #第一次draw有字型等快取,不算
+            start = time.perf_counter()
+            for _ in range(repeat):
+                canvas.draw()
+            draw_ms = (time.perf_counter() - start) * 1000 / repeat
+            results.append((n, name, build_ms, draw_ms))
+    return results
+
+
+if __name__ == '__main__':
+    print(f"{'點數':>6} {'做法':<13} {'建立(ms)':>9} {'重畫(ms)':>9}")
+    for n, name, build_ms, draw_ms in benchmark():
+        print(f'{n:>6} {name:<13} {build_ms:>9.1f} {draw_ms:>9.1f}')
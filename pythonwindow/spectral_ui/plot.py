@@ -0,0 +1,181 @@
+'''
+重用artist + blit的光譜圖:拖動/輸入倍率時每秒可以更新30次以上
+
+原本每次更新都ax.cla()、重建標題/軸標籤/曲線/填色/圖例再canvas.draw(),
+大部分時間花在重畫不會變的東西(座標軸、刻度、文字)
+1.會變的artist(總光譜曲線、填色...)用add()登記,設成animated,一般的draw不畫它們
+2.完整draw之後把背景(座標軸、文字、圖例)存起來(draw_event),
+  之後update()只要還原背景、畫登記的artist、blit到畫面
+3.fit():資料範圍超出目前的座標軸,或縮小到一半以下時才改座標軸範圍(改了才需要完整draw)
+
+使用方式:
+    plot = BlitPlot(canvas)
+    line = plot.add(ax.plot(x, y, color='w')[0])
+    fill = plot.add_fill(SpectrumFill(ax))
+    ...
+    line.set_ydata(y)                 #資料改變時
+    fill.update(x, y)
+    plot.fit(ax, x, y)
+    plot.update()
+
+python -m spectral_ui.plot 會比較每次完整draw和blit的更新速度
+'''
+
+import numpy as np
+
+HEADROOM = 1.1      #改y軸範圍時上方留的空間
+SHRINK = 0.5        #資料最大值低於目前上限的這個比例時才縮小y軸
+
+
+class BlitPlot:
+    def __init__(self, canvas, headroom=HEADROOM, shrink=SHRINK):
+        '''
+        :param canvas:FigureCanvasTkAgg等支援blit的canvas;不支援時update()直接完整draw
+        '''
+        self.canvas = canvas
+        self.headroom = headroom
+        self.shrink = shrink
+        self.artists = []
+        self._limits = {}
+        self._background = None
+        self._full = True
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def add(self, artist):
+        '''
+        登記會變動的artist(之後只換資料),傳回artist
+        '''
+        artist.set_animated(True)
+        self.artists.append(artist)
+        return artist
+
+    def add_fill(self, fill):
+        '''
+        登記SpectrumFill,傳回fill
+        '''
+        self.add(fill.artist)
+        return fill
+
+    def reset(self):
+        '''
+        ax.cla()重建圖表之後呼叫:忘記原本登記的artist和座標軸範圍
+        '''
+        self.artists = []
+        self._limits = {}
+        self._full = True
+
+    def fit(self, ax, x=None, y=None, baseline=0.0):
+        '''
+        依資料範圍設定座標軸;x是None時不動x軸(固定範圍的圖)
+        範圍有改變時下一次update()會完整draw
+        '''
+        limits = self._limits.get(ax, {})
+        if x is not None and len(x):
+            low, high = float(np.min(x)), float(np.max(x))
+            if limits.get('x') != (low, high):
+                margin = ax.margins()[0] * (high - low)
+                ax.set_xlim(low - margin, high + margin)
+                limits['x'] = (low, high)
+                self._full = True
+        if y is not None and len(y):
+            peak = float(np.nanmax(y))
+            top = limits.get('top')
+            if top is None or peak > top or peak < top * self.shrink:
+                top = peak * self.headroom if peak > baseline else baseline + 1.0
+                ax.set_ylim(baseline, top)
+                limits['top'] = top
+                self._full = True
+        self._limits[ax] = limits
+
+    def invalidate(self):
+        '''
+        靜態的部分(標題、圖例...)改變時呼叫,下一次update()會完整draw
+        '''
+        self._full = True
+
+    def update(self):
+        '''
+        把登記的artist畫到畫面上:範圍沒變時只blit,否則完整draw(同時存新的背景)
+        '''
+        if self._full or self._background is None or not self.canvas.supports_blit:
+            self._full = False
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+    def _on_draw(self, event):
+        #完整draw(包含視窗大小改變)之後:存背景,再把animated的artist畫上去
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        figure = self.canvas.figure
+        for artist in self.artists:
+            if artist.axes is not None or artist.figure is not None:
+                figure.draw_artist(artist)
+
+
+#--------------------------------------------------------------------------------
+def benchmark(sizes=(301, 3001), frames=30):
+    '''
+    模擬拖動倍率:每個畫面改總光譜,比較cla()重建 + draw、重用artist + draw、重用artist + blit
+    傳回[(點數, 做法, 每秒畫面數), ...]
+    '''
+    import time
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from .fill import SpectrumFill, fill_spectrum
+
+    results = []
+    for n in sizes:
+        x = np.linspace(400, 700, n)
+        base = np.exp(-((x - 450) / 20) ** 2)
+        other = np.exp(-((x - 630) / 30) ** 2)
+        frames_y = [base + (1 + 0.02 * i) * other for i in range(frames)]
+
+        def rebuild(ax, canvas, plot, artists, y):
+            ax.cla()
+            ax.set_title('total')
+            ax.set_xlabel('nm')
+            ax.plot(x, y)
+            fill_spectrum(ax, x, y)
+            canvas.draw()
+
+        def reuse(ax, canvas, plot, artists, y):
+            line, fill = artists
+            line.set_ydata(y)
+            fill.update(x, y)
+            if plot is None:
+                canvas.draw()
+            else:
+                plot.fit(ax, x, y)
+                plot.update()
+
+        for name, step, blit in (('cla + draw', rebuild, False), ('reuse + draw', reuse, False),
+                                 ('reuse + blit', reuse, True)):
+            fig = Figure(figsize=(8, 4), dpi=100)
+            canvas = FigureCanvasAgg(fig)
+            ax = fig.add_subplot(111)
+            ax.set_title('total')
+            ax.set_xlabel('nm')
+            plot = BlitPlot(canvas) if blit else None
+            line = ax.plot(x, frames_y[0])[0]
+            fill = SpectrumFill(ax)
+            if plot is not None:
+                plot.add(line)
+                plot.add_fill(fill)
+            fill.update(x, frames_y[0])
+            canvas.draw()
+            start = time.perf_counter()
+            for y in frames_y:
+                step(ax, canvas, plot, (line, fill), y)
+            results.append((n, name, frames / (time.perf_counter() - start)))
+    return results
+
+
+if __name__ == '__main__':
+    print(f"{'點數':>6} {'做法':<14} {'每秒畫面數':>10}")
+    for n, name, fps in benchmark():
+        print(f'{n:>6} {name:<14} {fps:>10.1f}')
@@ -0,0 +1,137 @@
+'''
+左側清單用的光譜縮圖:直接畫在tk.Canvas上,不用matplotlib的Figure/FigureCanvasTkAgg
+
+每個光譜一個FigureCanvasTkAgg的話,每張縮圖都有自己的Figure、Agg緩衝區和Tk圖片,
+建立一張要兩百多ms,10張以上左側捲動就會卡;這裡建立一張約5ms
+1.decimate():每個像素欄只留最小值和最大值(峰值不會消失),幾萬點也只畫約2倍寬度的點
+2.SpectrumPreview:一條tk的折線(canvas.coords換座標),加上右上角的最大值
+3.cmap有給時曲線下方用依波長變色的填色,用numpy算好的一張PPM圖片(寬x高x3 bytes)
+只有set_data()(載入、改倍率)和視窗大小改變時才重畫
+
+使用方式:
+    preview = SpectrumPreview(frame, width=240, height=80, color='#4CAF50', title='預覽')
+    preview.pack(fill=tk.X)
+    preview.set_data(wavelengths, intensity)     #改倍率時再呼叫一次
+'''
+
+import tkinter as tk
+
+import numpy as np
+
+from .fill import VMAX, VMIN, get_cmap
+
+PREVIEW_WIDTH = 240
+PREVIEW_HEIGHT = 80
+PAD = 4             #左右和下方留白(像素)
+TOP = 14            #上方留給標題和最大值的空間
+FONT = ('Microsoft JhengHei', 8)
+
+
+def decimate(x, y, columns):
+    '''
+    依x分成columns欄,每欄留最小值和最大值(依原本的順序),傳回(x, y)
+    點數不多於2*columns時原樣傳回
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) <= 2 * columns or columns < 1:
+        return x, y
+    edges = np.linspace(x[0], x[-1], columns + 1)
+    starts = np.unique(np.searchsorted(x, edges[:-1], side='left'))
+    ends = np.r_[starts[1:], len(x)]
+    #同一欄裡依強度排序,每一欄的第一個是最小值、最後一個是最大值
+    column = np.repeat(np.arange(len(starts)), ends - starts)
+    order = np.lexsort((y, column))
+    keep = np.unique(np.concatenate([[0, len(x) - 1], order[starts], order[ends - 1]]))
+    return x[keep], y[keep]
+
+
+def gradient_ppm(x, y, width, height, cmap, vmin=VMIN, vmax=VMAX, background=(255, 255, 255),
+                 top=TOP, pad=PAD, low=0.0, high=None):
+    '''
+    曲線下方依波長變色的圖片:寬x高的binary PPM(bytes),給tk.PhotoImage(data=..., format='PPM')
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    high = float(np.max(y)) if high is None else high
+    columns = np.arange(width) + 0.5
+    wavelength = x[0] + (columns - pad) / max(width - 2 * pad, 1) * (x[-1] - x[0])
+    curve = np.interp(wavelength, x, y, left=np.nan, right=np.nan)
+    #曲線在每一欄的像素高度,超出x範圍的欄不填色
+    scale = (height - top - pad) / (high - low) if high > low else 0.0
+    curve_row = np.where(np.isnan(curve), height, height - pad - (curve - low) * scale)
+    base_row = height - pad + low * scale      #強度0的位置
+    rows = np.arange(height)[:, np.newaxis] + 0.5
+    inside = (rows >= curve_row) & (rows <= base_row)
+    colors = (get_cmap(cmap)((wavelength - vmin) / (vmax - vmin))[:, :3] * 255).astype(np.uint8)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = background
+    image[inside] = np.broadcast_to(colors, (height, width, 3))[inside]
+    header = f'P6 {width} {height} 255\n'.encode('ascii')
+    return header + image.tobytes()
+
+
+class SpectrumPreview(tk.Canvas):
+    def __init__(self, master, width=PREVIEW_WIDTH, height=PREVIEW_HEIGHT, color='#4CAF50', cmap=None,
+                 vmin=VMIN, vmax=VMAX, title=None, text_color=None, line_width=1, **kwargs):
+        '''
+        :param cmap:None時只畫折線;給colormap(名稱或物件)時曲線下方依波長填色
+        :param kwargs:其他tk.Canvas的參數(bg等)
+        '''
+        kwargs.setdefault('highlightthickness', 0)
+        super().__init__(master, width=width, height=height, **kwargs)
+        self.cmap = cmap
+        self.vmin = vmin
+        self.vmax = vmax
+        self._size = (width, height)
+        self._data = None
+        self._photo = None
+        text_color = text_color or color
+        self._image_item = self.create_image(0, 0, anchor='nw') if cmap is not None else None
+        self._baseline = self.create_line(PAD, height - PAD, width - PAD, height - PAD, fill=text_color)
+        self._line = self.create_line(0, 0, 0, 0, fill=color, width=line_width)
+        self._title = self.create_text(PAD, 1, anchor='nw', text=title or '', fill=text_color, font=FONT)
+        self._peak = self.create_text(width - PAD, 1, anchor='ne', text='', fill=text_color, font=FONT)
+        self.bind('<Configure>', self._on_configure)
+
+    def set_data(self, x, y):
+        '''
+        換成新的資料並重畫(x要由小到大);只保留陣列的參考,視窗大小改變時重畫用
+        '''
+        self._data = (np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        self._render()
+
+    def set_title(self, title):
+        self.itemconfigure(self._title, text=title)
+
+    def _on_configure(self, event):
+        if (event.width, event.height) != self._size:
+            self._size = (event.width, event.height)
+            self._render()
+
+    def _render(self):
+        width, height = self._size
+        self.coords(self._peak, width - PAD, 1)
+        if self._data is None or len(self._data[0]) < 2:
+            self.coords(self._baseline, PAD, height - PAD, width - PAD, height - PAD)
+            self.coords(self._line, 0, 0, 0, 0)
+            self.itemconfigure(self._peak, text='')
+            return
+        x, y = self._data
+        xs, ys = decimate(x, y, max(width - 2 * PAD, 1))
+        low = min(float(np.min(ys)), 0.0)
+        high = float(np.max(ys))
+        scale_y = (height - TOP - PAD) / (high - low) if high > low else 0.0
+        scale_x = (width - 2 * PAD) / (x[-1] - x[0]) if x[-1] > x[0] else 0.0
+        points = np.empty((len(xs), 2))
+        points[:, 0] = PAD + (xs - x[0]) * scale_x
+        points[:, 1] = height - PAD - (ys - low) * scale_y
+        self.coords(self._line, *points.ravel().tolist())
+        self.coords(self._baseline, PAD, height - PAD + low * scale_y, width - PAD, height - PAD + low * scale_y)
+        self.itemconfigure(self._peak, text=f'max {high:.4g}')
+        if self._image_item is not None:
+            background = tuple(c // 256 for c in self.winfo_rgb(self.cget('bg')))
+            data = gradient_ppm(x, y, width, height, self.cmap, self.vmin, self.vmax, background,
+                                low=low, high=high)
+            self._photo = tk.PhotoImage(master=self, data=data, format='PPM')
+            self.itemconfigure(self._image_item, image=self._photo)
@@ -0,0 +1,102 @@
+'''
+Tk介面的計算排程:輸入事件debounce、耗時的計算(Ra等)放到背景執行緒,結果再交回Tk執行緒
+
+倍率輸入框用trace_add('write')時每打一個字就觸發一次(輸入"1.25"是4次),
+CRI在Tk執行緒算的話視窗會卡住
+1.fast():每次事件都立刻在Tk執行緒執行(PPF這類很快的數值),傳回值交給slow
+2.slow(value):停止輸入delay毫秒之後才在背景執行緒執行(不能碰tkinter物件)
+3.done(result):回到Tk執行緒顯示結果;期間又有新的schedule的話舊的結果直接丟掉
+背景只有一個執行緒,還沒開始的舊工作會被取消,正在算的算完後結果不使用
+
+使用方式:
+    scheduler = ComputeScheduler(root)
+    def fast():
+        show_ppf(stack.mixed_metrics())
+        return stack.grid, stack.mixed_total().copy()   #背景執行緒用的資料要複製
+    scheduler.schedule(fast, lambda args: colour_rendering_ra(*args), show_ra)
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+
+DEBOUNCE_MS = 150   #停止輸入多久之後才開始慢的計算
+POLL_MS = 20        #檢查背景工作是否完成的間隔
+
+
+class ComputeScheduler:
+    def __init__(self, widget, delay=DEBOUNCE_MS, poll=POLL_MS):
+        '''
+        :param widget:任何tk元件(用它的after排程)
+        '''
+        self.widget = widget
+        self.delay = delay
+        self.poll = poll
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._generation = 0
+        self._timer = None
+        self._job = None        #(future, generation, done, error)
+        self._polling = False
+
+    def schedule(self, fast=None, slow=None, done=None, error=None):
+        '''
+        :param fast:立刻在Tk執行緒執行,傳回值交給slow(沒有slow時交給done)
+        :param slow:debounce之後在背景執行緒執行;None時done在debounce之後直接在Tk執行緒執行
+        :param done:done(結果),在Tk執行緒執行
+        :param error:error(例外),slow失敗時在Tk執行緒執行;None時交給tk的report_callback_exception
+        '''
+        self.cancel()
+        generation = self._generation
+        value = fast() if fast is not None else None
+        if slow is None and done is None:
+            return
+        self._timer = self.widget.after(self.delay, self._start, generation, value, slow, done, error)
+
+    def cancel(self):
+        '''
+        取消還沒開始的工作,正在背景算的結果不會再交給done
+        '''
+        self._generation += 1
+        if self._timer is not None:
+            self.widget.after_cancel(self._timer)
+            self._timer = None
+        if self._job is not None:
+            self._job[0].cancel()
+
+    def busy(self):
+        return self._timer is not None or (self._job is not None and not self._job[0].done())
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _start(self, generation, value, slow, done, error):
+        self._timer = None
+        if generation != self._generation:
+            return
+        if slow is None:
+            done(value)
+            return
+        self._job = (self._executor.submit(slow, value), generation, done, error)
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.poll, self._check)
+
+    def _check(self):
+        if self._job is None or self._job[0].cancelled():
+            self._polling = False
+            return
+        future, generation, done, error = self._job
+        if not future.done():
+            self.widget.after(self.poll, self._check)
+            return
+        self._polling = False
+        self._job = None
+        if generation != self._generation:
+            return
+        exception = future.exception()
+        if exception is None:
+            if done is not None:
+                done(future.result())
+        elif error is not None:
+            error(exception)
+        else:
+            self.widget.report_callback_exception(type(exception), exception, exception.__traceback__)
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spectral_core import Spectrum, read_spectrum, resample_spectrum  # noqa: E402
+from spectral_core.stack import clear_cache  # noqa: E402
+
+GRID = (400, 700, 1.0)
+
+
+def _read(tmp_path):
+    path = tmp_path / 'led.csv'
+    wavelengths = np.arange(400, 701, 0.5)
+    values = np.exp(-((wavelengths - 550) / 40) ** 2)
+    path.write_text('wavelength,intensity\n' + ''.join(f'{w},{v}\n' for w, v in zip(wavelengths, values)),
+                    encoding='utf-8')
+    return read_spectrum(str(path), columns=('wavelength', 'intensity'))
+
+
+def test_scaled_spectrum_is_not_served_from_cache(tmp_path):
+    clear_cache()
+    spectrum = _read(tmp_path)
+    base = resample_spectrum(spectrum, GRID)
+    scaled = resample_spectrum(spectrum * 2, GRID)
+    np.testing.assert_allclose(scaled, 2 * base)
+
+
+def test_band_limited_spectrum_is_not_served_from_cache(tmp_path):
+    clear_cache()
+    spectrum = _read(tmp_path)
+    full = resample_spectrum(spectrum, GRID)
+    band = resample_spectrum(spectrum.band(500, 600), GRID)
+    grid = np.arange(400, 701, 1.0)
+    inside = (grid >= 500) & (grid < 600)
+    np.testing.assert_allclose(band[inside], full[inside])
+    assert not band[(grid < 500) | (grid > 600)].any()
+
+
+def test_same_data_hits_cache():
+    clear_cache()
+    wavelengths = np.arange(400, 701, 5.0)
+    first = resample_spectrum(Spectrum(wavelengths, np.ones_like(wavelengths)), GRID)
+    second = resample_spectrum(Spectrum(wavelengths.copy(), np.ones_like(wavelengths)), GRID)
+    assert first is second